@@ -138,19 +138,27 @@ router.get('/pdfs', async (req, res) => {
 
 
 // Query route (uses spawn)
+const QUERY_EXIT_TEMPFAIL = 75; // local_llm.py: LLM queue full or deadline exceeded
 router.post('/query', async (req, res) => {
     logger.info('Query request...');
     try {
-        const { pdfId, query, history } = req.body;
-        if (!pdfId || !query) { return res.status(400).json({ success: false, message: 'ID/query required' }); }
+        const { pdfId, pdfIds, query, history, conversationId } = req.body;
+        // pdfIds (array) searches several documents at once; pdfId keeps the single-document behaviour
+        const ids = Array.isArray(pdfIds) && pdfIds.length > 0 ? [...new Set(pdfIds.map(String))] : (pdfId ? [pdfId] : []);
+        if (ids.length === 0 || !query) { return res.status(400).json({ success: false, message: 'ID/query required' }); }
 
-        const pdf = await PDFModel.findById(pdfId, { processed: 1 });
-        if (!pdf) { return res.status(404).json({ success: false, message: 'PDF not found' }); }
-        if (pdf.processed !== true) { return res.status(400).json({ success: false, message: 'PDF not processed' }); }
+        const pdfs = await PDFModel.find({ _id: { $in: ids } }, { processed: 1 });
+        if (pdfs.length !== ids.length) { return res.status(404).json({ success: false, message: 'PDF not found' }); }
+        if (pdfs.some(pdf => pdf.processed !== true)) { return res.status(400).json({ success: false, message: 'PDF not processed' }); }
 
-        logger.info(`Querying PDF ID: ${pdfId}`);
+        logger.info(`Querying PDF ID(s): ${ids.join(', ')}`);
         const pythonScript = path.join(pythonDir, 'local_llm.py');
-        const pythonArgs = [ script, query, '--collection_name', 'documents', '--pdf_id', pdfId ];
+        const pythonArgs = [ pythonScript, query, '--collection_name', 'documents' ];
+        if (ids.length === 1) { pythonArgs.push('--pdf_id', ids[0]); } else { pythonArgs.push('--pdf_ids', ids.join(',')); }
+        // With a conversation ID the Python side keeps the history; the client history only seeds a new session
+        if (typeof conversationId === 'string' && /^[\w.:-]{1,128}$/.test(conversationId)) {
+            pythonArgs.push('--conversation_id', conversationId);
+        }
         if (history && Array.isArray(history) && history.length > 0) { // Only add if history exists and is not empty
              try {
                  pythonArgs.push('--history', JSON.stringify(history));
@@ -163,6 +171,14 @@ router.post('/query', async (req, res) => {
         logger.info(`Spawning: ${pythonExecutable} ${pythonArgs.map(a => a.includes(' ') ? `"${a}"` : a).join(' ')}`);
         const pythonProcess = spawn(pythonExecutable, pythonArgs);
 
+        // Client went away before the answer: kill the query so its LLM slot and generation are freed
+        res.on('close', () => {
+            if (!res.writableFinished && pythonProcess.exitCode === null) {
+                logger.info('Client disconnected; cancelling query script.');
+                pythonProcess.kill('SIGTERM');
+            }
+        });
+
         let pythonOutput = '';
         let pythonError = '';
         pythonProcess.stdout.on('data', (data) => { pythonOutput += data.toString('utf8'); });
@@ -170,7 +186,14 @@ router.post('/query', async (req, res) => {
 
         pythonProcess.on('close', (code) => {
             logger.info(`Query script exited code ${code}`);
-            if (code === 0 && pythonOutput) {
+            if (res.destroyed || res.headersSent) { return; }
+            if (code === QUERY_EXIT_TEMPFAIL && pythonOutput) {
+                // Scheduler rejection (queue full) or deadline: tell the client to retry instead of a generic 500
+                let result = {};
+                try { result = JSON.parse(pythonOutput); } catch (e) { logger.error('Query Parse Error:', e); }
+                if (result.error_code === 'overloaded') { res.set('Retry-After', '2'); }
+                res.status(result.error_code === 'overloaded' ? 503 : 504).json({ success: false, message: result.answer || 'Query could not be scheduled', errorCode: result.error_code });
+            } else if (code === 0 && pythonOutput) {
                 try {
                     const result = JSON.parse(pythonOutput);
                     // Check if the result itself indicates an internal error from Python script
@@ -199,6 +222,61 @@ router.post('/query', async (req, res) => {
     }
 });
 
+// Delete route (removes the given PDFs' vectors, images, uploads and metadata without a full reset)
+const deletePdfs = async (pdfIds, optimize, res) => {
+    const pdfs = await PDFModel.find({ _id: { $in: pdfIds } }, { path: 1 });
+    if (pdfs.length === 0) { return res.status(404).json({ success: false, message: 'PDF not found' }); }
+    const ids = pdfs.map(p => p._id.toString());
+
+    const pythonScript = path.join(pythonDir, 'utils/qdrant_utils.py');
+    const args = [pythonScript, 'delete_pdfs', '--collection_name', 'documents', '--pdf_ids', ...ids];
+    if (optimize) args.push('--optimize');
+    logger.info(`Spawning: ${pythonExecutable} ${args.join(' ')}`);
+    const proc = spawn(pythonExecutable, args);
+
+    let output = '';
+    let errorOutput = '';
+    proc.stdout.on('data', (data) => { output += data.toString('utf8'); });
+    proc.stderr.on('data', (data) => { errorOutput += data.toString('utf8'); });
+    proc.on('error', (e) => {
+        logger.error('Delete Spawn Error:', e);
+        res.status(500).json({ success: false, message: 'Failed to start delete script', error: e.message });
+    });
+    proc.on('close', async (code) => {
+        logger.info(`Delete script exited code ${code}`);
+        if (code !== 0) {
+            logger.error(`Delete Script Fail Code: ${code}. Err: ${errorOutput}`);
+            return res.status(500).json({ success: false, message: 'Delete script failed', error: errorOutput || `Script exited code ${code}` });
+        }
+        try {
+            const result = JSON.parse(output);
+            await PDFModel.deleteMany({ _id: { $in: ids } });
+            pdfs.forEach(p => {
+                try { fs.rmSync(p.path, { force: true }); }
+                catch (e) { logger.error(`Delete failed: ${e}`); }
+            });
+            res.status(200).json({ success: true, deleted: ids, deletedPoints: result.deleted_points, deletedImages: result.deleted_images });
+        } catch (e) {
+            logger.error('Delete Parse Error:', e); logger.error('Raw output:', output);
+            res.status(500).json({ success: false, message: 'Failed to parse delete result', error: e.message });
+        }
+    });
+};
+
+router.delete('/pdfs/:id', async (req, res) => {
+    logger.info(`Delete request for ${req.params.id}...`);
+    try { await deletePdfs([req.params.id], req.query.optimize === 'true', res); }
+    catch (err) { logger.error('Delete failed:', err); res.status(500).json({ success: false, message: 'Error deleting PDF' }); }
+});
+
+router.post('/pdfs/delete', async (req, res) => {
+    const { pdfIds, optimize } = req.body;
+    logger.info(`Bulk delete request for ${Array.isArray(pdfIds) ? pdfIds.length : 0} PDFs...`);
+    if (!Array.isArray(pdfIds) || pdfIds.length === 0) { return res.status(400).json({ success: false, message: 'pdfIds required' }); }
+    try { await deletePdfs(pdfIds, optimize === true, res); }
+    catch (err) { logger.error('Bulk delete failed:', err); res.status(500).json({ success: false, message: 'Error deleting PDFs' }); }
+});
+
 // Reset route
 router.post('/reset', async (req, res) => {
     logger.info('Reset request...');
@@ -45,8 +45,19 @@ app.use('/api', apiRoutes);
 // Start server
 const server = app.listen(PORT, () => {
   console.log(`Server running on port ${PORT}`);
+  preloadOllamaModels();
 });
 
+// Load the LLM on every configured Ollama host (OLLAMA_HOSTS) so the first query does not pay the model load
+function preloadOllamaModels() {
+  const managerScript = path.resolve(__dirname, '..', 'python', 'llm', 'backend_manager.py');
+  if (!fs.existsSync(managerScript)) return;
+  const preloadProcess = spawn('python', [managerScript, 'preload']);
+  preloadProcess.stdout.on('data', (data) => console.log(`Ollama preload: ${data.toString().trim()}`));
+  preloadProcess.stderr.on('data', (data) => console.log(`Ollama preload log: ${data.toString().trim()}`));
+  preloadProcess.on('error', (err) => console.error('Ollama preload failed to start:', err.message));
+}
+
 // Function to clear Qdrant collection using Python utility
 async function clearQdrantCollection(collectionName = 'documents') {
   return new Promise((resolve, reject) => {
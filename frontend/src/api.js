@@ -34,7 +34,7 @@ export const fetchPDFs = async () => {
 };
 
 // Query the RAG model
-export const queryRAG = async (pdfId, query, modelPath = null) => {
+export const queryRAG = async (pdfId, query, modelPath = null, conversationId = null) => {
   try {
     console.log(`Sending query to backend: ${query} for PDF: ${pdfId}`);
     
@@ -46,7 +46,8 @@ export const queryRAG = async (pdfId, query, modelPath = null) => {
       body: JSON.stringify({
         pdfId,
         query,
-        modelPath
+        modelPath,
+        conversationId
       }),
     });
 
@@ -10,6 +10,7 @@ const ChatInterface = ({ pdf }) => {
   const [input, setInput] = useState('');
   const [isTyping, setIsTyping] = useState(false);
   const messagesEndRef = useRef(null);
+  const conversationIdRef = useRef(null); // Server-side session key; history lives in the backend store
   const [showCommands, setShowCommands] = useState(false);
   const sampleCommands = [
     { text: "Summarize this document", description: "Get a complete summary" },
@@ -21,6 +22,7 @@ const ChatInterface = ({ pdf }) => {
   useEffect(() => {
     setMessages([]);
     setInput(''); // Also clear input when PDF changes
+    conversationIdRef.current = `${pdf?._id || 'none'}-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
   }, [pdf]);
 
   // Scroll to bottom when messages update
@@ -46,7 +48,7 @@ const ChatInterface = ({ pdf }) => {
 
     try {
       // *** REMOVED model argument ***
-      const response = await queryRAG(pdf._id, currentInput);
+      const response = await queryRAG(pdf._id, currentInput, null, conversationIdRef.current);
       const assistantMessage = {
         role: 'assistant',
         content: response.answer || "I couldn't generate an answer for that query.",
@@ -0,0 +1,229 @@
+# FILE: python/benchmarks/bench_e2e.py
+# End-to-end benchmark for the ingestion (process_pdf) and query (local_llm) paths.
+# Runs against Qdrant's in-memory/local mode and a stub Ollama server, so no services are needed.
+#
+# Usage (from the python/ directory):
+#   python benchmarks/bench_e2e.py --docs 3 --pages 50 --images_per_page 1 --output bench.json
+#   python benchmarks/bench_e2e.py --output new.json --compare bench.json
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient
+from benchmarks.stub_ollama import StubOllamaServer
+from benchmarks.synthetic_pdf import generate_pdf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+BENCH_COLLECTION = "bench_documents"
+REGULAR_QUERIES = [
+    "How is the vector index updated?",
+    "What does the policy say about customer warranty?",
+    "Explain the cache and memory settings.",
+]
+COMMAND_QUERIES = [
+    "summarize the document",
+    "list topics",
+    "extract keywords",
+    "define latency",
+    "generate questions",
+]
+# --- End Configuration ---
+
+
+def percentiles(samples_s):
+    """Summarize latencies (seconds) as milliseconds."""
+    if not samples_s: return {}
+    ordered = sorted(samples_s)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] * 1000.0
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000.0,
+        "p50_ms": pct(50), "p90_ms": pct(90), "p95_ms": pct(95), "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1000.0,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def make_client(qdrant_path):
+    if qdrant_path:
+        logger.info(f"Using local-mode Qdrant at {qdrant_path}")
+        return QdrantClient(path=qdrant_path)
+    logger.info("Using in-memory Qdrant")
+    return QdrantClient(location=":memory:")
+
+
+def bench_ingestion(client, pdf_paths, embed_workers=0):
+    """Run process_pdf over the generated PDFs with one shared embedder and client."""
+    import compute_embeddings
+
+    started = time.perf_counter()
+    embedder = compute_embeddings.create_embedder(workers=embed_workers)
+    model_load_s = time.perf_counter() - started
+
+    pages = 0
+    points = 0
+    per_doc = []
+    ingest_started = time.perf_counter()
+    for i, pdf_path in enumerate(pdf_paths):
+        doc_started = time.perf_counter()
+        result = compute_embeddings.process_pdf(pdf_path, f"bench-{i}", BENCH_COLLECTION, client=client, embedder=embedder)
+        elapsed = time.perf_counter() - doc_started
+        if not result.get("success"):
+            raise RuntimeError(f"Ingestion failed for {pdf_path}: {result.get('error')}")
+        pages += result["page_count"]
+        points += result["embeddings_count"]
+        per_doc.append({"pdf": os.path.basename(pdf_path), "seconds": elapsed, "pages": result["page_count"], "points": result["embeddings_count"]})
+    total_s = time.perf_counter() - ingest_started
+    if hasattr(embedder, "close"): embedder.close()
+
+    return {
+        "model_load_s": model_load_s,
+        "total_s": total_s,
+        "pages": pages,
+        "points": points,
+        "pages_per_s": pages / total_s if total_s else 0.0,
+        "points_per_s": points / total_s if total_s else 0.0,
+        "documents": per_doc,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_queries(client, pdf_ids, iterations, warmup):
+    """Drive process_regular_query_command and process_command against the ingested documents."""
+    started = time.perf_counter()
+    import local_llm  # Loads the embedding model and LLM client at import time
+    import_s = time.perf_counter() - started
+
+    def run_regular(query, pdf_id):
+        return local_llm.process_regular_query_command(client, BENCH_COLLECTION, query, [], pdf_id)
+
+    def run_command(query, pdf_id):
+        command_info = local_llm.detect_command_type(query)
+        command_name = command_info[0] if isinstance(command_info, tuple) else command_info
+        command_details = command_info[1] if isinstance(command_info, tuple) else None
+        return local_llm.process_command(client, BENCH_COLLECTION, query, [], pdf_id, command_name, command_details)
+
+    results = {"import_s": import_s}
+    for label, queries, runner in (("regular_query", REGULAR_QUERIES, run_regular), ("commands", COMMAND_QUERIES, run_command)):
+        for _ in range(warmup):
+            runner(queries[0], pdf_ids[0])
+        latencies = []
+        errors = 0
+        for it in range(iterations):
+            for j, query in enumerate(queries):
+                pdf_id = pdf_ids[(it + j) % len(pdf_ids)]
+                t0 = time.perf_counter()
+                try:
+                    # Retrieval and generation failures raise (RetrievalError, LLMGenerationError, ...)
+                    result = runner(query, pdf_id)
+                    if not result: errors += 1
+                except Exception as e:
+                    logger.warning(f"Query failed: {e}")
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+        results[label] = {"latency": percentiles(latencies), "errors": errors}
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(current, baseline_path):
+    """Print relative changes of the headline numbers against an earlier run."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = [
+        ("ingestion.pages_per_s", lambda r: r["ingestion"]["pages_per_s"]),
+        ("ingestion.points_per_s", lambda r: r["ingestion"]["points_per_s"]),
+        ("ingestion.peak_rss_mb", lambda r: r["ingestion"]["peak_rss_mb"]),
+        ("regular_query.p50_ms", lambda r: r["query"]["regular_query"]["latency"]["p50_ms"]),
+        ("regular_query.p95_ms", lambda r: r["query"]["regular_query"]["latency"]["p95_ms"]),
+        ("commands.p50_ms", lambda r: r["query"]["commands"]["latency"]["p50_ms"]),
+        ("commands.p95_ms", lambda r: r["query"]["commands"]["latency"]["p95_ms"]),
+    ]
+    for name, getter in rows:
+        try:
+            old, new = getter(baseline), getter(current)
+        except (KeyError, TypeError):
+            continue
+        change = ((new - old) / old * 100.0) if old else 0.0
+        print(f"{name:28s} {old:12.2f} -> {new:12.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end ingestion and query benchmark.')
+    parser.add_argument('--docs', type=int, default=2, help='Number of synthetic PDFs')
+    parser.add_argument('--pages', type=int, default=20, help='Pages per PDF')
+    parser.add_argument('--words_per_page', type=int, default=300, help='Text density per page')
+    parser.add_argument('--images_per_page', type=int, default=0, help='Images per page')
+    parser.add_argument('--embed_workers', type=int, default=0, help='Embedding worker processes for ingestion (0 = in-process)')
+    parser.add_argument('--qdrant_path', default=None, help='Use Qdrant local mode at this path instead of in-memory')
+    parser.add_argument('--iterations', type=int, default=5, help='Passes over the query set')
+    parser.add_argument('--warmup', type=int, default=1, help='Warm-up queries per query kind')
+    parser.add_argument('--token_latency_ms', type=float, default=0.0, help='Stub Ollama time per generated token')
+    parser.add_argument('--response_tokens', type=int, default=32, help='Stub Ollama tokens per answer')
+    parser.add_argument('--skip_queries', action='store_true', help='Only benchmark ingestion')
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    parser.add_argument('--compare', default=None, help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    stub = StubOllamaServer(response_tokens=args.response_tokens, token_latency_ms=args.token_latency_ms).start()
+    # local_llm reads its Ollama target at import time
+    os.environ["OLLAMA_HOST_URL"] = stub.url
+    os.environ["OLLAMA_HOSTS"] = stub.url
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+    try:
+        with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir:
+            pdf_paths = [
+                generate_pdf(os.path.join(workdir, f"bench_{i}.pdf"), args.pages, args.words_per_page, args.images_per_page, seed=i)
+                for i in range(args.docs)
+            ]
+            client = make_client(args.qdrant_path)
+            results["ingestion"] = bench_ingestion(client, pdf_paths, args.embed_workers)
+            if not args.skip_queries:
+                results["query"] = bench_queries(client, [f"bench-{i}" for i in range(args.docs)], args.iterations, args.warmup)
+                results["query"]["llm_requests"] = stub.request_count
+    finally:
+        stub.stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"Results written to {args.output}")
+    print(output)
+    if args.compare and "query" in results:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
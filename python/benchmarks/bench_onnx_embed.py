@@ -0,0 +1,127 @@
+# FILE: python/benchmarks/bench_onnx_embed.py
+# Accuracy and throughput comparison of the PyTorch and ONNX Runtime embedding backends.
+#
+# Usage (from the python/ directory, after embeddings/export_onnx.py --quantize):
+#   python benchmarks/bench_onnx_embed.py --texts 512 --output onnx_compare.json
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.synthetic_pdf import VOCABULARY
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Documented tolerances (see embeddings/onnx_embed.py)
+TOLERANCES = {
+    "onnx": {"min_cosine": 0.9999, "max_abs_diff": 1e-4},
+    "onnx-int8": {"mean_cosine": 0.99, "min_cosine": 0.98},
+}
+# --- End Configuration ---
+
+
+def synthetic_texts(n, seed=0):
+    """Sentences of varying length so padding and truncation are both exercised."""
+    rng = np.random.default_rng(seed)
+    texts = []
+    for _ in range(n):
+        length = int(rng.integers(5, 400))
+        texts.append(" ".join(rng.choice(VOCABULARY, size=length)))
+    return texts
+
+
+def load_texts(path, n):
+    with open(path, "r", encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    return texts[:n]
+
+
+def time_backend(embed_fn, texts, batch_size, repeats):
+    """Best-of-N wall time for embedding all texts."""
+    embed_fn(texts[:batch_size]) # warm-up
+    best = float("inf")
+    vectors = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        vectors = embed_fn(texts)
+        best = min(best, time.perf_counter() - t0)
+    return np.asarray(vectors, dtype=np.float32), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare torch and ONNX Runtime embedding backends.')
+    parser.add_argument('--model_name', default='all-MiniLM-L6-v2', help='Embedding model')
+    parser.add_argument('--texts', type=int, default=256, help='Number of texts to embed')
+    parser.add_argument('--text_file', default=None, help='Use lines of this file instead of synthetic texts')
+    parser.add_argument('--batch_size', type=int, default=32, help='Batch size for both backends')
+    parser.add_argument('--repeats', type=int, default=3, help='Timing repeats (best is reported)')
+    parser.add_argument('--threads', type=int, default=None, help='Intra-op threads for both backends')
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    args = parser.parse_args()
+
+    texts = load_texts(args.text_file, args.texts) if args.text_file else synthetic_texts(args.texts)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from embeddings.onnx_embed import OnnxEmbedder
+    if args.threads: torch.set_num_threads(args.threads)
+
+    reference_model = SentenceTransformer(args.model_name, device="cpu")
+    reference, torch_s = time_backend(
+        lambda batch: reference_model.encode(batch, batch_size=args.batch_size, convert_to_numpy=True), texts, args.batch_size, args.repeats
+    )
+    results = {
+        "model_name": args.model_name,
+        "texts": len(texts),
+        "batch_size": args.batch_size,
+        "torch": {"seconds": torch_s, "texts_per_s": len(texts) / torch_s},
+    }
+
+    passed = True
+    for backend, quantized in (("onnx", False), ("onnx-int8", True)):
+        try:
+            embedder = OnnxEmbedder(args.model_name, quantized=quantized, intra_op_threads=args.threads)
+        except FileNotFoundError as e:
+            logger.warning(f"Skipping {backend}: {e}")
+            continue
+        vectors, seconds = time_backend(lambda batch: embedder.get_embeddings(batch, batch_size=args.batch_size), texts, args.batch_size, args.repeats)
+        ref_norm = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        vec_norm = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        cosine = (ref_norm * vec_norm).sum(axis=1)
+        stats = {
+            "seconds": seconds,
+            "texts_per_s": len(texts) / seconds,
+            "speedup_vs_torch": torch_s / seconds,
+            "dimension": int(vectors.shape[1]),
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+            "max_abs_diff": float(np.abs(reference - vectors).max()),
+        }
+        tolerance = TOLERANCES[backend]
+        stats["within_tolerance"] = (
+            stats["dimension"] == reference.shape[1]
+            and stats["min_cosine"] >= tolerance.get("min_cosine", -1.0)
+            and stats["mean_cosine"] >= tolerance.get("mean_cosine", -1.0)
+            and stats["max_abs_diff"] <= tolerance.get("max_abs_diff", float("inf"))
+        )
+        passed = passed and stats["within_tolerance"]
+        results[backend] = stats
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
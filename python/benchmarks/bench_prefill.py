@@ -0,0 +1,125 @@
+# FILE: python/benchmarks/bench_prefill.py
+# Prompt-prefill comparison of the prompt layouts and Ollama context carrying, measured against
+# the stub Ollama server (which charges prefill only for prompt tokens outside the cached prefix).
+#
+# Usage (from the python/ directory):
+#   python benchmarks/bench_prefill.py --turns 8 --prefill_ms_per_token 0.5 --output prefill.json
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_e2e import percentiles
+from benchmarks.stub_ollama import StubOllamaServer
+from benchmarks.synthetic_pdf import VOCABULARY
+from llm.ollama_llm import OllamaLLM
+from llm.prompts import build_rag_prompt, format_history_block
+from utils.sessions import RECENT_TURNS, extractive_summary
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+SYSTEM_INSTRUCTION = (
+    "You are an AI assistant answering questions based ONLY on the provided document context. "
+    "Use ONLY the information presented in the 'Source [n]' sections. "
+    "Do not use any external knowledge or make assumptions. "
+    "If the answer cannot be found in the context, state clearly: 'The provided context does not contain the answer to this question.' "
+    "When using information from a source, **you MUST cite the source number** (e.g., [1], [2]) at the end of the sentence(s) referencing that source. "
+    "Be concise."
+)
+MODES = (
+    ("legacy", "legacy", False),
+    ("prefix_stable", "prefix_stable", False),
+    ("prefix_stable+context", "prefix_stable", True),
+)
+# --- End Configuration ---
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(n))
+
+
+def make_turns(turns, sources, words_per_source, seed=0):
+    """Synthetic (question, context_str) pairs; every turn retrieves different chunks."""
+    rng = random.Random(seed)
+    result = []
+    for t in range(turns):
+        context_str = "\n\n".join(
+            f"Source [{i + 1}] (Page: {rng.randint(1, 50)}, Document: bench.pdf, Score: 0.{rng.randint(500, 999)}):\n{_words(rng, words_per_source)}"
+            for i in range(sources)
+        )
+        result.append((f"Question {t}: what does the document say about {_words(rng, 3)}?", context_str))
+    return result
+
+
+def run_mode(layout, carry_context, turns, args):
+    """Play one conversation through a fresh stub and return prefill/latency numbers."""
+    with StubOllamaServer(response_tokens=args.response_tokens, token_latency_ms=args.token_latency_ms,
+                          prefill_ms_per_token=args.prefill_ms_per_token) as stub:
+        llm = OllamaLLM(model_name="tinyllama", keep_alive="30m")
+        llm.api_base = f"{stub.url}/api"
+        session = {"summary": "", "turns": []}
+        carried = None
+        latencies = []
+        prefill_tokens = []
+        prefill_s = 0.0
+        for question, context_str in turns:
+            history_str = "" if carried else format_history_block(session)
+            prompt = build_rag_prompt(question, context_str, SYSTEM_INSTRUCTION, history_str, layout, continuation=bool(carried))
+            t0 = time.perf_counter()
+            answer = llm.generate_response(prompt, context=carried)
+            latencies.append(time.perf_counter() - t0)
+            prefill_tokens.append(llm.last_stats.get("prompt_eval_count", 0))
+            prefill_s += llm.last_stats.get("prompt_eval_duration", 0) / 1e9
+            if carry_context: carried = llm.last_context
+            # Same rolling window as utils.sessions.SessionStore
+            session["turns"].append({"user": question, "assistant": answer})
+            if len(session["turns"]) > RECENT_TURNS:
+                session["summary"] = extractive_summary(session["summary"], session["turns"][:-RECENT_TURNS])
+                session["turns"] = session["turns"][-RECENT_TURNS:]
+        return {
+            "prefill_tokens_total": stub.prefill_tokens_total,
+            "prefill_tokens_per_turn": prefill_tokens,
+            "prefill_s": prefill_s,
+            "latency": percentiles(latencies),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare prompt prefill across prompt layouts and context carrying.')
+    parser.add_argument('--turns', type=int, default=8, help='Turns in the simulated conversation')
+    parser.add_argument('--sources', type=int, default=5, help='Retrieved chunks per turn')
+    parser.add_argument('--words_per_source', type=int, default=60, help='Words per retrieved chunk')
+    parser.add_argument('--prefill_ms_per_token', type=float, default=0.5, help='Stub prefill time per uncached prompt token')
+    parser.add_argument('--token_latency_ms', type=float, default=0.0, help='Stub decode time per generated token')
+    parser.add_argument('--response_tokens', type=int, default=32, help='Stub tokens per answer')
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    args = parser.parse_args()
+
+    turns = make_turns(args.turns, args.sources, args.words_per_source)
+    results = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)}, "modes": {}}
+    for name, layout, carry_context in MODES:
+        logger.info(f"Running mode {name}")
+        results["modes"][name] = run_mode(layout, carry_context, turns, args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"Results written to {args.output}")
+    print(output)
+    baseline = results["modes"]["legacy"]["prefill_tokens_total"] or 1
+    for name, mode in results["modes"].items():
+        print(f"{name:24s} prefill tokens {mode['prefill_tokens_total']:8d} ({mode['prefill_tokens_total'] / baseline * 100:5.1f}% of legacy)"
+              f"  prefill {mode['prefill_s'] * 1000:9.1f} ms  p50 {mode['latency'].get('p50_ms', 0):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
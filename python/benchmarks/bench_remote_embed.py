@@ -0,0 +1,115 @@
+# FILE: python/benchmarks/bench_remote_embed.py
+# Serial (one request per text) vs packed, concurrent MistralEmbedder.get_embeddings against the
+# stub Mistral server. Also checks that vectors come back in input order, that 429s and 503s are
+# retried, and that a text the API rejects costs only its own row.
+#
+# Usage (from the python/ directory):
+#   python benchmarks/bench_remote_embed.py --texts 2000 --latency_ms 20 --rate_limit_per_s 50 --output remote_embed.json
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.bench_onnx_embed import synthetic_texts
+from benchmarks.stub_mistral import StubMistralServer, stub_vector
+from embeddings.mistral_embed import MistralEmbedder
+from embeddings.vectors import PartialEmbeddingError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FAIL_MARKER = "<<reject-me>>"
+
+
+def expected_vectors(texts, dimension):
+    return np.stack([stub_vector(t, dimension) if t.strip() else np.zeros(dimension, dtype=np.float32) for t in texts])
+
+
+def embed(embedder, texts):
+    """All rows, including the zero rows of texts reported as failed."""
+    try:
+        return embedder.get_embeddings(texts)
+    except PartialEmbeddingError as e:
+        return e.vectors
+
+
+def run(texts, args, serial):
+    with StubMistralServer(latency_ms=args.latency_ms, rate_limit_per_s=args.rate_limit_per_s,
+                           error_rate=args.error_rate, fail_marker=FAIL_MARKER) as stub:
+        embedder = MistralEmbedder(api_key="stub", api_base=stub.url, concurrency=args.concurrency,
+                                   requests_per_s=args.requests_per_s, tokens_per_min=args.tokens_per_min)
+        t0 = time.perf_counter()
+        if serial:
+            vectors = np.stack([embed(embedder, [t])[0] for t in texts])
+        else:
+            vectors = embed(embedder, texts)
+        elapsed = time.perf_counter() - t0
+        return vectors, {
+            "seconds": elapsed,
+            "texts_per_s": len(texts) / elapsed if elapsed else 0.0,
+            "client": dict(embedder.stats),
+            "server": dict(stub.counts),
+            "server_max_in_flight": stub.max_in_flight,
+            "failed_indices": list(embedder.last_failed),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and check batched remote embedding against a stub Mistral API.')
+    parser.add_argument('--texts', type=int, default=1000, help='Number of texts')
+    parser.add_argument('--serial_texts', type=int, default=200, help='Texts embedded one per request for the baseline (extrapolated)')
+    parser.add_argument('--latency_ms', type=float, default=20.0, help='Stub time per request')
+    parser.add_argument('--rate_limit_per_s', type=float, default=None, help='Stub answers 429 above this request rate')
+    parser.add_argument('--error_rate', type=float, default=0.05, help='Fraction of stub requests answered with 503')
+    parser.add_argument('--concurrency', type=int, default=4, help='Batch requests in flight')
+    parser.add_argument('--requests_per_s', type=float, default=50.0, help='Client request rate limit')
+    parser.add_argument('--tokens_per_min', type=float, default=5_000_000, help='Client token rate limit')
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts)
+    texts[len(texts) // 3] = ""                                  # Empty text -> reported as failed, no request
+    texts[len(texts) // 2] = f"{texts[len(texts) // 2]} {FAIL_MARKER}"  # Rejected by the API -> zero row only for it
+    expected = expected_vectors(texts, 1024)
+    rejected = len(texts) // 2
+    empty = len(texts) // 3
+
+    batched, batched_stats = run(texts, args, serial=False)
+    serial_texts = [t for t in texts[:args.serial_texts] if FAIL_MARKER not in t]
+    _, serial_stats = run(serial_texts, args, serial=True)
+
+    ok_rows = [i for i in range(len(texts)) if i not in (rejected, empty)]
+    checks = {
+        "in_order": bool(np.allclose(batched[ok_rows], expected[ok_rows], atol=1e-6)),
+        "rejected_text_is_zero_row": bool(not batched[rejected].any()),
+        "failed_indices": batched_stats["failed_indices"],
+    }
+    serial_estimate = serial_stats["seconds"] / max(1, len(serial_texts)) * len(texts)
+    results = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)},
+        "batched": batched_stats,
+        "serial": {**serial_stats, "texts": len(serial_texts), "estimated_seconds_all": serial_estimate},
+        "speedup": serial_estimate / batched_stats["seconds"] if batched_stats["seconds"] else None,
+        "checks": checks,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"Results written to {args.output}")
+    print(output)
+    print(f"batched {batched_stats['seconds']:.2f}s ({batched_stats['client']['requests']} requests) vs serial ~{serial_estimate:.2f}s"
+          f"  speedup x{results['speedup']:.1f}  in order: {checks['in_order']}  failed: {checks['failed_indices']}")
+    if not (checks["in_order"] and checks["rejected_text_is_zero_row"] and checks["failed_indices"] == [empty, rejected]):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
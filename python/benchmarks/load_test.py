@@ -0,0 +1,473 @@
+# FILE: python/benchmarks/load_test.py
+# Load generator for the query path. Replays a workload of (pdf_id, query, history) items either at
+# a fixed concurrency (closed loop: N users, each sending the next query when the last one returns)
+# or at a Poisson arrival rate (open loop: latency counts from the scheduled arrival, so queueing
+# inside the harness is not hidden). Requests run either in this process (handlers on a thread pool
+# sharing one Qdrant client) or as one `local_llm.py` process per request, like the backend spawns
+# them. Qdrant runs in local mode and Ollama is the stub server with a configurable token latency,
+# so the numbers measure our code, the generation scheduler and process start-up, not a model.
+#
+# Local-mode Qdrant storage can only be opened by one process at a time, so subprocess mode gives
+# every concurrent request slot its own copy of the storage directory.
+#
+# Usage (from the python/ directory):
+#   python benchmarks/load_test.py --mode subprocess --concurrency 20 --requests 200 --token_latency_ms 20
+#   python benchmarks/load_test.py --mode inprocess --rate 10 --duration_s 60 --output load.json
+#   python benchmarks/load_test.py --workload recorded.jsonl --qdrant_path ./qdrant_local --collection documents --data_dir ./data
+#
+# A recorded workload is JSON lines: {"pdf_id": "..." or ["...", ...], "query": "...", "history": [{"user", "assistant"}, ...]}
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import queue
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+from benchmarks.bench_e2e import COMMAND_QUERIES, REGULAR_QUERIES, peak_rss_mb, percentiles
+from benchmarks.stub_ollama import StubOllamaServer
+from benchmarks.synthetic_pdf import generate_pdf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+LOAD_COLLECTION = "load_documents"
+LOCAL_LLM_PATH = os.path.join(PYTHON_DIR, "local_llm.py")
+EXIT_TEMPFAIL = 75                 # local_llm's exit code for overload/deadline errors
+OFF_TOPIC_QUERIES = [
+    "What is the capital of Australia?",
+    "Who won the 1998 football world cup?",
+    "Give me a recipe for banana bread.",
+]
+HISTORY_TURNS = [
+    {"user": "What is this document about?", "assistant": "It describes the system's storage, caching and indexing design."},
+    {"user": "Which settings matter most?", "assistant": "The cache size and the index refresh interval."},
+    {"user": "Is there a warranty section?", "assistant": "Yes, the policy section covers customer warranty terms."},
+]
+MEMORY_SAMPLE_INTERVAL_S = 0.1
+# --- End Configuration ---
+
+
+# --- Workload ---
+def synthetic_workload(pdf_ids, count, seed=0, command_share=0.2, off_topic_share=0.1, multi_doc_share=0.1, max_history_turns=3):
+    """
+    Mixed workload of regular questions, commands and off-topic questions
+
+    Args:
+        pdf_ids (list): Documents the queries target
+        count (int): Number of items
+        seed (int): RNG seed
+        command_share (float): Fraction of document-wide commands (summary, topics, ...)
+        off_topic_share (float): Fraction of questions the documents cannot answer
+        multi_doc_share (float): Fraction of items searching two documents at once
+        max_history_turns (int): Items carry 0..max_history_turns earlier turns
+
+    Returns:
+        list: [{"pdf_id": str or list, "query": str, "history": list}, ...]
+    """
+    rng = random.Random(seed)
+    items = []
+    for _ in range(count):
+        draw = rng.random()
+        if draw < command_share: query = rng.choice(COMMAND_QUERIES)
+        elif draw < command_share + off_topic_share: query = rng.choice(OFF_TOPIC_QUERIES)
+        else: query = rng.choice(REGULAR_QUERIES)
+        pdf_id = rng.sample(pdf_ids, 2) if len(pdf_ids) > 1 and rng.random() < multi_doc_share else rng.choice(pdf_ids)
+        history = HISTORY_TURNS[:rng.randint(0, min(max_history_turns, len(HISTORY_TURNS)))]
+        items.append({"pdf_id": pdf_id, "query": query, "history": history})
+    return items
+
+
+def load_workload(path):
+    """Read a recorded workload (JSON lines); 'pdf_ids' is accepted as an alias of 'pdf_id'."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip(): continue
+            record = json.loads(line)
+            pdf_id = record.get("pdf_id", record.get("pdf_ids"))
+            if not pdf_id or not record.get("query"):
+                raise ValueError(f"{path}:{line_num}: 'pdf_id' and 'query' are required")
+            items.append({"pdf_id": pdf_id, "query": record["query"], "history": record.get("history") or []})
+    return items
+
+
+def query_kind(query):
+    """'regular', 'command' or 'off_topic' (synthetic off-topic questions only), for per-kind latencies."""
+    if query in OFF_TOPIC_QUERIES: return "off_topic"
+    return "command" if query in COMMAND_QUERIES or query.lower().startswith(("summar", "list topics", "explain topics",
+                                                                            "extract keywords", "define ", "generate questions")) else "regular"
+
+
+def _pdf_id_list(pdf_id):
+    return [str(p) for p in pdf_id] if isinstance(pdf_id, (list, tuple)) else [str(pdf_id)]
+
+
+def classify_result(result):
+    """Outcome of a query that returned a result dict; failures raise in-process and exit non-zero as a subprocess."""
+    answer = result.get("answer") if isinstance(result, dict) else None
+    if not isinstance(answer, str): return "error"
+    if result.get("error_code"): return result["error_code"]
+    if result.get("low_relevance"): return "low_relevance"
+    return "ok"
+
+
+# --- Targets ---
+class InProcessTarget:
+    """Runs local_llm.run_query in this process; concurrent calls share one local-mode Qdrant client."""
+
+    def __init__(self, qdrant_path, collection):
+        import local_llm  # Loads the embedding model and LLM client at import time
+        from utils import timing
+        self.local_llm = local_llm
+        self.timing = timing
+        self.collection = collection
+        self.client = local_llm.QdrantClient(path=qdrant_path)
+
+    def __call__(self, item, started):
+        args = argparse.Namespace(query=item["query"], collection_name=self.collection, pdf_id=None,
+                                  pdf_ids=json.dumps(_pdf_id_list(item["pdf_id"])), priority=None, deadline_s=None,
+                                  tenant_id=None)
+        with self.timing.collect() as timer:
+            try:
+                result = self.local_llm.run_query(args, item["history"], qdrant_client=self.client, started=started)
+                status = classify_result(result)
+            except self.local_llm.SchedulerRejected:
+                status = "overloaded"
+            except self.local_llm.DeadlineExceeded:
+                status = "deadline_exceeded"
+            except Exception as e:
+                logger.warning(f"Query failed: {e}")
+                status = "error"
+        return {"status": status, "timings": timer.as_dict()}
+
+    def close(self):
+        self.client.close()
+
+
+class SubprocessTarget:
+    """
+    Spawns `local_llm.py` per request, as the backend does
+
+    Each request borrows one of the storage copies for its run; the child's peak RSS comes
+    from wait4() so it is exact per process, not sampled.
+    """
+
+    def __init__(self, qdrant_paths, collection, env, timeout_s=None, log_dir=None):
+        self.collection = collection
+        self.env = env
+        self.timeout_s = timeout_s
+        self.log_dir = log_dir
+        self.free_paths = queue.Queue()
+        for path in qdrant_paths: self.free_paths.put(path)
+        self.live_pids = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def __call__(self, item, started):
+        cmd = [sys.executable, LOCAL_LLM_PATH, item["query"], "--collection_name", self.collection,
+               "--pdf_ids", json.dumps(_pdf_id_list(item["pdf_id"])), "--history", json.dumps(item["history"]), "--fast_log"]
+        qdrant_path = self.free_paths.get()
+        stderr = subprocess.DEVNULL
+        if self.log_dir: stderr = open(os.path.join(self.log_dir, f"query-{next(self._seq)}.log"), "wb")
+        try:
+            proc = subprocess.Popen(cmd, cwd=PYTHON_DIR, env={**self.env, "QDRANT_PATH": qdrant_path},
+                                    stdout=subprocess.PIPE, stderr=stderr)
+            with self._lock: self.live_pids.add(proc.pid)
+            killer = threading.Timer(self.timeout_s, proc.kill) if self.timeout_s else None
+            if killer: killer.start()
+            try:
+                output = proc.stdout.read()
+                proc.stdout.close()
+                # wait4 instead of wait(): it returns the rusage (peak RSS) of this particular child
+                _, wait_status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(wait_status)
+            finally:
+                if killer: killer.cancel()
+                with self._lock: self.live_pids.discard(proc.pid)
+        finally:
+            self.free_paths.put(qdrant_path)
+            if stderr is not subprocess.DEVNULL: stderr.close()
+
+        rss_mb = peak_rss_from_rusage(usage)
+        try:
+            result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            result = None
+        if proc.returncode == -signal.SIGKILL and self.timeout_s: status = "timeout"
+        elif result is None: status = "error"
+        elif proc.returncode == EXIT_TEMPFAIL: status = result.get("error_code") or "overloaded"
+        elif proc.returncode != 0: status = "error"
+        else: status = classify_result(result)
+        return {"status": status, "timings": (result or {}).get("timings") or {}, "rss_mb": rss_mb}
+
+    def close(self):
+        pass
+
+
+def peak_rss_from_rusage(usage):
+    # Linux reports KiB, macOS reports bytes
+    return usage.ru_maxrss / (1024.0 * 1024.0) if sys.platform == "darwin" else usage.ru_maxrss / 1024.0
+
+
+# --- Memory sampling ---
+def _rss_mb(pid):
+    """Current RSS of a process from /proc (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemorySampler:
+    """Samples the RSS of this process plus live query children to find the peak total footprint."""
+
+    def __init__(self, child_pids=None, interval_s=MEMORY_SAMPLE_INTERVAL_S):
+        self.child_pids = child_pids
+        self.interval_s = interval_s
+        self.peak_total_mb = 0.0
+        self.peak_children = 0
+        self.available = _rss_mb(os.getpid()) is not None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            pids = list(self.child_pids) if self.child_pids is not None else []
+            sizes = [s for s in (_rss_mb(pid) for pid in pids) if s is not None]
+            self.peak_total_mb = max(self.peak_total_mb, (_rss_mb(os.getpid()) or 0.0) + sum(sizes))
+            self.peak_children = max(self.peak_children, len(sizes))
+
+    def __enter__(self):
+        if self.available: self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive(): self._thread.join()
+
+
+# --- Load models ---
+def _run_one(target, item, scheduled, t0, records, lock):
+    outcome = target(item, started=time.monotonic())
+    finished = time.perf_counter()
+    record = {**outcome, "kind": query_kind(item["query"]), "latency_s": finished - scheduled, "finished_s": finished - t0}
+    with lock: records.append(record)
+
+
+def run_closed_loop(target, items, concurrency, duration_s=None):
+    """concurrency workers each send the next item as soon as their previous one returns."""
+    records, lock = [], threading.Lock()
+    next_index = itertools.count()
+    t0 = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock: index = next(next_index)
+            if index >= len(items) or (duration_s and time.perf_counter() - t0 >= duration_s): return
+            _run_one(target, items[index], time.perf_counter(), t0, records, lock)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    return records, time.perf_counter() - t0
+
+
+def run_open_loop(target, items, rate, max_in_flight, duration_s=None, seed=0):
+    """Items arrive as a Poisson process at rate per second, whether or not earlier ones have finished."""
+    records, lock = [], threading.Lock()
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    arrival = 0.0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for item in items:
+            if duration_s and arrival >= duration_s: break
+            delay = t0 + arrival - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            # Latency counts from the scheduled arrival, so waiting for a free harness worker is included
+            pool.submit(_run_one, target, item, t0 + arrival, t0, records, lock)
+            arrival += rng.expovariate(rate)
+    return records, time.perf_counter() - t0
+
+
+# --- Setup ---
+def ingest_synthetic(qdrant_path, docs, pages, words_per_page, workdir):
+    """Generate and ingest synthetic PDFs into local-mode Qdrant; returns their pdf_ids."""
+    import compute_embeddings
+    from qdrant_client import QdrantClient
+    client = QdrantClient(path=qdrant_path)
+    embedder = compute_embeddings.create_embedder()
+    pdf_ids = []
+    try:
+        for i in range(docs):
+            pdf_path = generate_pdf(os.path.join(workdir, f"load_{i}.pdf"), pages, words_per_page, 0, seed=i)
+            result = compute_embeddings.process_pdf(pdf_path, f"load-{i}", LOAD_COLLECTION, client=client, embedder=embedder)
+            if not result.get("success"): raise RuntimeError(f"Ingestion failed for {pdf_path}: {result.get('error')}")
+            pdf_ids.append(f"load-{i}")
+    finally:
+        if hasattr(embedder, "close"): embedder.close()
+        client.close() # Releases the storage lock so copies or other processes can open it
+    return pdf_ids
+
+
+def storage_copies(qdrant_path, count, workdir):
+    """One copy of the local-mode storage per concurrent subprocess (the storage is single-process)."""
+    paths = []
+    for i in range(count):
+        path = os.path.join(workdir, f"qdrant_slot_{i}")
+        shutil.copytree(qdrant_path, path, ignore=shutil.ignore_patterns(".lock"))
+        paths.append(path)
+    return paths
+
+
+def summarize(records, wall_s, args, memory, sampler, llm_requests):
+    statuses = Counter(r["status"] for r in records)
+    by_kind = defaultdict(list)
+    stage_samples = defaultdict(list)
+    for r in records:
+        by_kind[r["kind"]].append(r["latency_s"])
+        for stage, ms in r["timings"].items(): stage_samples[stage].append(ms / 1000.0)
+    failed = sum(n for status, n in statuses.items() if status not in ("ok", "low_relevance"))
+    completed = len(records)
+    summary = {
+        "wall_s": wall_s,
+        "requests": completed,
+        "throughput_rps": completed / wall_s if wall_s else 0.0,
+        "ok_rps": (statuses["ok"] + statuses["low_relevance"]) / wall_s if wall_s else 0.0,
+        "offered_rps": args.rate,
+        "latency": percentiles([r["latency_s"] for r in records]),
+        "latency_ok": percentiles([r["latency_s"] for r in records if r["status"] in ("ok", "low_relevance")]),
+        "latency_by_kind": {kind: percentiles(samples) for kind, samples in sorted(by_kind.items())},
+        "outcomes": dict(statuses),
+        "error_rate": failed / completed if completed else 0.0,
+        "stages_p50_ms": {stage: percentiles(samples)["p50_ms"] for stage, samples in sorted(stage_samples.items())},
+        "llm_requests": llm_requests,
+        "memory": memory,
+    }
+    if sampler.available:
+        summary["memory"]["peak_total_rss_mb"] = sampler.peak_total_mb
+        summary["memory"]["peak_concurrent_processes"] = sampler.peak_children
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent load test of the query path against local Qdrant and a stub Ollama.')
+    parser.add_argument('--mode', choices=['inprocess', 'subprocess'], default='subprocess', help='Run queries in this process or one local_llm.py process per query')
+    parser.add_argument('--concurrency', type=int, default=10, help='Closed loop: simultaneous users')
+    parser.add_argument('--rate', type=float, default=None, help='Open loop: Poisson arrivals per second (overrides --concurrency)')
+    parser.add_argument('--max_in_flight', type=int, default=64, help='Open loop: most requests running at once (subprocess storage copies)')
+    parser.add_argument('--requests', type=int, default=100, help='Requests to send (the workload is cycled)')
+    parser.add_argument('--duration_s', type=float, default=None, help='Stop sending after this many seconds')
+    parser.add_argument('--warmup', type=int, default=1, help='Requests sent before measuring (not reported)')
+    parser.add_argument('--workload', default=None, help='Recorded workload (JSON lines); default: synthetic')
+    parser.add_argument('--command_share', type=float, default=0.2, help='Synthetic: fraction of document-wide commands')
+    parser.add_argument('--off_topic_share', type=float, default=0.1, help='Synthetic: fraction of off-topic questions')
+    parser.add_argument('--docs', type=int, default=3, help='Synthetic: PDFs to ingest')
+    parser.add_argument('--pages', type=int, default=20, help='Synthetic: pages per PDF')
+    parser.add_argument('--words_per_page', type=int, default=300, help='Synthetic: text density per page')
+    parser.add_argument('--qdrant_path', default=None, help='Existing local-mode Qdrant storage (required with --workload)')
+    parser.add_argument('--collection', default=LOAD_COLLECTION, help='Collection to query')
+    parser.add_argument('--data_dir', default=None, help='RAG_DATA_DIR holding the text store and artifacts of --qdrant_path')
+    parser.add_argument('--token_latency_ms', type=float, default=20.0, help='Stub Ollama time per generated token')
+    parser.add_argument('--response_tokens', type=int, default=64, help='Stub Ollama tokens per answer')
+    parser.add_argument('--prefill_ms_per_token', type=float, default=0.0, help='Stub Ollama time per uncached prompt token')
+    parser.add_argument('--timeout_s', type=float, default=300.0, help='Subprocess: kill a query after this long')
+    parser.add_argument('--log_dir', default=None, help='Subprocess: keep each query\'s stderr here')
+    parser.add_argument('--seed', type=int, default=0, help='Workload and arrival RNG seed')
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    args = parser.parse_args()
+    if args.workload and not args.qdrant_path: parser.error("--workload needs --qdrant_path (and usually --data_dir)")
+
+    workdir = tempfile.mkdtemp(prefix="rag-load-")
+    stub = StubOllamaServer(response_tokens=args.response_tokens, token_latency_ms=args.token_latency_ms,
+                            prefill_ms_per_token=args.prefill_ms_per_token).start()
+    # Set before local_llm/compute_embeddings are imported (here or in the children): they read these at import
+    os.environ["OLLAMA_HOST_URL"] = stub.url
+    os.environ["OLLAMA_HOSTS"] = stub.url
+    os.environ["OLLAMA_STATE_DIR"] = os.path.join(workdir, "ollama") # Keep scheduler slots away from any live deployment
+    os.environ["RAG_DATA_DIR"] = args.data_dir or os.path.join(workdir, "data")
+    os.environ["SESSION_DB_PATH"] = os.path.join(workdir, "sessions.sqlite3")
+
+    target = None
+    try:
+        if args.workload:
+            qdrant_path, items = args.qdrant_path, load_workload(args.workload)
+        else:
+            qdrant_path = os.path.join(workdir, "qdrant")
+            pdf_ids = ingest_synthetic(qdrant_path, args.docs, args.pages, args.words_per_page, workdir)
+            items = synthetic_workload(pdf_ids, max(args.requests, 1), args.seed, args.command_share, args.off_topic_share)
+        items = [items[i % len(items)] for i in range(args.requests + args.warmup)]
+        slots = args.max_in_flight if args.rate else args.concurrency
+
+        if args.mode == "inprocess":
+            target = InProcessTarget(qdrant_path, args.collection)
+        else:
+            if args.log_dir: os.makedirs(args.log_dir, exist_ok=True)
+            logger.info(f"Copying Qdrant storage for {slots} concurrent processes...")
+            target = SubprocessTarget(storage_copies(qdrant_path, slots, workdir), args.collection, dict(os.environ),
+                                      timeout_s=args.timeout_s, log_dir=args.log_dir)
+
+        for item in items[:args.warmup]: target(item, started=time.monotonic())
+        items = items[args.warmup:]
+        requests_before = stub.request_count
+        logger.info(f"Sending {len(items)} requests ({args.mode}, " +
+                    (f"{args.rate}/s open loop)" if args.rate else f"{args.concurrency} concurrent users)"))
+        with MemorySampler(target.live_pids if args.mode == "subprocess" else None) as sampler:
+            if args.rate:
+                records, wall_s = run_open_loop(target, items, args.rate, args.max_in_flight, args.duration_s, args.seed)
+            else:
+                records, wall_s = run_closed_loop(target, items, args.concurrency, args.duration_s)
+
+        if args.mode == "subprocess":
+            rss = [r["rss_mb"] for r in records if r.get("rss_mb")]
+            memory = {"harness_peak_rss_mb": peak_rss_mb(),
+                      "per_process_peak_rss_mb": {"mean": sum(rss) / len(rss), "p50": sorted(rss)[len(rss) // 2],
+                                                  "max": max(rss)} if rss else {}}
+        else:
+            memory = {"process_peak_rss_mb": peak_rss_mb()}
+        summary = summarize(records, wall_s, args, memory, sampler, stub.request_count - requests_before)
+    finally:
+        if target: target.close()
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        **summary,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"Results written to {args.output}")
+    print(output)
+    latency = summary["latency"]
+    print(f"{summary['requests']} requests in {summary['wall_s']:.1f}s: {summary['throughput_rps']:.2f} req/s, "
+          f"p50 {latency.get('p50_ms', 0):.0f} ms, p95 {latency.get('p95_ms', 0):.0f} ms, p99 {latency.get('p99_ms', 0):.0f} ms, "
+          f"error rate {summary['error_rate']:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# FILE: python/benchmarks/stub_mistral.py
+# Minimal stand-in for the Mistral embeddings API (POST /v1/embeddings), used to check and
+# benchmark MistralEmbedder's batching, rate limiting and retries without a network or key.
+
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_DIMENSION = 1024
+DEFAULT_LATENCY_MS = 20.0          # Fixed cost of every request (the round-trip being saved)
+DEFAULT_MS_PER_ITEM = 0.2          # Extra cost per text in a request
+DEFAULT_MAX_ITEMS = 128            # Requests with more inputs are rejected with 400
+# --- End Configuration ---
+
+
+def stub_vector(text, dimension=DEFAULT_DIMENSION):
+    """Deterministic unit vector for a text, so callers can check order and content."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class StubMistralServer:
+    """
+    Threaded HTTP server answering /v1/embeddings like the Mistral API
+
+    Optional fault injection: a requests-per-second limit answered with 429 + Retry-After,
+    a fraction of random 503s, and texts containing fail_marker rejected with 400.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, dimension=DEFAULT_DIMENSION, latency_ms=DEFAULT_LATENCY_MS,
+                 ms_per_item=DEFAULT_MS_PER_ITEM, max_items=DEFAULT_MAX_ITEMS, rate_limit_per_s=None,
+                 error_rate=0.0, fail_marker=None, shuffle=True, seed=0):
+        """
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind (0 picks a free port)
+            dimension (int): Embedding size returned
+            latency_ms (float): Simulated time per request
+            ms_per_item (float): Simulated time per input text
+            max_items (int): Inputs accepted per request
+            rate_limit_per_s (float, optional): Requests per second before answering 429
+            error_rate (float): Fraction of requests answered with 503
+            fail_marker (str, optional): Requests containing a text with this substring get a 400
+            shuffle (bool): Return data items out of order (clients must sort by index)
+            seed (int): Seed for error injection and shuffling
+        """
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.ms_per_item = ms_per_item
+        self.max_items = max_items
+        self.rate_limit_per_s = rate_limit_per_s
+        self.error_rate = error_rate
+        self.fail_marker = fail_marker
+        self.shuffle = shuffle
+        self.counts = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "rejected": 0, "texts": 0}
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._rng = np.random.default_rng(seed)
+        self._window = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Stub Mistral listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self):
+        """Outcome for a new request: 'ok', 'rate_limited' or 'error'."""
+        with self._lock:
+            self.counts["requests"] += 1
+            now = time.monotonic()
+            if self.rate_limit_per_s:
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit_per_s:
+                    self.counts["rate_limited"] += 1
+                    return "rate_limited"
+                self._window.append(now)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return "error"
+            return "ok"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                logger.debug(fmt % args)
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items(): self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    return self._send_json(400, {"message": "invalid json"})
+                if self.path.rstrip("/") != "/v1/embeddings":
+                    return self._send_json(404, {"message": "not found"})
+                inputs = body.get("input")
+                if isinstance(inputs, str): inputs = [inputs]
+                if not inputs or len(inputs) > server.max_items:
+                    with server._lock: server.counts["rejected"] += 1
+                    return self._send_json(400, {"message": f"input must hold 1..{server.max_items} items"})
+                if server.fail_marker and any(server.fail_marker in t for t in inputs):
+                    with server._lock: server.counts["rejected"] += 1
+                    return self._send_json(400, {"message": "invalid input text"})
+
+                outcome = server._admit()
+                if outcome == "rate_limited":
+                    return self._send_json(429, {"message": "Requests rate limit exceeded"}, {"Retry-After": "1"})
+                if outcome == "error":
+                    return self._send_json(503, {"message": "Service unavailable"})
+
+                with server._lock:
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                try:
+                    time.sleep((server.latency_ms + server.ms_per_item * len(inputs)) / 1000.0)
+                    data = [{"object": "embedding", "index": i, "embedding": stub_vector(t, server.dimension).tolist()}
+                            for i, t in enumerate(inputs)]
+                    if server.shuffle:
+                        with server._lock: server._rng.shuffle(data)
+                    with server._lock:
+                        server.counts["ok"] += 1
+                        server.counts["texts"] += len(inputs)
+                    tokens = sum(len(t) // 4 + 1 for t in inputs)
+                    self._send_json(200, {"id": "stub", "object": "list", "model": body.get("model"), "data": data,
+                                          "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+                finally:
+                    with server._lock: server._in_flight -= 1
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stub Mistral embeddings server.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8765, help='Port to bind')
+    parser.add_argument('--latency_ms', type=float, default=DEFAULT_LATENCY_MS, help='Simulated ms per request')
+    parser.add_argument('--rate_limit_per_s', type=float, default=None, help='Answer 429 above this many requests per second')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    server = StubMistralServer(args.host, args.port, latency_ms=args.latency_ms,
+                               rate_limit_per_s=args.rate_limit_per_s, error_rate=args.error_rate)
+    server.start()
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
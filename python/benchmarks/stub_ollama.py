@@ -0,0 +1,191 @@
+# FILE: python/benchmarks/stub_ollama.py
+# Minimal stand-in for the Ollama HTTP API, used by the benchmarks so query-path numbers
+# measure our code rather than a real model.
+
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_MODELS = ["tinyllama:latest"]
+DEFAULT_RESPONSE_TOKENS = 32
+DEFAULT_TOKEN_LATENCY_MS = 0.0    # Simulated decode time per generated token
+DEFAULT_PREFILL_MS_PER_TOKEN = 0.0  # Simulated prefill time per prompt token not covered by a cached prefix
+# --- End Configuration ---
+
+
+class StubOllamaServer:
+    """
+    Threaded HTTP server answering /api/tags and /api/generate like Ollama does
+
+    Prefill cost is charged only for prompt tokens that do not extend the previous prompt
+    (or the passed-in context), so prompt-prefix reuse shows up in the timings.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, models=None, response_tokens=DEFAULT_RESPONSE_TOKENS,
+                 token_latency_ms=DEFAULT_TOKEN_LATENCY_MS, prefill_ms_per_token=DEFAULT_PREFILL_MS_PER_TOKEN):
+        """
+        Initialize the stub server
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind (0 picks a free port)
+            models (list): Model names reported by /api/tags
+            response_tokens (int): Number of tokens in every generated answer
+            token_latency_ms (float): Simulated time per generated token
+            prefill_ms_per_token (float): Simulated time per uncached prompt token
+        """
+        self.models = models or list(DEFAULT_MODELS)
+        self.response_tokens = response_tokens
+        self.token_latency_ms = token_latency_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.request_count = 0
+        self.prefill_tokens_total = 0
+        self._lock = threading.Lock()
+        self._last_prompt_tokens = []
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Stub Ollama listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _prefill_tokens(self, prompt_tokens, context):
+        """Count prompt tokens that need prefill given the cached prefix and any passed context."""
+        with self._lock:
+            cached = self._last_prompt_tokens
+            shared = 0
+            for a, b in zip(cached, prompt_tokens):
+                if a != b: break
+                shared += 1
+            self._last_prompt_tokens = prompt_tokens
+        if context:
+            # The prompt is appended to a context the model already holds, so only the new text is prefilled
+            return len(prompt_tokens)
+        return len(prompt_tokens) - shared
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                logger.debug(fmt % args)
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/api/tags":
+                    self._send_json(200, {"models": [{"name": m} for m in server.models]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    return self._send_json(400, {"error": "invalid json"})
+                if self.path.rstrip("/") != "/api/generate":
+                    return self._send_json(404, {"error": "not found"})
+                if not body.get("prompt"):
+                    # Ollama treats an empty prompt as a load/keep-alive request
+                    return self._send_json(200, {"model": body.get("model"), "done": True, "response": ""})
+
+                with server._lock:
+                    server.request_count += 1
+                prompt_tokens = (body.get("prompt") or "").split()
+                context = body.get("context") or []
+                prefill = server._prefill_tokens(prompt_tokens, context)
+                with server._lock:
+                    server.prefill_tokens_total += prefill
+                started = time.perf_counter()
+                time.sleep(prefill * server.prefill_ms_per_token / 1000.0)
+                prefill_ns = int((time.perf_counter() - started) * 1e9)
+
+                num_predict = (body.get("options") or {}).get("num_predict") or server.response_tokens
+                n_tokens = max(0, min(server.response_tokens, num_predict))
+                new_context = list(context) + list(range(len(context), len(context) + len(prompt_tokens) + n_tokens))
+                final = {
+                    "model": body.get("model"), "done": True, "context": new_context,
+                    "prompt_eval_count": prefill, "prompt_eval_duration": prefill_ns, "eval_count": n_tokens,
+                }
+
+                if body.get("stream") is False:
+                    time.sleep(n_tokens * server.token_latency_ms / 1000.0)
+                    final["response"] = " ".join(f"tok{i}" for i in range(n_tokens))
+                    return self._send_json(200, final)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i in range(n_tokens):
+                        time.sleep(server.token_latency_ms / 1000.0)
+                        self._write_chunk({"model": body.get("model"), "response": f"tok{i} ", "done": False})
+                    final["response"] = ""
+                    self._write_chunk(final)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    logger.debug("Client disconnected during generation")
+
+            def _write_chunk(self, obj):
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stub Ollama server for benchmarks and load tests.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=11435, help='Port to bind')
+    parser.add_argument('--response_tokens', type=int, default=DEFAULT_RESPONSE_TOKENS, help='Tokens per answer')
+    parser.add_argument('--token_latency_ms', type=float, default=DEFAULT_TOKEN_LATENCY_MS, help='Simulated ms per generated token')
+    parser.add_argument('--prefill_ms_per_token', type=float, default=DEFAULT_PREFILL_MS_PER_TOKEN, help='Simulated ms per uncached prompt token')
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, response_tokens=args.response_tokens,
+                              token_latency_ms=args.token_latency_ms, prefill_ms_per_token=args.prefill_ms_per_token)
+    server.start()
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# FILE: python/benchmarks/synthetic_pdf.py
+# Generates reproducible synthetic PDFs with PyMuPDF for the ingestion benchmarks.
+
+import argparse
+import logging
+import os
+import random
+import fitz  # PyMuPDF
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+VOCABULARY = (
+    "system data model query vector index page document retrieval embedding latency throughput cache "
+    "network storage memory process thread batch request response server client schema payload filter "
+    "cluster shard replica segment optimizer quantization compression benchmark profile metric report "
+    "policy contract agreement liability warranty customer service product release version update"
+).split()
+PAGE_RECT = fitz.paper_rect("a4")
+FONT_SIZE = 10
+IMAGE_SIZE = 64
+# --- End Configuration ---
+
+
+def _paragraph(rng, words):
+    """Build pseudo-random text of roughly the requested number of words."""
+    out = []
+    for i in range(words):
+        word = rng.choice(VOCABULARY)
+        out.append(word.capitalize() if i % 12 == 0 else word)
+        if i % 12 == 11: out[-1] += "."
+    return " ".join(out)
+
+
+def _image_bytes(rng):
+    """Render a small random-colour PNG to embed on a page."""
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, IMAGE_SIZE, IMAGE_SIZE), False)
+    pix.set_rect(pix.irect, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return pix.tobytes("png")
+
+
+def generate_pdf(output_path, pages=10, words_per_page=300, images_per_page=0, seed=0):
+    """
+    Write a synthetic PDF to output_path
+
+    Args:
+        output_path (str): Destination file
+        pages (int): Number of pages
+        words_per_page (int): Text density per page (0 for image-only pages)
+        images_per_page (int): Distinct images drawn on each page
+        seed (int): Random seed so runs are comparable
+
+    Returns:
+        str: The output path
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+    margin = 50
+    for page_num in range(pages):
+        page = document.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+        text_bottom = PAGE_RECT.height - margin
+        if images_per_page:
+            text_bottom -= IMAGE_SIZE + 10
+        if words_per_page:
+            text = f"Page {page_num + 1}. " + _paragraph(rng, words_per_page)
+            page.insert_textbox(fitz.Rect(margin, margin, PAGE_RECT.width - margin, text_bottom), text, fontsize=FONT_SIZE)
+        for img_index in range(images_per_page):
+            x0 = margin + img_index * (IMAGE_SIZE + 10)
+            rect = fitz.Rect(x0, text_bottom + 10, x0 + IMAGE_SIZE, text_bottom + 10 + IMAGE_SIZE)
+            page.insert_image(rect, stream=_image_bytes(rng))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    document.save(output_path, deflate=True)
+    document.close()
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic PDF for benchmarks.')
+    parser.add_argument('output_path', help='Where to write the PDF')
+    parser.add_argument('--pages', type=int, default=10, help='Number of pages')
+    parser.add_argument('--words_per_page', type=int, default=300, help='Words of text per page')
+    parser.add_argument('--images_per_page', type=int, default=0, help='Images per page')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    path = generate_pdf(args.output_path, args.pages, args.words_per_page, args.images_per_page, args.seed)
+    logger.info(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
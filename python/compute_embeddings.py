@@ -15,21 +15,54 @@ from qdrant_client.http import models
 from sentence_transformers import SentenceTransformer
 import re    # <--- FIX: Import 're' module
 import uuid  # <--- FIX: Import 'uuid' module for generating valid IDs
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from utils import routing, timing
+from utils.checkpoints import CheckpointStore, pdf_fingerprint
+from utils.keyphrases import KeyphraseStore, build_artifact
+from utils.topics import TopicStore, cluster_document
+from utils.text_store import TextStore
+from utils.qdrant_utils import collection_vectors, ensure_collection
+from embeddings.embed_factory import get_embedder
+from embeddings.projection import ProjectionStore, projections_for
+from embeddings.registry import DEFAULT_MODEL_NAME, LEGACY_VECTOR, ModelRegistry, vector_of
+from embeddings.vectors import IMAGE_PLACEHOLDER_TEXT, EmbeddingError, PartialEmbeddingError, as_matrix, as_vector
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
-VECTOR_SIZE = 384
+EMBEDDING_MODEL_NAME = DEFAULT_MODEL_NAME # Model of new collections; registered collections use their active model (embeddings.registry)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch") # 'torch', 'onnx' or 'onnx-int8'
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
 DEFAULT_COLLECTION = 'documents'
 IMAGE_SAVE_DIR_RELATIVE = "images"
 RENDERING_DPI = 150
+EMBED_BATCH_SIZE = 64
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 0)) # >0 shards embedding across a process pool
+EMBED_THREADS_PER_WORKER = int(os.getenv("EMBED_THREADS_PER_WORKER", 1))
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+EMBED_STORE_DIR = os.getenv("EMBED_STORE_DIR", os.path.join(RAG_DATA_DIR, "embedding_store"))
+EMBED_STORE_ENABLED = os.getenv("EMBED_STORE", "1") != "0" # Reuse stored vectors for unchanged texts
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.path.join(RAG_DATA_DIR, "checkpoints"))
+CHECKPOINT_SEGMENT_PAGES = int(os.getenv("CHECKPOINT_SEGMENT_PAGES", 50)) # Pages committed per segment
+POINT_ID_NAMESPACE = uuid.UUID("5b8e3c2a-4f1d-4c1e-9a57-2f0d6b7e8a10")
+BULK_CONCURRENCY = 4 # Documents processed at once in bulk mode
+KEYPHRASE_DIR = os.getenv("KEYPHRASE_DIR", os.path.join(RAG_DATA_DIR, "keyphrases"))
+KEYPHRASES_ENABLED = os.getenv("KEYPHRASES", "1") != "0" # TF-IDF keyphrase/entity artifact per pdf_id
+TOPIC_DIR = os.getenv("TOPIC_DIR", os.path.join(RAG_DATA_DIR, "topics"))
+TOPICS_ENABLED = os.getenv("TOPICS", "1") != "0" # k-means topic clusters of the text chunks per pdf_id
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", os.path.join(RAG_DATA_DIR, "text_store"))
+TEXT_SIDECAR_ENABLED = os.getenv("TEXT_SIDECAR", "1") != "0" # Chunk text in the local sidecar instead of the Qdrant payload
+PROJECTION_DIR = os.getenv("PROJECTION_DIR", os.path.join(RAG_DATA_DIR, "projections")) # Fitted by reduce_vectors.py
 # --- End Configuration ---
 
+FITZ_LOCK = threading.RLock() # Serializes PyMuPDF access when documents are ingested from several threads
+projection_store = ProjectionStore(PROJECTION_DIR)
+
 class SimpleEmbedder:
     """Simple embedder that uses Sentence Transformers"""
     def __init__(self, model_name=EMBEDDING_MODEL_NAME):
@@ -37,197 +70,451 @@ class SimpleEmbedder:
         try:
             self.model = SentenceTransformer(model_name)
             self.model_name = model_name
-            test_embedding = self.model.encode("test")
-            actual_size = len(test_embedding)
-            if actual_size != VECTOR_SIZE:
-                 logger.warning(f"Model {model_name} output dimension ({actual_size}) does not match configured VECTOR_SIZE ({VECTOR_SIZE}).")
-            logger.info(f"Embedding model {model_name} loaded successfully (Dim: {actual_size}).")
+            self.variant = "torch"
+            self.dimension = len(self.model.encode("test"))
+            logger.info(f"Embedding model {model_name} loaded successfully (Dim: {self.dimension}).")
         except Exception as e:
             logger.error(f"Failed to load embedding model {model_name}: {e}")
             raise ImportError(f"Could not load embedding model {model_name}") from e
 
     def get_embedding(self, content, content_type="text"):
+        """Float32 vector for text or an image; raises EmbeddingError instead of returning a zero vector."""
+        if content_type.lower() == "text":
+            if not content or not content.strip(): raise EmbeddingError("Empty text content cannot be embedded")
+        elif content_type.lower() == "image":
+            if content is None: raise EmbeddingError("No image content provided")
+        else:
+            raise EmbeddingError(f"Unsupported content type: {content_type}")
         try:
-            if content_type.lower() == "text":
-                if not content or not content.strip():
-                    logger.warning("Empty text content provided, returning zero vector")
-                    return [0.0] * VECTOR_SIZE
-                embedding = self.model.encode(content)
-                return embedding.tolist()
-            elif content_type.lower() == "image":
-                if content is None:
-                    logger.warning("None image content provided, returning zero vector")
-                    return [0.0] * VECTOR_SIZE
+            if content_type.lower() == "image":
                 try:
                     # Attempt direct encode (will likely fail for text models but keeps original logic flow)
-                    embedding = self.model.encode(content)
-                    return embedding.tolist()
+                    return as_vector(self.model.encode(content))
                 except Exception as img_embed_err:
                     logger.warning(f"Failed to directly embed image with {self.model_name}: {img_embed_err}. Using placeholder text.")
-                    placeholder_text = "image content"
-                    embedding = self.model.encode(placeholder_text)
-                    return embedding.tolist()
-            else:
-                logger.error(f"Unsupported content type: {content_type}")
-                return [0.0] * VECTOR_SIZE
+                    content = IMAGE_PLACEHOLDER_TEXT
+            return as_vector(self.model.encode(content))
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
-            return [0.0] * VECTOR_SIZE
+            raise EmbeddingError(f"Could not embed {content_type} content: {e}") from e
+
+    def get_embeddings(self, texts, batch_size=EMBED_BATCH_SIZE):
+        """Embed a list of texts in batches; returns a contiguous float32 array of shape (len(texts), dim)."""
+        return as_matrix(self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True), self.dimension)
+
+def embed_texts(embedder, texts):
+    """Embed texts with the embedder's batch API when it has one, one by one otherwise.
+
+    Returns:
+        tuple: (float32 array of shape (len(texts), dim), boolean mask of the rows that were embedded)
+    """
+    if not texts: return np.zeros((0, getattr(embedder, "dimension", None) or 0), dtype=np.float32), np.zeros(0, dtype=bool)
+    if hasattr(embedder, "get_embeddings"):
+        try:
+            vectors = as_matrix(embedder.get_embeddings(texts))
+            return vectors, np.ones(len(vectors), dtype=bool)
+        except PartialEmbeddingError as e:
+            return e.vectors, e.ok
+        except EmbeddingError: raise # The embedder cannot embed at all (e.g. rejected API key); one text at a time would fail too
+        except Exception as e:
+            logger.error(f"Batch embedding failed, falling back to per-text embedding: {e}")
+    rows = []
+    for i, text in enumerate(texts):
+        try:
+            rows.append(as_vector(embedder.get_embedding(text, "text")))
+        except EmbeddingError as e:
+            rows.append(None)
+            logger.warning(f"Text {i} could not be embedded: {e}")
+    ok = np.array([row is not None for row in rows], dtype=bool)
+    dimension = next((len(row) for row in rows if row is not None), getattr(embedder, "dimension", None) or 0)
+    vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+    for i, row in enumerate(rows):
+        if row is not None: vectors[i] = row
+    return vectors, ok
+
+class PointColumns:
+    """Points as columns: IDs, payloads and one contiguous float32 (n, dim) vector matrix per named vector.
+
+    Upserted with upload_collection, so no PointStruct is built per point and the vectors stay in one
+    array until the client serialises each request batch. vectors belongs to the collection's active
+    vector; extra holds {vector_name: matrix} for the other registered models.
+    """
+    def __init__(self, ids, payloads, vectors, extra=None):
+        self.ids = ids
+        self.payloads = payloads
+        self.vectors = as_matrix(vectors)
+        self.extra = extra or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def named(self, vector_name):
+        """{vector_name: matrix, **extra} as upload_collection expects for a collection with named vectors."""
+        return {vector_name: self.vectors, **self.extra}
+
+def create_embedder(backend=None, workers=None, use_store=None, batching=False, model_name=None):
+    """Return the ingestion embedder of model_name (default EMBEDDING_MODEL_NAME) for the configured backend (SimpleEmbedder for torch).
+
+    With workers > 0 an EmbeddingPool is used instead; close() it when done. With batching, calls
+    from concurrent threads are merged into cross-document batches. Unless disabled, the embedder
+    is wrapped so texts already in the persistent embedding store (kept per model and backend
+    variant) skip the model.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    workers = EMBED_WORKERS if workers is None else workers
+    use_store = EMBED_STORE_ENABLED if use_store is None else use_store
+    model_name = model_name or EMBEDDING_MODEL_NAME
+    if workers > 0:
+        from embeddings.embed_pool import EmbeddingPool
+        embedder = EmbeddingPool(model_name, backend=backend, workers=workers, threads_per_worker=EMBED_THREADS_PER_WORKER)
+    elif backend == "torch":
+        embedder = SimpleEmbedder(model_name)
+    else:
+        embedder = get_embedder(model_name, backend=backend)
+    variant = getattr(embedder, "variant", backend) # The backend actually loaded (ONNX falls back to torch)
+    if batching:
+        from embeddings.embed_batcher import BatchingEmbedder
+        embedder = BatchingEmbedder(embedder)
+    if use_store:
+        from embeddings.embed_store import CachedEmbedder, EmbeddingStore
+        embedder = CachedEmbedder(embedder, EmbeddingStore(EMBED_STORE_DIR, model_name, variant))
+    return embedder
+
+def create_extra_embedders(written, **kwargs):
+    """Embedders ({vector_name: embedder}) of the non-active vectors in written (collection_vectors order); close() them when done."""
+    return {vector_name: create_embedder(model_name=spec["model"], **kwargs) for vector_name, spec in list(written.items())[1:]}
+
+def close_embedders(embedders):
+    for embedder in (embedders or {}).values():
+        if hasattr(embedder, "close"): embedder.close()
+
+def point_id_for(pdf_id, page_num, kind, index=0):
+    """Deterministic point ID, so re-ingesting a page overwrites its points instead of duplicating them."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{pdf_id}:{page_num + 1}:{kind}:{index}"))
+
+def extract_segment(document, page_range, images=True):
+    """Pull page texts and raw image bytes for a range of pages.
+
+    PyMuPDF is not thread-safe, so all document access happens here under FITZ_LOCK.
+    """
+    page_texts = []
+    page_images = []
+    with FITZ_LOCK, timing.span("extract"):
+        for page_num in page_range:
+            page = document[page_num]
+            page_text = page.get_text("text").strip()
+            if page_text: page_texts.append((page_num, page_text))
+            if not images: continue
+            for img_index, img_info in enumerate(page.get_images(full=True)):
+                try:
+                    base_image = document.extract_image(img_info[0])
+                    if base_image: page_images.append((page_num, img_index, base_image["image"]))
+                except Exception as img_err: logger.error(f"Error image page {page_num+1} img {img_index+1}: {img_err}", exc_info=False)
+    return page_texts, page_images
+
+def embed_extra_vectors(extra_embedders, images, texts):
+    """
+    Vectors of the other registered models for points already embedded with the active one
+
+    A model that fails on any of the points is left out of the whole segment; its vector is
+    filled in later by reembed.py, which picks up every point that lacks it.
+
+    Returns:
+        dict: {vector_name: float32 (len(images) + len(texts), dim) matrix}
+    """
+    extra = {}
+    for vector_name, extra_embedder in (extra_embedders or {}).items():
+        try:
+            with timing.span("embed_extra"):
+                rows = [as_vector(extra_embedder.get_embedding(image, "image")) for image in images]
+                if texts:
+                    text_vectors, ok = embed_texts(extra_embedder, texts)
+                    if not ok.all(): raise EmbeddingError(f"{int((~ok).sum())} of {len(texts)} texts could not be embedded")
+                    rows.append(text_vectors)
+            extra[vector_name] = np.concatenate([as_matrix(row) for row in rows]) if rows else None
+        except EmbeddingError as e:
+            logger.warning(f"Skipping vector '{vector_name}' for this segment (backfilled later): {e}")
+    return {name: vectors for name, vectors in extra.items() if vectors is not None}
+
+def build_segment_points(document, page_range, pdf_id, pdf_base_name, image_output_dir, embedder, page_text_sink=None, text_store=None,
+                         extra_embedders=None):
+    """Extract, embed and build the points for a range of pages (page texts are also appended to page_text_sink).
+
+    With a text_store the page texts are written to the sidecar and the payloads only reference them.
+    extra_embedders ({vector_name: embedder}) add the vectors of other registered models.
+    Returns a PointColumns (image points first, then text points). Raises EmbeddingError when any
+    page text could not be embedded, so the segment is retried rather than committed without it.
+    """
+    ids, payloads, image_vectors, kept_images = [], [], [], []
+    text_vectors = np.zeros((0, getattr(embedder, "dimension", None) or 0), dtype=np.float32)
+    embedded = []
+    page_texts, page_images = extract_segment(document, page_range)
+    if page_text_sink is not None: page_text_sink.extend(page_texts)
+
+    # Process Images
+    for page_num, img_index, image_bytes in page_images:
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            try:
+                with timing.span("embed_image"):
+                    image_embedding = embedder.get_embedding(image, "image")
+            except EmbeddingError as embed_err:
+                image_embedding = None
+                logger.warning(f"Failed image embed page {page_num+1} img {img_index+1}: {embed_err}")
+
+            if image_embedding is not None:
+                # Use 're' module correctly for safe filename
+                safe_pdf_base = re.sub(r'[^\w\-_\.]', '_', os.path.splitext(pdf_base_name)[0])
+                image_filename = f"{safe_pdf_base}_page_{page_num + 1}_img_{img_index + 1}.png"
+                image_save_path = os.path.join(image_output_dir, image_filename)
+                with timing.span("image_save"):
+                    image.convert("RGB").save(image_save_path, "PNG")
+
+                payload = {
+                    "pdf_id": pdf_id, # Store the PDF ID
+                    "source": pdf_base_name,
+                    "page": page_num + 1,
+                    "image_path": image_save_path, # Store relative path maybe? Needs careful handling on retrieval
+                    "type": "image"
+                }
+                ids.append(point_id_for(pdf_id, page_num, "image", img_index))
+                payloads.append(payload)
+                image_vectors.append(image_embedding)
+                if extra_embedders: kept_images.append(image)
+        except Exception as img_err: logger.error(f"Error image page {page_num+1} img {img_index+1}: {img_err}", exc_info=False)
+
+    # Embed page texts in batches
+    try:
+        with timing.span("embed_text"):
+            text_embeddings, embedded_ok = embed_texts(embedder, [text for _, text in page_texts])
+        failed = [page_num + 1 for (page_num, _), ok in zip(page_texts, embedded_ok) if not ok]
+        # A page left out here would never be re-embedded once the segment is checkpointed
+        if failed: raise EmbeddingError(f"Could not embed the text of page(s) {', '.join(map(str, failed))}")
+        embedded = page_texts
+        text_vectors = text_embeddings
+        text_refs = {}
+        if text_store is not None:
+            # Written before the points are upserted, so a point is never visible without its text
+            with timing.span("text_store"):
+                text_refs = text_store.append(pdf_id, [(point_id_for(pdf_id, page_num, "text"), page_text) for page_num, page_text in embedded])
+        for page_num, page_text in embedded:
+            point_id = point_id_for(pdf_id, page_num, "text")
+            payload = {
+                "pdf_id": pdf_id, # Store the PDF ID
+                "source": pdf_base_name,
+                "page": page_num + 1,
+                "type": "text"
+            }
+            if point_id in text_refs: payload.update(text_refs[point_id])
+            else: payload["text"] = page_text
+            ids.append(point_id)
+            payloads.append(payload)
+    except EmbeddingError: raise # The embedder cannot embed at all (e.g. rejected API key); the segment fails
+    except Exception as text_err:
+        logger.error(f"Error embedding page texts: {text_err}")
+        del ids[len(image_vectors):], payloads[len(image_vectors):] # Keep the columns aligned with the vectors
+        text_vectors = text_vectors[:0]
+        embedded = []
+    parts = ([as_matrix(image_vectors)] if image_vectors else []) + ([text_vectors] if len(text_vectors) else [])
+    vectors = np.concatenate(parts) if len(parts) > 1 else (parts[0] if parts else text_vectors)
+    extra = embed_extra_vectors(extra_embedders, kept_images, [page_text for _, page_text in embedded]) if ids else {}
+    return PointColumns(ids, payloads, vectors, extra)
+
+def add_projected_vectors(points, vector_name, projections):
+    """Add the reduced vectors of the projected ones to points.extra (projections from embeddings.projection.projections_for)."""
+    for source, reduced_name, projection in projections:
+        vectors = points.vectors if source == vector_name else points.extra.get(source)
+        if vectors is not None and len(vectors):
+            with timing.span("project"):
+                points.extra[reduced_name] = projection.transform(vectors)
+
+def upsert_points(client, collection_name, points, batch_size=100, shard_key=None, vector_name=LEGACY_VECTOR):
+    """Upsert PointColumns in batches of batch_size, waiting for each batch to be committed.
+
+    The vector matrices go to upload_collection as they are, keyed by vector name; the client slices them per request.
+    """
+    if not len(points): return
+    with timing.span("upsert"):
+        client.upload_collection(collection_name=collection_name, vectors=points.named(vector_name), payload=points.payloads,
+                                 ids=points.ids, batch_size=batch_size, wait=True, shard_key_selector=shard_key)
+
+def build_keyphrases(pdf_id, page_texts, source, fingerprint):
+    """Write the keyphrase artifact for a document and return it; failures are logged, never fatal to ingestion."""
+    try:
+        with timing.span("keyphrases"):
+            artifact = build_artifact(pdf_id, page_texts, source=source, fingerprint=fingerprint)
+            KeyphraseStore(KEYPHRASE_DIR).save(artifact)
+        logger.info(f"Keyphrase artifact for PDF {pdf_id}: {len(artifact['terms'])} terms, {len(artifact['entities'])} entities.")
+        return artifact
+    except Exception as e:
+        logger.warning(f"Could not build keyphrase artifact for PDF {pdf_id}: {e}", exc_info=True)
+        return None
+
+def fetch_text_vectors(client, collection_name, pdf_id, shard_key=None, vector_name=LEGACY_VECTOR):
+    """All text chunks of a document as (point_id, page, vector of vector_name), read back from Qdrant."""
+    chunks = []
+    offset = None
+    qdrant_filter = models.Filter(must=[
+        models.FieldCondition(key="pdf_id", match=models.MatchValue(value=pdf_id)),
+        models.FieldCondition(key="type", match=models.MatchValue(value="text")),
+    ])
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, scroll_filter=qdrant_filter, limit=1000,
+                                       offset=offset, with_payload=["page"], with_vectors=[vector_name] if vector_name else True,
+                                       shard_key_selector=shard_key)
+        chunks.extend((p.id, (p.payload or {}).get("page"), vector_of(p, vector_name)) for p in points if vector_of(p, vector_name) is not None)
+        if offset is None: break
+    return chunks
+
+def build_topics(pdf_id, text_chunks, source, collection_name, keyphrase_artifact=None):
+    """Cluster a document's text chunks and write its topic artifact; failures are logged, never fatal."""
+    try:
+        with timing.span("topics"):
+            if not text_chunks: return None
+            point_ids, pages, vectors = zip(*text_chunks)
+            topics = cluster_document(list(point_ids), list(pages), np.asarray(vectors, dtype=np.float32),
+                                      (keyphrase_artifact or {}).get("pages"))
+            TopicStore(TOPIC_DIR).save(pdf_id, topics, source=source, collection=collection_name)
+        logger.info(f"Topic artifact for PDF {pdf_id}: {topics['k']} topics (silhouette {topics['silhouette']}).")
+        return topics["k"]
+    except Exception as e:
+        logger.warning(f"Could not build topic artifact for PDF {pdf_id}: {e}", exc_info=True)
+        return None
 
 # Using process_pdf function name, includes pdf_id argument
-def process_pdf(pdf_path, pdf_id, collection_name=DEFAULT_COLLECTION):
-    """Process PDF, extract text & images, compute embeddings, store in Qdrant with pdf_id."""
+def process_pdf(pdf_path, pdf_id, collection_name=DEFAULT_COLLECTION, client=None, embedder=None,
+                segment_pages=CHECKPOINT_SEGMENT_PAGES, resume=True, check_collection=True, keyphrases=KEYPHRASES_ENABLED,
+                topics=TOPICS_ENABLED, tenant_id=None, router=None, extra_embedders=None):
+    """Process PDF, extract text & images, compute embeddings, store in Qdrant with pdf_id.
+
+    Pages are committed in segments of segment_pages and progress is checkpointed per pdf_id,
+    so a rerun after a failure resumes at the last committed segment (a failed segment returns
+    success False with its first page as resume_page). Point IDs are deterministic,
+    which makes a resumed run produce exactly the points of a clean one.
+    An existing Qdrant client and embedder can be passed in to reuse them across calls; callers that
+    already ensured the target collection can skip the per-document check with check_collection=False.
+    With keyphrases=True the page texts also feed a TF-IDF keyphrase/entity artifact (utils.keyphrases);
+    with topics=True the text embeddings are clustered into a topic artifact (utils.topics).
+    Points go to the physical collection/shard that utils.routing assigns to the pdf_id (or
+    tenant_id); router defaults to the shared router of collection_name.
+    The embedder must be the collection's active model (embeddings.registry; created when not given).
+    Vectors of the other registered models are written too, with extra_embedders ({vector_name: embedder})
+    or embedders created for this call, and so are the reduced copies of vectors with a fitted projection.
+    """
     if not pdf_id:
         logger.error("Missing pdf_id for processing.")
         return {"success": False, "error": "PDF ID not provided to embedding script."}
 
+    owned_extra = None
     try:
-        logger.info(f"Processing PDF: {pdf_path} (ID: {pdf_id}) into collection: {collection_name}")
-        embedder = SimpleEmbedder()
-        client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=30)
+        router = router or routing.router(collection_name)
+        target = router.target(pdf_id, tenant_id)
+        logger.info(f"Processing PDF: {pdf_path} (ID: {pdf_id}) into collection: {target.collection}"
+                    + (f" shard key {target.shard_key}" if target.shard_key else ""))
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=30)
+        with timing.span("model_load"):
+            embedder = embedder or create_embedder(model_name=ModelRegistry().active(collection_name)[1])
 
-        # --- CORRECTED Qdrant Collection Check (Includes vector size fix) ---
+        # --- Qdrant Collection Check (one named vector per registered model) ---
         try:
-            logger.info(f"Checking collection '{collection_name}'...")
-            collections = client.get_collections().collections
-            collection_info = next((c for c in collections if c.name == collection_name), None)
-
-            if collection_info:
-                full_collection_info = client.get_collection(collection_name=collection_name)
-                try:
-                    existing_size = -1 # Default to invalid size
-                    if hasattr(full_collection_info, 'config') and hasattr(full_collection_info.config, 'params') and hasattr(full_collection_info.config.params, 'vectors'):
-                        vectors_config = full_collection_info.config.params.vectors
-                        # Handle both single default vector config and named vector dict
-                        if isinstance(vectors_config, models.VectorParams):
-                             existing_size = vectors_config.size
-                        elif isinstance(vectors_config, dict):
-                             # Assuming default unnamed vector params if it's a dict
-                             if '' in vectors_config and isinstance(vectors_config[''], models.VectorParams):
-                                  existing_size = vectors_config[''].size
-                             elif models.DEFAULT_VECTOR_NAME in vectors_config and isinstance(vectors_config[models.DEFAULT_VECTOR_NAME], models.VectorParams):
-                                  existing_size = vectors_config[models.DEFAULT_VECTOR_NAME].size
-                             else: # Check if any key holds VectorParams (for older/custom named vectors)
-                                 for key in vectors_config:
-                                     if isinstance(vectors_config[key], models.VectorParams):
-                                         existing_size = vectors_config[key].size
-                                         logger.info(f"Using size from named vector config '{key}'")
-                                         break
-                        if existing_size == -1: logger.warning(f"Could not determine vector size format. Recreating.")
-                    else: logger.warning(f"Could not find vector config structure. Recreating.")
-
-                    if existing_size != -1 and existing_size != VECTOR_SIZE:
-                        logger.warning(f"Collection '{collection_name}' size mismatch ({existing_size}!={VECTOR_SIZE}). Recreating.")
-                        client.delete_collection(collection_name=collection_name, timeout=60)
-                        collection_info = None # Force recreation
-                    elif existing_size == VECTOR_SIZE:
-                        logger.info(f"Collection '{collection_name}' exists with correct vector size {VECTOR_SIZE}.")
-                    # else existing_size remained -1, handled below by collection_info being None
-
-                except AttributeError as ae:
-                    logger.warning(f"Could not access vector config attributes for '{collection_name}': {ae}. Recreating.")
-                    client.delete_collection(collection_name=collection_name, timeout=60)
-                    collection_info = None
-            # Create if it doesn't exist or was deleted
-            if not collection_info:
-                logger.info(f"Creating collection: {collection_name} size {VECTOR_SIZE}")
-                client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE),
-                    timeout=60
-                )
+            written = collection_vectors(client, collection_name, embedder, router)
+            vector_name = next(iter(written))
+            projections = projections_for(collection_name, written, projection_store)
+            if check_collection:
+                sizes = {name: spec["dimension"] for name, spec in written.items()}
+                sizes.update({reduced: projection.dimension for _, reduced, projection in projections})
+                rescore_only = [name for name, spec in written.items() if spec.get("projection", {}).get("rescore_only")]
+                with timing.span("collection_setup"):
+                    router.ensure(client, target, lambda c, name, **kwargs: ensure_collection(c, name, sizes, rescore_only, **kwargs))
+            if extra_embedders is None and len(written) > 1:
+                with timing.span("model_load"):
+                    extra_embedders = owned_extra = create_extra_embedders(written)
         except Exception as e:
             logger.error(f"Error setting up Qdrant collection: {e}", exc_info=True)
             return {"success": False, "error": f"Qdrant collection setup failed: {e}"}
-        # --- END CORRECTED Qdrant Check ---
+        # --- END Qdrant Check ---
 
-        document = fitz.open(pdf_path)
+        with timing.span("pdf_open"):
+            with FITZ_LOCK: document = fitz.open(pdf_path)
+            fingerprint = pdf_fingerprint(pdf_path)
         num_pages = len(document)
         logger.info(f"PDF has {num_pages} pages")
 
-        points_to_upsert = []
-        embeddings_count = 0
+        segment_pages = max(1, segment_pages)
+        checkpoints = CheckpointStore(CHECKPOINT_DIR)
+        checkpoint = checkpoints.load(collection_name, pdf_id, fingerprint, segment_pages) if resume else None
+        start_page = min(checkpoint["next_page"], num_pages) if checkpoint else 0
+        embeddings_count = checkpoint["embeddings_count"] if checkpoint else 0
+        if start_page: logger.info(f"Resuming PDF {pdf_id} at page {start_page + 1}/{num_pages} ({embeddings_count} points already committed)")
+
         pdf_base_name = os.path.basename(pdf_path)
         pdf_dir = os.path.dirname(pdf_path)
         image_output_dir = os.path.join(pdf_dir, IMAGE_SAVE_DIR_RELATIVE)
         os.makedirs(image_output_dir, exist_ok=True)
         logger.info(f"Image output directory: {image_output_dir}")
 
-        # Process each page
-        for page_num, page in enumerate(document):
-            # Process Text
-            page_text = page.get_text("text").strip()
-            if page_text:
+        page_texts = None
+        if keyphrases:
+            # Pages committed by an earlier run are only re-read for text, not re-embedded
+            page_texts = extract_segment(document, range(start_page), images=False)[0] if start_page else []
+        text_chunks = [] if topics and not start_page else None # Resumed runs read all chunks back from Qdrant instead
+        text_store = TextStore(TEXT_STORE_DIR) if TEXT_SIDECAR_ENABLED else None
+        # Drop the records of an earlier ingest (starting from page one) or of segments written but never committed
+        if text_store is not None and not start_page: text_store.truncate(pdf_id)
+        elif text_store is not None and checkpoint.get("text_store_size") is not None: text_store.truncate(pdf_id, checkpoint["text_store_size"])
+
+        # Process and commit each page segment
+        for segment_start in range(start_page, num_pages, segment_pages):
+            segment_end = min(segment_start + segment_pages, num_pages)
+            try:
+                points = build_segment_points(document, range(segment_start, segment_end), pdf_id, pdf_base_name, image_output_dir, embedder,
+                                              page_texts, text_store, extra_embedders)
+            except EmbeddingError as e:
+                logger.error(f"Embedding failed for PDF {pdf_id} pages {segment_start + 1}-{segment_end}: {e}")
                 try:
-                    text_embedding = embedder.get_embedding(page_text, "text")
-                    if text_embedding != [0.0] * VECTOR_SIZE:
-                        payload = {
-                            "pdf_id": pdf_id, # Store the PDF ID
-                            "source": pdf_base_name,
-                            "page": page_num + 1,
-                            "text": page_text,
-                            "type": "text"
-                        }
-                        # Use UUID for point ID
-                        point_id = str(uuid.uuid4())
-                        points_to_upsert.append( models.PointStruct(id=point_id, vector=text_embedding, payload=payload) )
-                        embeddings_count += 1
-                    else: logger.warning(f"Failed text embed page {page_num+1}")
-                except Exception as text_err: logger.error(f"Error text page {page_num+1}: {text_err}")
-
-            # Process Images
-            image_list = page.get_images(full=True)
-            for img_index, img_info in enumerate(image_list):
+                    with FITZ_LOCK: document.close()
+                except Exception: pass
+                return {"success": False, "error": f"Embedding failed: {e}", "resume_page": segment_start + 1}
+            add_projected_vectors(points, vector_name, projections)
+            if points:
+                logger.info(f"Upserting {len(points)} points for PDF {pdf_id} pages {segment_start + 1}-{segment_end}...")
                 try:
-                    img_index_in_doc = img_info[0]
-                    base_image = document.extract_image(img_index_in_doc)
-                    if not base_image: continue
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    image = Image.open(io.BytesIO(image_bytes))
-                    image_embedding = embedder.get_embedding(image, "image")
-
-                    if image_embedding != [0.0] * VECTOR_SIZE:
-                        # Use 're' module correctly for safe filename
-                        safe_pdf_base = re.sub(r'[^\w\-_\.]', '_', os.path.splitext(pdf_base_name)[0])
-                        image_filename = f"{safe_pdf_base}_page_{page_num + 1}_img_{img_index + 1}.png"
-                        image_save_path = os.path.join(image_output_dir, image_filename)
-                        image.convert("RGB").save(image_save_path, "PNG")
-
-                        payload = {
-                            "pdf_id": pdf_id, # Store the PDF ID
-                            "source": pdf_base_name,
-                            "page": page_num + 1,
-                            "image_path": image_save_path, # Store relative path maybe? Needs careful handling on retrieval
-                            "type": "image"
-                        }
-                        # Use UUID for point ID
-                        point_id = str(uuid.uuid4())
-                        points_to_upsert.append( models.PointStruct(id=point_id, vector=image_embedding, payload=payload) )
-                        embeddings_count += 1
-                    else: logger.warning(f"Failed image embed page {page_num+1} img {img_index+1}")
-                except Exception as img_err: logger.error(f"Error image page {page_num+1} img {img_index+1}: {img_err}", exc_info=False)
+                    upsert_points(client, target.collection, points, shard_key=target.shard_key, vector_name=vector_name)
+                except Exception as e:
+                     logger.error(f"Qdrant upsert failed for PDF {pdf_id}: {e}", exc_info=True)
+                     error_detail = str(e)
+                     if hasattr(e, 'http_body'): error_detail = getattr(e, 'http_body', str(e)) # Get specific Qdrant error if available
+                     try:
+                         with FITZ_LOCK: document.close()
+                     except Exception: pass
+                     return {"success": False, "error": f"Qdrant upsert failed: {error_detail}", "resume_page": segment_start + 1}
+            embeddings_count += len(points)
+            if text_chunks is not None:
+                text_chunks.extend((point_id, payload["page"], vector) for point_id, payload, vector
+                                   in zip(points.ids, points.payloads, points.vectors) if payload.get("type") == "text")
+            checkpoints.save(collection_name, pdf_id, fingerprint, segment_pages, segment_end, embeddings_count, num_pages,
+                             text_store.size(pdf_id) if text_store is not None else None)
 
-        try: document.close()
+        try:
+            with FITZ_LOCK: document.close()
         except Exception as close_err: logger.error(f"Error closing PDF: {close_err}")
+        checkpoints.clear(collection_name, pdf_id)
+        keyphrase_artifact = build_keyphrases(pdf_id, page_texts, pdf_base_name, fingerprint) if keyphrases else None
+        topic_count = None
+        if topics:
+            if text_chunks is None: text_chunks = fetch_text_vectors(client, target.collection, pdf_id, target.shard_key, vector_name)
+            topic_count = build_topics(pdf_id, text_chunks, pdf_base_name, collection_name, keyphrase_artifact)
+        if not embeddings_count: logger.warning("No text or image content found/embedded.")
+        else: logger.info(f"Upsert successful for {embeddings_count} points (PDF ID: {pdf_id}).")
 
-        # Batch upsert
-        if points_to_upsert:
-            logger.info(f"Upserting {len(points_to_upsert)} points for PDF {pdf_id}...")
-            try:
-                batch_size = 100
-                for i in range(0, len(points_to_upsert), batch_size):
-                    batch = points_to_upsert[i:i+batch_size]
-                    client.upsert(collection_name=collection_name, points=batch, wait=True)
-                logger.info(f"Upsert successful for {len(points_to_upsert)} points (PDF ID: {pdf_id}).")
-            except Exception as e:
-                 logger.error(f"Qdrant upsert failed for PDF {pdf_id}: {e}", exc_info=True)
-                 error_detail = str(e)
-                 if hasattr(e, 'http_body'): error_detail = getattr(e, 'http_body', str(e)) # Get specific Qdrant error if available
-                 return {"success": False, "error": f"Qdrant upsert failed: {error_detail}"}
-        else: logger.warning("No text or image content found/embedded.")
-
-        result = {"success": True, "filename": pdf_base_name, "page_count": num_pages, "embeddings_count": embeddings_count, "collection": collection_name}
+        result = {"success": True, "filename": pdf_base_name, "page_count": num_pages, "embeddings_count": embeddings_count, "collection": target.collection}
+        if target.shard_key: result["shard_key"] = target.shard_key
+        if start_page: result["resumed_from_page"] = start_page + 1
+        if keyphrase_artifact is not None: result["keyphrase_terms"] = len(keyphrase_artifact["terms"])
+        if topic_count is not None: result["topics"] = topic_count
+        timer = timing.current_timer()
+        if timer: result["timings"] = timer.as_dict()
+        if hasattr(embedder, "hits"): result["embedding_store"] = {"hits": embedder.hits, "misses": embedder.misses}
         logger.info(f"Successfully processed PDF: {pdf_base_name} (ID: {pdf_id})")
         return result
 
@@ -237,15 +524,147 @@ def process_pdf(pdf_path, pdf_id, collection_name=DEFAULT_COLLECTION):
              try: document.close()
              except: pass
         return {"success": False, "error": f"General error: {str(e)}"}
+    finally:
+        close_embedders(owned_extra)
+
+def iter_manifest(manifest_path):
+    """Yield (pdf_path, pdf_id) from a manifest.
+
+    Each line is either JSON ({"path": ..., "pdf_id": ...}) or 'path<TAB>pdf_id' / 'path,pdf_id';
+    a missing pdf_id defaults to the file name without extension. Relative paths are
+    resolved against the manifest's directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                pdf_path, pdf_id = entry.get("path"), entry.get("pdf_id")
+            else:
+                parts = [p.strip() for p in re.split(r"\t|,", line, maxsplit=1)]
+                pdf_path, pdf_id = parts[0], (parts[1] if len(parts) > 1 else None)
+            if not pdf_path:
+                logger.warning(f"Skipping manifest line {line_no}: no path")
+                continue
+            pdf_path = os.path.join(base_dir, pdf_path) if not os.path.isabs(pdf_path) else pdf_path
+            yield pdf_path, pdf_id or os.path.splitext(os.path.basename(pdf_path))[0]
+
+def iter_pdf_dir(pdf_dir):
+    """Yield (pdf_path, pdf_id) for every PDF under pdf_dir; pdf_id is the file name without extension."""
+    for root, _, files in sorted(os.walk(pdf_dir)):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(root, name), os.path.splitext(name)[0]
+
+def _process_one(pdf_path, pdf_id, collection_name, client, embedder, segment_pages, resume, tenant_id, router, extra_embedders):
+    with timing.collect():
+        result = process_pdf(pdf_path, pdf_id, collection_name, client=client, embedder=embedder,
+                             segment_pages=segment_pages, resume=resume, tenant_id=tenant_id, router=router,
+                             extra_embedders=extra_embedders)
+    result.pop("embedding_store", None) # Shared counters; reported once in the summary
+    return {"pdf_id": pdf_id, "path": pdf_path, **result}
+
+def process_bulk(jobs, collection_name=DEFAULT_COLLECTION, concurrency=BULK_CONCURRENCY, client=None, embedder=None,
+                 segment_pages=CHECKPOINT_SEGMENT_PAGES, resume=True, out=None, tenant_id=None):
+    """Ingest many PDFs with one shared embedder and Qdrant client, writing one JSON line per document.
+
+    jobs is an iterable of (pdf_path, pdf_id) consumed lazily; at most 2 * concurrency documents
+    are in flight, which keeps memory bounded regardless of manifest size. Returns a summary dict.
+    Each routed collection/shard is checked once, by the first document that lands in it. The
+    embedders of the collection's other registered models are also created once and shared.
+    """
+    out = out or sys.stdout
+    client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=30)
+    router = routing.Router(collection_name)
+    extra_embedders = create_extra_embedders(collection_vectors(client, collection_name, embedder, router), batching=True)
+    summary = {"summary": True, "documents": 0, "succeeded": 0, "failed": 0, "embeddings_count": 0, "pages": 0}
+    started = time.perf_counter()
+
+    def emit(future):
+        try:
+            result = future.result()
+        except Exception as e:
+            pdf_path, pdf_id = in_flight[future]
+            result = {"pdf_id": pdf_id, "path": pdf_path, "success": False, "error": f"General error: {e}"}
+        summary["documents"] += 1
+        if result.get("success"):
+            summary["succeeded"] += 1
+            summary["embeddings_count"] += result.get("embeddings_count", 0)
+            summary["pages"] += result.get("page_count", 0)
+        else: summary["failed"] += 1
+        out.write(json.dumps(result) + "\n"); out.flush()
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingest") as pool:
+        for pdf_path, pdf_id in jobs:
+            if len(in_flight) >= concurrency * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done: emit(future); del in_flight[future]
+            in_flight[pool.submit(_process_one, pdf_path, pdf_id, collection_name, client, embedder, segment_pages, resume,
+                                  tenant_id, router, extra_embedders)] = (pdf_path, pdf_id)
+        done, _ = wait(in_flight)
+        for future in done: emit(future)
+    close_embedders(extra_embedders)
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    if hasattr(embedder, "hits"): summary["embedding_store"] = {"hits": embedder.hits, "misses": embedder.misses}
+    return summary
+
+def run_bulk(args):
+    """Bulk CLI mode: stream JSON lines per document, then a summary line. Returns the exit code."""
+    jobs = iter_manifest(args.manifest) if args.manifest else iter_pdf_dir(args.pdf_dir)
+    embedder = create_embedder(workers=args.embed_workers, use_store=not args.no_embed_store, batching=True,
+                               model_name=ModelRegistry().active(args.collection_name)[1])
+    try:
+        summary = process_bulk(jobs, args.collection_name, max(1, args.concurrency), embedder=embedder,
+                               segment_pages=args.segment_pages, resume=not args.no_resume, tenant_id=args.tenant_id)
+    finally:
+        embedder.close()
+    print(json.dumps(summary), flush=True)
+    return 0 if summary["failed"] == 0 else 1
 
 def main():
     parser = argparse.ArgumentParser(description='Compute embeddings for PDF (Text & Image w/ Text Model), store in Qdrant.')
-    parser.add_argument('pdf_path', help='Path to the PDF file')
-    parser.add_argument('--pdf_id', required=True, help='MongoDB ID of the PDF document')
+    parser.add_argument('pdf_path', nargs='?', help='Path to the PDF file')
+    parser.add_argument('--pdf_id', help='MongoDB ID of the PDF document (required with pdf_path)')
+    parser.add_argument('--manifest', help='Bulk mode: file of path/pdf_id pairs (JSON lines, TSV or CSV)')
+    parser.add_argument('--pdf_dir', help='Bulk mode: ingest every PDF under this directory (pdf_id = file name)')
+    parser.add_argument('--concurrency', type=int, default=BULK_CONCURRENCY, help='Bulk mode: documents processed at once')
     parser.add_argument('--collection_name', default=DEFAULT_COLLECTION, help='Name of the Qdrant collection')
+    parser.add_argument('--tenant_id', default=None, help='Tenant owning the document(s); routes them under TENANT_ROUTING (default: bucket by pdf_id)')
+    parser.add_argument('--profile', nargs='?', const='compute_embeddings.prof', default=None, help='Run under cProfile and dump stats to this file')
+    parser.add_argument('--metrics_file', default=None, help='Write per-stage timings in Prometheus text format to this file')
+    parser.add_argument('--fast_log', action='store_true', help='Low-overhead logging: only warnings and errors')
+    parser.add_argument('--embed_workers', type=int, default=EMBED_WORKERS, help='Embedding worker processes (0 embeds in-process)')
+    parser.add_argument('--no_embed_store', action='store_true', help='Always embed with the model; do not read or write the embedding store')
+    parser.add_argument('--segment_pages', type=int, default=CHECKPOINT_SEGMENT_PAGES, help='Pages committed to Qdrant per checkpointed segment')
+    parser.add_argument('--no_resume', action='store_true', help='Ignore any checkpoint and ingest from page one')
     args = parser.parse_args()
 
-    result = process_pdf(args.pdf_path, args.pdf_id, args.collection_name)
+    if args.fast_log: timing.configure_fast_logging()
+    if args.manifest or args.pdf_dir:
+        sys.exit(run_bulk(args))
+    if not args.pdf_path or not args.pdf_id:
+        parser.error("pdf_path and --pdf_id are required unless --manifest or --pdf_dir is given")
+    embedder = None
+    try:
+        with timing.collect() as timer:
+            with timing.span("model_load"):
+                embedder = create_embedder(workers=args.embed_workers, use_store=not args.no_embed_store,
+                                           model_name=ModelRegistry().active(args.collection_name)[1])
+            if args.profile:
+                result = timing.run_profiled(args.profile, process_pdf, args.pdf_path, args.pdf_id, args.collection_name, embedder=embedder,
+                                             segment_pages=args.segment_pages, resume=not args.no_resume, tenant_id=args.tenant_id)
+            else:
+                result = process_pdf(args.pdf_path, args.pdf_id, args.collection_name, embedder=embedder,
+                                     segment_pages=args.segment_pages, resume=not args.no_resume, tenant_id=args.tenant_id)
+    finally:
+        if hasattr(embedder, "close"): embedder.close()
+    if args.metrics_file:
+        try: timer.write_prometheus(args.metrics_file, "ingest", {"collection": args.collection_name})
+        except OSError as e: logger.error(f"Could not write metrics file {args.metrics_file}: {e}")
     print(json.dumps(result)) # Output result as JSON for backend
 
 if __name__ == "__main__":
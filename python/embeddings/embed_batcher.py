@@ -0,0 +1,129 @@
+# FILE: python/embeddings/embed_batcher.py
+# Thread-safe micro-batcher: get_embeddings calls from several ingestion threads are merged
+# into larger cross-document batches for one shared underlying embedder.
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from .vectors import PartialEmbeddingError, as_matrix, concat_batches
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_MAX_BATCH = 256     # Texts per call into the underlying embedder
+DEFAULT_MAX_WAIT_MS = 20    # How long to wait for more requests before flushing a partial batch
+DEFAULT_MAX_PENDING = 64    # Requests queued before callers block (bounds memory)
+# --- End Configuration ---
+
+
+class BatchingEmbedder:
+    """
+    Embedder that coalesces concurrent get_embeddings requests into shared batches
+
+    Results are split back per request in input order; when the underlying embedder reports
+    a partial failure, each request gets a PartialEmbeddingError for its own rows only. Image
+    embeddings bypass the batcher and are serialized on the underlying embedder.
+    """
+
+    def __init__(self, embedder, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS, max_pending=DEFAULT_MAX_PENDING):
+        """
+        Start the batching thread
+
+        Args:
+            embedder: Underlying embedder with get_embeddings
+            max_batch (int): Upper bound on texts per underlying call
+            max_wait_ms (float): Flush delay for partial batches
+            max_pending (int): Bounded request queue size
+        """
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._direct_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        carry = None
+        while True:
+            item = carry or self._queue.get()
+            carry = None
+            if item is None: return
+            pending = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_wait_s
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0: break
+                try:
+                    nxt = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None) # Finish this batch, then stop
+                    break
+                if size + len(nxt[0]) > self.max_batch:
+                    carry = nxt
+                    break
+                pending.append(nxt)
+                size += len(nxt[0])
+            self._flush(pending)
+
+    def _flush(self, pending):
+        texts = [t for request_texts, _ in pending for t in request_texts]
+        failed = np.zeros(len(texts), dtype=bool)
+        try:
+            vectors = as_matrix(self.embedder.get_embeddings(texts))
+        except PartialEmbeddingError as e:
+            vectors = e.vectors
+            failed[e.failed] = True
+        except Exception as e:
+            for _, future in pending: future.set_exception(e)
+            return
+        self.batches += 1
+        offset = 0
+        for request_texts, future in pending:
+            rows = slice(offset, offset + len(request_texts))
+            if failed[rows].any(): future.set_exception(PartialEmbeddingError(vectors[rows], np.flatnonzero(failed[rows])))
+            else: future.set_result(vectors[rows])
+            offset += len(request_texts)
+
+    def get_embeddings(self, texts):
+        """Embed texts as part of a shared batch; blocks until this request's vectors are ready."""
+        if self._closed: raise RuntimeError("BatchingEmbedder is closed")
+        if not texts:
+            return np.zeros((0, getattr(self.embedder, "dimension", 0)), dtype=np.float32)
+        future = Future()
+        # Oversized requests are split so no single call exceeds max_batch
+        if len(texts) > self.max_batch:
+            parts = []
+            for i in range(0, len(texts), self.max_batch):
+                try: parts.append(self.get_embeddings(texts[i:i + self.max_batch]))
+                except PartialEmbeddingError as e: parts.append(e)
+            return concat_batches(parts)
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def get_embedding(self, content, content_type='text'):
+        if content_type == 'text' and isinstance(content, str):
+            return self.get_embeddings([content])[0]
+        with self._direct_lock:
+            return self.embedder.get_embedding(content, content_type)
+
+    @property
+    def dimension(self):
+        return getattr(self.embedder, "dimension", None)
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if hasattr(self.embedder, "close"): self.embedder.close()
@@ -1,29 +1,48 @@
 # D:\rag-app\python\embeddings\embed_factory.py
 
 import logging
-from .local_embed import LocalEmbedder
+import os
+from .registry import DEFAULT_MODEL_NAME
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_embedder(model_name=None, **kwargs):
+# --- Configuration ---
+DEFAULT_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch") # 'torch', 'onnx' (fp32) or 'onnx-int8'
+# --- End Configuration ---
+
+def get_embedder(model_name=None, backend=None, **kwargs):
     """
     Factory function to get an embedder instance
 
+    Backends are imported lazily so the ONNX backends never import torch.
+
     Args:
         model_name (str, optional): Name of the model to use
+        backend (str, optional): 'torch', 'onnx' or 'onnx-int8' (default: EMBEDDING_BACKEND env var)
         **kwargs: Additional arguments for the embedder
 
     Returns:
         object: An embedder instance
     """
-    logger.info(f"Getting embedder instance for model: {model_name}")
+    backend = (backend or DEFAULT_BACKEND).lower()
+    logger.info(f"Getting embedder instance for model: {model_name} (backend: {backend})")
 
     # Use a default model if none provided
     if not model_name:
-        model_name = 'all-MiniLM-L6-v2'
+        model_name = DEFAULT_MODEL_NAME
         logger.info(f"No model specified, using default: {model_name}")
 
-    # Currently we only support local sentence-transformers models
-    return LocalEmbedder(model_name=model_name)
\ No newline at end of file
+    if backend in ("onnx", "onnx-int8"):
+        try:
+            from .onnx_embed import OnnxEmbedder
+            return OnnxEmbedder(model_name=model_name, quantized=(backend == "onnx-int8"), **kwargs)
+        except Exception as e:
+            logger.error(f"Could not load ONNX embedder for {model_name}: {e}")
+            logger.warning("Falling back to the PyTorch sentence-transformers backend")
+    elif backend != "torch":
+        logger.warning(f"Unknown embedding backend '{backend}', using torch")
+
+    from .local_embed import LocalEmbedder
+    return LocalEmbedder(model_name=model_name)
@@ -0,0 +1,133 @@
+# FILE: python/embeddings/embed_pool.py
+# Multi-process embedding pool. Small models like all-MiniLM-L6-v2 scale poorly with
+# intra-op threads, so throughput on many-core hosts comes from several single- or
+# few-threaded worker processes each holding its own copy of the model.
+
+import logging
+import multiprocessing
+import os
+import numpy as np
+from .registry import DEFAULT_MODEL_NAME
+from .vectors import IMAGE_PLACEHOLDER_TEXT, EmbeddingError, as_matrix
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_CHUNK_SIZE = 64 # Texts per task sent to a worker
+# --- End Configuration ---
+
+_worker_embedder = None
+
+
+def _init_worker(model_name, backend, threads, pin_cpus, counter):
+    """Runs once per worker process: pin threads (and optionally CPUs), then load the model."""
+    global _worker_embedder
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if pin_cpus and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        start = (worker_index * threads) % len(cpus)
+        os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(threads)})
+
+    if backend.startswith("onnx"):
+        from .embed_factory import get_embedder
+        _worker_embedder = get_embedder(model_name, backend=backend, intra_op_threads=threads)
+    else:
+        import torch
+        torch.set_num_threads(threads)
+        try: torch.set_num_interop_threads(1)
+        except RuntimeError: pass # Already set by an earlier parallel op
+        from .local_embed import LocalEmbedder
+        _worker_embedder = LocalEmbedder(model_name=model_name)
+    logger.info(f"Embedding worker {worker_index} (pid {os.getpid()}) ready with {threads} thread(s)")
+
+
+def _embed_chunk(texts):
+    return _worker_embedder.get_embeddings(texts)
+
+
+def _worker_variant():
+    return getattr(_worker_embedder, "variant", "torch")
+
+
+class EmbeddingPool:
+    """
+    Embedder that shards batches across N worker processes and returns results in input order
+
+    Implements the same get_embedding/get_embeddings interface as the in-process embedders.
+    Create it once and reuse it for many documents; workers load the model a single time.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, backend='torch', workers=None, threads_per_worker=1,
+                 chunk_size=DEFAULT_CHUNK_SIZE, pin_cpus=False):
+        """
+        Start the worker processes
+
+        Args:
+            model_name (str): Embedding model each worker loads
+            backend (str): 'torch', 'onnx' or 'onnx-int8'
+            workers (int, optional): Number of worker processes (default: cpu_count // threads_per_worker)
+            threads_per_worker (int): Intra-op threads pinned in each worker
+            chunk_size (int): Texts per task dispatched to a worker
+            pin_cpus (bool): Give each worker its own CPU set (Linux only)
+        """
+        self.model_name = model_name
+        self.backend = backend
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        self.chunk_size = chunk_size
+        # spawn keeps workers free of any torch/OpenMP state the parent already initialized
+        ctx = multiprocessing.get_context("spawn")
+        counter = ctx.Value("i", 0)
+        logger.info(f"Starting embedding pool: {self.workers} workers x {self.threads_per_worker} thread(s), backend {backend}")
+        self._pool = ctx.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(model_name, backend, self.threads_per_worker, pin_cpus, counter)
+        )
+        self.dimension = self.get_embeddings(["test"]).shape[1]
+        self.variant = self._pool.apply(_worker_variant) # What the workers loaded; ONNX falls back to torch when the export is missing
+
+    def get_embeddings(self, texts):
+        """
+        Embed a list of texts across the pool
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimension), rows in input order
+        """
+        if not texts:
+            return np.zeros((0, getattr(self, "dimension", 0)), dtype=np.float32)
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        # map() preserves chunk order, so concatenating restores the input order
+        return as_matrix(np.concatenate(self._pool.map(_embed_chunk, chunks), axis=0))
+
+    def get_embedding(self, content, content_type='text'):
+        """Generate a single float32 embedding for text or an image (images use placeholder text)."""
+        try:
+            if content_type == 'text':
+                return self.get_embeddings([content])[0]
+            elif content_type == 'image':
+                return self.get_embeddings([IMAGE_PLACEHOLDER_TEXT])[0]
+            else:
+                raise ValueError(f"Unsupported content type: {content_type}")
+        except Exception as e:
+            logger.error(f"Error generating embedding: {str(e)}")
+            raise EmbeddingError(f"Could not embed {content_type} content: {e}") from e
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,260 @@
+# FILE: python/embeddings/embed_store.py
+# Persistent, content-addressed embedding store. Vectors live in an append-only float32 file
+# that is memory-mapped for reads; a compact index of 16-byte text digests maps each text to
+# its row. One store directory per model name and backend variant (torch fp32, ONNX fp32 or
+# int8 produce slightly different vectors), so it survives collection resets and is shared
+# by every document that repeats the same page text.
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import numpy as np
+from .vectors import EmbeddingError, PartialEmbeddingError, as_matrix
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.bin"   # Row i of the vector file <-> 16-byte digest i of the index
+META_FILE = "meta.json"
+LOCK_FILE = "lock"
+DIGEST_SIZE = 16
+INDEX_DTYPE = np.dtype([("hi", "<u8"), ("lo", "<u8")])
+# --- End Configuration ---
+
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding store keyed by (model name, backend variant, text hash)
+
+    Lookups use a sorted copy of the digest index (two uint64 columns, 16 bytes per entry)
+    searched with NumPy; vectors are read through a memory map of the append-only file.
+    Appends from concurrent ingestion processes are serialized with a file lock.
+    """
+
+    def __init__(self, root_dir, model_name, variant="torch"):
+        """
+        Open (or lazily create) the store for a model
+
+        Args:
+            root_dir (str): Directory holding one sub-directory per model and variant
+            model_name (str): Embedding model name the vectors belong to
+            variant (str): Backend that computes the vectors ('torch', 'onnx' or 'onnx-int8')
+        """
+        self.model_name = model_name
+        self.variant = variant
+        self.dir = os.path.join(root_dir, re.sub(r'[^\w\-_\.]', '_', f"{model_name}__{variant}"))
+        self.dimension = None
+        self._count = 0           # Rows covered by the loaded index
+        self._sorted_keys = np.zeros(0, dtype=INDEX_DTYPE)
+        self._sorted_rows = np.zeros(0, dtype=np.int64)
+        self._vectors = None
+        self._lock = threading.RLock() # Index swaps must not race with lookups from other threads
+        self._load()
+
+    # --- Internal helpers ---
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _file_size(self, name):
+        return os.path.getsize(self._path(name)) if os.path.isfile(self._path(name)) else 0
+
+    def _load(self):
+        """(Re)load the index and memory map from disk."""
+        if not os.path.isfile(self._path(META_FILE)):
+            return
+        with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model_name") != self.model_name or meta.get("variant") != self.variant:
+            raise ValueError(f"Embedding store {self.dir} belongs to {meta.get('model_name')} ({meta.get('variant')}), not {self.model_name} ({self.variant})")
+        self.dimension = meta["dimension"]
+        self._count = 0
+        self._sorted_keys = np.zeros(0, dtype=INDEX_DTYPE)
+        self._sorted_rows = np.zeros(0, dtype=np.int64)
+        self._vectors = None
+        self._refresh()
+
+    def _refresh(self):
+        """Merge rows appended since the last load (by any process) into the sorted index; only the new tail is read."""
+        # An interrupted append can leave an index without its vector; only trust rows present in both files
+        count = min(self._file_size(INDEX_FILE) // DIGEST_SIZE, self._file_size(VECTORS_FILE) // (self.dimension * 4))
+        if count < self._count: return self._load() # Files were replaced or shrunk underneath us
+        if count == self._count: return
+        tail = np.fromfile(self._path(INDEX_FILE), dtype=INDEX_DTYPE, count=count - self._count, offset=self._count * DIGEST_SIZE)
+        order = np.lexsort((tail["lo"], tail["hi"]))
+        # Sorted insertion positions keep the merged index ordered by hi, which is all _find_rows relies on
+        pos = np.searchsorted(self._sorted_keys["hi"], tail["hi"][order], side="right")
+        self._sorted_keys = np.insert(self._sorted_keys, pos, tail[order])
+        self._sorted_rows = np.insert(self._sorted_rows, pos, self._count + order.astype(np.int64))
+        self._count = count
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(self._count, self.dimension))
+
+    @staticmethod
+    def _keys_for(texts):
+        return np.frombuffer(b"".join(text_digest(t) for t in texts), dtype=INDEX_DTYPE)
+
+    def _find_rows(self, keys):
+        """Row for each key, or -1 when absent."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not len(self._sorted_keys) or not len(keys): return rows
+        pos = np.searchsorted(self._sorted_keys["hi"], keys["hi"])
+        pos_clipped = np.minimum(pos, len(self._sorted_keys) - 1)
+        candidate = self._sorted_keys[pos_clipped]
+        # A 64-bit prefix collision just reads as a miss, which only costs a recomputation
+        hit = (pos < len(self._sorted_keys)) & (candidate["hi"] == keys["hi"]) & (candidate["lo"] == keys["lo"])
+        rows[hit] = self._sorted_rows[pos_clipped[hit]]
+        return rows
+
+    # --- Public API ---
+    def __len__(self):
+        return self._count
+
+    def lookup(self, texts):
+        """
+        Fetch stored vectors for texts
+
+        Args:
+            texts (list): Texts to look up
+
+        Returns:
+            tuple: (float32 array of shape (len(texts), dim) with zero rows for misses, boolean hit mask)
+        """
+        with self._lock:
+            if self.dimension is None or not texts:
+                return None, np.zeros(len(texts), dtype=bool)
+            rows = self._find_rows(self._keys_for(texts))
+            hits = rows >= 0
+            vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+            if hits.any():
+                vectors[hits] = self._vectors[rows[hits]]
+            return vectors, hits
+
+    def add(self, texts, vectors):
+        """
+        Append vectors for texts that are not stored yet
+
+        Args:
+            texts (list): Texts the vectors were computed from
+            vectors (np.ndarray): float32 array of shape (len(texts), dim)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not texts or vectors.ndim != 2: return
+        os.makedirs(self.dir, exist_ok=True)
+        with self._lock, open(self._path(LOCK_FILE), "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.isfile(self._path(META_FILE)):
+                    with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+                        json.dump({"model_name": self.model_name, "variant": self.variant, "dimension": int(vectors.shape[1])}, f)
+                # Pick up rows appended by other processes
+                if self.dimension is None: self._load()
+                else: self._refresh()
+                if vectors.shape[1] != self.dimension:
+                    raise ValueError(f"Vector dimension {vectors.shape[1]} does not match store dimension {self.dimension}")
+
+                keys = self._keys_for(texts)
+                new_mask = self._find_rows(keys) < 0
+                # Drop duplicates within this batch as well
+                _, first = np.unique(keys.view(np.dtype((np.void, DIGEST_SIZE))), return_index=True)
+                unique_mask = np.zeros(len(texts), dtype=bool)
+                unique_mask[first] = True
+                new_mask &= unique_mask
+                if not new_mask.any(): return
+
+                row_bytes = self.dimension * 4
+                with open(self._path(VECTORS_FILE), "ab") as vf:
+                    vf.truncate(self._count * row_bytes) # Discard a torn tail from an interrupted append
+                    vf.write(np.ascontiguousarray(vectors[new_mask]).tobytes())
+                    vf.flush(); os.fsync(vf.fileno())
+                with open(self._path(INDEX_FILE), "ab") as xf:
+                    xf.truncate(self._count * DIGEST_SIZE)
+                    xf.write(keys[new_mask].tobytes())
+                    xf.flush(); os.fsync(xf.fileno())
+                self._refresh()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class CachedEmbedder:
+    """
+    Embedder wrapper that serves text embeddings from an EmbeddingStore and only sends misses to the model
+    """
+
+    def __init__(self, embedder, store):
+        """
+        Args:
+            embedder: Any embedder with get_embedding (and ideally get_embeddings)
+            store (EmbeddingStore): Store for the embedder's model
+        """
+        self.embedder = embedder
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_misses(self, texts):
+        """(vectors, ok mask) for texts the store does not have."""
+        if hasattr(self.embedder, "get_embeddings"):
+            try:
+                vectors = as_matrix(self.embedder.get_embeddings(texts))
+                return vectors, np.ones(len(vectors), dtype=bool)
+            except PartialEmbeddingError as e:
+                return e.vectors, e.ok
+        rows, ok = [], np.ones(len(texts), dtype=bool)
+        for i, text in enumerate(texts):
+            try: rows.append(self.embedder.get_embedding(text, "text"))
+            except EmbeddingError: rows.append(None); ok[i] = False
+        dimension = next((len(r) for r in rows if r is not None), 0)
+        if not dimension: raise EmbeddingError(f"None of {len(texts)} texts could be embedded")
+        return as_matrix([r if r is not None else np.zeros(dimension, dtype=np.float32) for r in rows]), ok
+
+    def get_embeddings(self, texts):
+        """
+        Embed texts, reading stored vectors first; returns a float32 array in input order.
+
+        Raises:
+            PartialEmbeddingError: Some misses could not be embedded (the stored and computed rows are still returned)
+        """
+        vectors, hits = self.store.lookup(texts)
+        self.hits += int(hits.sum())
+        self.misses += int((~hits).sum())
+        if hits.all():
+            return vectors
+        miss_idx = np.flatnonzero(~hits)
+        # Boilerplate pages repeat within a document too; embed each distinct text once
+        miss_texts = list(dict.fromkeys(texts[i] for i in miss_idx))
+        computed, ok = self._embed_misses(miss_texts)
+        if vectors is None:
+            vectors = np.zeros((len(texts), computed.shape[1]), dtype=np.float32)
+        row_of = {t: j for j, t in enumerate(miss_texts)}
+        position = np.asarray([row_of[texts[i]] for i in miss_idx], dtype=np.int64)
+        vectors[miss_idx] = computed[position]
+        # Failed rows are never persisted
+        if ok.any():
+            try:
+                self.store.add([t for t, good in zip(miss_texts, ok) if good], computed[ok])
+            except Exception as e:
+                logger.warning(f"Could not persist embeddings to {self.store.dir}: {e}")
+        if not ok.all(): raise PartialEmbeddingError(vectors, miss_idx[~ok[position]])
+        return vectors
+
+    def get_embedding(self, content, content_type="text"):
+        if content_type == "text" and isinstance(content, str) and content.strip():
+            return self.get_embeddings([content])[0]
+        return self.embedder.get_embedding(content, content_type)
+
+    @property
+    def dimension(self):
+        return getattr(self.embedder, "dimension", None) or self.store.dimension
+
+    def close(self):
+        if hasattr(self.embedder, "close"): self.embedder.close()
@@ -0,0 +1,98 @@
+# FILE: python/embeddings/export_onnx.py
+# Exports a sentence-transformers model to ONNX (optionally with dynamic int8 quantization)
+# for use by embeddings/onnx_embed.py. Needs torch/transformers only at export time.
+#
+# Usage (from the python/ directory):
+#   python embeddings/export_onnx.py --model_name all-MiniLM-L6-v2 --quantize
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings.onnx_embed import DEFAULT_ONNX_ROOT, FP32_MODEL_FILE, INT8_MODEL_FILE, META_FILE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+ONNX_OPSET = 14
+# --- End Configuration ---
+
+
+def export_model(model_name, output_dir, quantize=False):
+    """
+    Export the transformer behind a sentence-transformers model to ONNX
+
+    Args:
+        model_name (str): sentence-transformers model name or path
+        output_dir (str): Directory to write model.onnx, tokenizer.json and metadata into
+        quantize (bool): Also write a dynamically int8-quantized model_int8.onnx
+
+    Returns:
+        str: The output directory
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    normalize = any(type(module).__name__ == "Normalize" for module in st_model)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    logger.info(f"Exporting {model_name} to {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True
+        )
+    tokenizer.save_pretrained(output_dir) # Writes tokenizer.json for the fast tokenizer
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(output_dir, INT8_MODEL_FILE)
+        logger.info(f"Quantizing to {int8_path} (dynamic int8)")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    meta = {
+        "model_name": model_name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "normalize": normalize,
+        "opset": ONNX_OPSET,
+        "quantized": quantize,
+    }
+    with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"Export complete: {meta}")
+    return output_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a sentence-transformers model to ONNX.')
+    parser.add_argument('--model_name', default='all-MiniLM-L6-v2', help='sentence-transformers model name')
+    parser.add_argument('--output_dir', default=None, help=f'Output directory (default: {DEFAULT_ONNX_ROOT}/<model_name>)')
+    parser.add_argument('--quantize', action='store_true', help='Also write a dynamic int8 model')
+    args = parser.parse_args()
+
+    export_model(args.model_name, args.output_dir or os.path.join(DEFAULT_ONNX_ROOT, args.model_name), args.quantize)
+
+if __name__ == "__main__":
+    main()
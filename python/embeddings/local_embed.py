@@ -6,6 +6,8 @@ from sentence_transformers import SentenceTransformer
 from PIL import Image
 import numpy as np
 from torchvision import transforms
+from .registry import DEFAULT_MODEL_NAME
+from .vectors import IMAGE_PLACEHOLDER_TEXT, EmbeddingError, as_matrix
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -16,10 +18,14 @@ class LocalEmbedder:
     Class to generate embeddings using local sentence-transformers models
     """
 
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
         """
         Initialize the LocalEmbedder with a sentence-transformers model
 
+        A model that fails to load raises instead of falling back to another one: vectors of a
+        different model (and dimension) would silently land in, or be searched against, the
+        wrong named vector.
+
         Args:
             model_name (str): Name of the sentence-transformers model to use
         """
@@ -27,22 +33,27 @@ class LocalEmbedder:
         try:
             self.model = SentenceTransformer(model_name)
             self.model_name = model_name
-            logger.info(f"Successfully loaded model {model_name}")
+            self.variant = "torch"
+            self.dimension = self.model.get_sentence_embedding_dimension() or len(self.model.encode("test"))
+            logger.info(f"Successfully loaded model {model_name} (Dim: {self.dimension})")
         except Exception as e:
             logger.error(f"Error loading model {model_name}: {str(e)}")
-            # Fall back to a smaller model if loading fails
-            fallback_model = 'all-MiniLM-L6-v2'
-            logger.info(f"Falling back to model: {fallback_model}")
-            self.model = SentenceTransformer(fallback_model)
-            self.model_name = fallback_model
+            raise ImportError(f"Could not load embedding model {model_name}") from e
 
     def get_embedding(self, content, content_type='text'):
-        """Generate embeddings for text or images."""
+        """
+        Generate embeddings for text or images.
+
+        Returns:
+            np.ndarray: Contiguous float32 vector of shape (dimension,)
+
+        Raises:
+            EmbeddingError: The content could not be embedded
+        """
         try:
             if content_type == 'text':
                 # Get text embedding
-                embedding = self.model.encode([content])[0]
-                return embedding.tolist()
+                return self.get_embeddings([content])[0]
             elif content_type == 'image':
                 # For images, need to convert PIL Image to RGB mode if needed
                 if hasattr(content, 'convert'):  # Check if it's a PIL Image
@@ -52,14 +63,25 @@ class LocalEmbedder:
 
                     # Simple approach: use a text description of the image
                     # Most sentence transformer models aren't designed for images
-                    dummy_text = "image content placeholder"
-                    embedding = self.model.encode([dummy_text])[0]
-                    return embedding.tolist()
+                    return self.get_embeddings([IMAGE_PLACEHOLDER_TEXT])[0]
                 else:
                     raise ValueError(f"Unsupported image type: {type(content)}")
             else:
                 raise ValueError(f"Unsupported content type: {content_type}")
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
-            # Return a zero vector of the correct dimension as fallback
-            return [0.0] * 384  # assuming 384-dimension embeddings
\ No newline at end of file
+            raise EmbeddingError(f"Could not embed {content_type} content: {e}") from e
+
+    def get_embeddings(self, texts, batch_size=32):
+        """
+        Generate embeddings for a list of texts in batches
+
+        Args:
+            texts (list): Texts to embed
+            batch_size (int): Texts per forward pass
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimension)
+        """
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return as_matrix(embeddings)
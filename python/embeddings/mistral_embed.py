@@ -3,27 +3,116 @@
 import os
 import logging
 import base64
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from PIL import Image
 import fitz  # PyMuPDF
 import numpy as np
-from mistralai.client import MistralClient
-from mistralai.models.embeddings import EmbeddingRequest
+import requests
+from .vectors import EmbeddingError, PartialEmbeddingError, as_vector
+try:
+    from mistralai.client import MistralClient
+    from mistralai.models.embeddings import EmbeddingRequest
+except ImportError: # Only image embeddings need the SDK; text batches go over plain HTTP
+    MistralClient = EmbeddingRequest = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# --- Configuration ---
+DEFAULT_API_BASE = os.getenv("MISTRAL_API_BASE", "https://api.mistral.ai/v1")
+EMBEDDING_DIMENSION = 1024          # mistral-embed
+MAX_TOKENS_PER_REQUEST = 16000      # Provider limit on total input tokens per embeddings call
+MAX_ITEMS_PER_REQUEST = 128         # Texts per embeddings call
+MAX_TOKENS_PER_ITEM = 8000          # Longer texts are truncated before sending
+CHARS_PER_TOKEN = 4                 # Conservative estimate; no tokenizer round-trip needed
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_S = 5.0
+DEFAULT_TOKENS_PER_MIN = 500000
+MAX_RETRIES = 5
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+REQUEST_TIMEOUT_S = (5, 60)
+SPLIT_STATUSES = (400, 413, 422)    # Errors caused by some input in the pack: split it to isolate the bad texts
+FATAL_STATUSES = (401, 403, 404)    # Key, permission or model/endpoint errors: every request would fail the same way
+# --- End Configuration ---
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until the requested amount is available."""
+
+    def __init__(self, rate_per_s, capacity=None):
+        self.rate = float(rate_per_s)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_s))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1.0):
+        amount = min(float(amount), self.capacity) # Oversized requests wait for a full bucket
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def pack_texts(texts, max_tokens=MAX_TOKENS_PER_REQUEST, max_items=MAX_ITEMS_PER_REQUEST):
+    """
+    Group text indices into request-sized packs
+
+    Returns:
+        list: [(indices, estimated_tokens), ...] respecting both the token and the item limit
+    """
+    packs = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            packs.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current: packs.append((current, current_tokens))
+    return packs
+
+
+class EmbeddingRequestError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
 class MistralEmbedder:
     """Mistral AI implementation for generating embeddings"""
 
-    def __init__(self, model_name="mistral-embed", api_key=None):
+    def __init__(self, model_name="mistral-embed", api_key=None, api_base=DEFAULT_API_BASE,
+                 concurrency=DEFAULT_CONCURRENCY, requests_per_s=DEFAULT_REQUESTS_PER_S, tokens_per_min=DEFAULT_TOKENS_PER_MIN,
+                 max_tokens_per_request=MAX_TOKENS_PER_REQUEST, max_items_per_request=MAX_ITEMS_PER_REQUEST):
         """
         Initialize the Mistral embedder
 
         Args:
             model_name (str): Mistral embedding model name
             api_key (str): Mistral API key
+            api_base (str): Embeddings API base URL (point at a local stub for testing)
+            concurrency (int): Batch requests in flight at once
+            requests_per_s (float): Request rate limit
+            tokens_per_min (float): Input-token rate limit
+            max_tokens_per_request (int): Estimated tokens packed into one request
+            max_items_per_request (int): Texts packed into one request
         """
         self.model_name = model_name
         self.api_key = api_key
@@ -32,7 +121,105 @@ class MistralEmbedder:
             raise ValueError("Mistral API key not provided")
 
         logger.info(f"Initializing Mistral embedder with model: {model_name}")
-        self.client = MistralClient(api_key=self.api_key)
+        self.client = MistralClient(api_key=self.api_key) if MistralClient else None
+        self.api_base = api_base.rstrip("/")
+        self.concurrency = max(1, concurrency)
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_items_per_request = max_items_per_request
+        self.dimension = EMBEDDING_DIMENSION
+        self.request_bucket = TokenBucket(requests_per_s)
+        self.token_bucket = TokenBucket(tokens_per_min / 60.0, capacity=max(max_tokens_per_request, tokens_per_min / 60.0))
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        self.stats = {"requests": 0, "retries": 0, "failed_texts": 0}
+        self.last_failed = []
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _post_embeddings(self, texts, estimated_tokens):
+        """One embeddings call with rate limiting and retry/backoff on 429, 5xx and connection errors."""
+        for attempt in range(MAX_RETRIES + 1):
+            self.request_bucket.acquire()
+            self.token_bucket.acquire(estimated_tokens)
+            retry_after = None
+            try:
+                self._count("requests")
+                response = self.session.post(f"{self.api_base}/embeddings", json={"model": self.model_name, "input": texts}, timeout=REQUEST_TIMEOUT_S)
+                if response.status_code == 200:
+                    data = sorted(response.json()["data"], key=lambda d: d.get("index", 0))
+                    if len(data) != len(texts): raise EmbeddingRequestError(f"Expected {len(texts)} embeddings, got {len(data)}")
+                    return np.asarray([d["embedding"] for d in data], dtype=np.float32)
+                if response.status_code != 429 and response.status_code < 500:
+                    raise EmbeddingRequestError(f"Embeddings API error {response.status_code}: {response.text[:200]}", response.status_code)
+                retry_after = response.headers.get("Retry-After")
+                error = f"HTTP {response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+            if attempt == MAX_RETRIES: break
+            try: delay = float(retry_after)
+            except (TypeError, ValueError): delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)) * (0.5 + random.random())
+            self._count("retries")
+            logger.warning(f"Embeddings request failed ({error}); retry {attempt + 1}/{MAX_RETRIES} in {delay:.2f}s")
+            time.sleep(delay)
+        raise EmbeddingRequestError(f"Embeddings request failed after {MAX_RETRIES} retries: {error}")
+
+    def _embed_pack(self, texts, indices, estimated_tokens):
+        """Embed one pack; on a per-input error split it to isolate the bad texts, on an auth/config error raise."""
+        try:
+            return {i: v for i, v in zip(indices, self._post_embeddings([texts[i] for i in indices], estimated_tokens))}
+        except EmbeddingRequestError as e:
+            if e.status in FATAL_STATUSES: raise EmbeddingError(f"Mistral embeddings unavailable: {e}") from e
+            if len(indices) == 1:
+                logger.error(f"Giving up on text {indices[0]}: {e}")
+                self._count("failed_texts")
+                return {}
+            if e.status not in SPLIT_STATUSES: # Retries exhausted or not input-specific; splitting would only hammer the API further
+                logger.error(f"Giving up on {len(indices)} texts: {e}")
+                self._count("failed_texts", len(indices))
+                return {}
+            half = len(indices) // 2
+            results = {}
+            for part in (indices[:half], indices[half:]):
+                results.update(self._embed_pack(texts, part, sum(estimate_tokens(texts[i]) for i in part)))
+            return results
+
+    def get_embeddings(self, texts):
+        """
+        Embed many texts with packed, concurrent, rate-limited requests
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimension) in input order
+
+        Raises:
+            PartialEmbeddingError: Empty texts or texts that still failed after retries; the exception
+                carries the full array (zero rows for those) and their indices (also in last_failed)
+            EmbeddingError: The API rejected the key, permissions or model (401/403/404)
+        """
+        max_chars = MAX_TOKENS_PER_ITEM * CHARS_PER_TOKEN
+        prepared = [(t or "")[:max_chars] for t in texts]
+        todo = [i for i, t in enumerate(prepared) if t.strip()]
+        results = {}
+        if todo:
+            packs = pack_texts([prepared[i] for i in todo], self.max_tokens_per_request, self.max_items_per_request)
+            logger.info(f"Embedding {len(todo)} texts with Mistral in {len(packs)} request(s), concurrency {self.concurrency}")
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(packs))) as pool:
+                futures = [pool.submit(self._embed_pack, prepared, [todo[j] for j in pack], tokens) for pack, tokens in packs]
+                for future in futures: results.update(future.result())
+        if results: self.dimension = len(next(iter(results.values()))) # The API reports the model's real size
+
+        self.last_failed = [i for i in range(len(texts)) if i not in results]
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, vector in results.items(): vectors[i] = vector
+        if self.last_failed:
+            logger.warning(f"{len(self.last_failed)} of {len(texts)} texts are empty or could not be embedded")
+            raise PartialEmbeddingError(vectors, self.last_failed)
+        return vectors
 
     def get_embedding(self, input_data, input_type="text"):
         """
@@ -43,7 +230,10 @@ class MistralEmbedder:
             input_type (str): 'text' or 'image'
 
         Returns:
-            np.array: Embedding vector
+            np.ndarray: float32 embedding vector
+
+        Raises:
+            EmbeddingError: The input could not be embedded
         """
         try:
             if input_type == "text":
@@ -52,28 +242,19 @@ class MistralEmbedder:
                 return self._get_image_embedding(input_data)
             else:
                 raise ValueError(f"Unsupported input type: {input_type}")
+        except EmbeddingError:
+            raise
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
-            raise
+            raise EmbeddingError(f"Could not embed {input_type} input: {e}") from e
 
     def _get_text_embedding(self, text):
         """Generate embedding for text"""
         if not text or text.strip() == "":
-            logger.warning("Empty text provided, returning zero vector")
-            # Return a zero vector with the expected dimension
-            return np.zeros(1024)  # Mistral embeddings are typically 1024D
+            raise EmbeddingError("Empty text cannot be embedded")
 
         logger.info(f"Generating text embedding with Mistral (length: {len(text)})")
-
-        # Get embedding from Mistral API
-        response = self.client.embeddings(
-            model=self.model_name,
-            input=text
-        )
-
-        # Extract the embedding vector
-        embedding = np.array(response.data[0].embedding)
-        return embedding
+        return self.get_embeddings([text])[0]
 
     def _get_image_embedding(self, image_input):
         """Generate embedding for image"""
@@ -107,6 +288,7 @@ class MistralEmbedder:
 
         # Get embedding from Mistral API
         # For image embeddings with Mistral
+        if self.client is None: raise RuntimeError("Image embeddings require the mistralai package")
         request = EmbeddingRequest(
             model=self.model_name,
             input=[{"type": "image", "data": base64_image}]
@@ -115,8 +297,7 @@ class MistralEmbedder:
         response = self.client.embeddings(request=request)
 
         # Extract the embedding vector
-        embedding = np.array(response.data[0].embedding)
-        return embedding
+        return as_vector(response.data[0].embedding)
 
     def _extract_image_from_pdf(self, pdf_path, page_num=0):
         """Extract image from the first page of a PDF"""
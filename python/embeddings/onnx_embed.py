@@ -0,0 +1,128 @@
+# FILE: python/embeddings/onnx_embed.py
+# ONNX Runtime backend for sentence-transformers models (exported with embeddings/export_onnx.py).
+#
+# Accuracy versus the PyTorch LocalEmbedder for all-MiniLM-L6-v2, checked with
+# benchmarks/bench_onnx_embed.py:
+#   - fp32 model.onnx:       cosine similarity >= 0.9999, max abs component diff <= 1e-4
+#   - int8 model_int8.onnx:  mean cosine similarity >= 0.99, min >= 0.98
+# Vectors are mean-pooled and L2-normalized exactly like the sentence-transformers pipeline.
+
+import json
+import logging
+import os
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+from .registry import DEFAULT_MODEL_NAME
+from .vectors import IMAGE_PLACEHOLDER_TEXT, EmbeddingError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_ONNX_ROOT = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "onnx"))
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+META_FILE = "embedder.json"
+DEFAULT_MAX_SEQ_LENGTH = 256 # all-MiniLM-L6-v2 sentence-transformers default
+DEFAULT_BATCH_SIZE = 32
+# --- End Configuration ---
+
+
+class OnnxEmbedder:
+    """
+    Class to generate sentence embeddings with ONNX Runtime, without importing torch
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, model_dir=None, quantized=True, intra_op_threads=None):
+        """
+        Initialize the OnnxEmbedder from an exported model directory
+
+        Args:
+            model_name (str): Name of the exported sentence-transformers model
+            model_dir (str, optional): Export directory (defaults to DEFAULT_ONNX_ROOT/model_name)
+            quantized (bool): Use the dynamic int8 model instead of fp32
+            intra_op_threads (int, optional): ONNX Runtime intra-op thread count
+        """
+        self.model_name = model_name
+        self.variant = "onnx-int8" if quantized else "onnx"
+        self.model_dir = model_dir or os.path.join(DEFAULT_ONNX_ROOT, model_name)
+        model_file = os.path.join(self.model_dir, INT8_MODEL_FILE if quantized else FP32_MODEL_FILE)
+        tokenizer_file = os.path.join(self.model_dir, TOKENIZER_FILE)
+        if not os.path.isfile(model_file) or not os.path.isfile(tokenizer_file):
+            raise FileNotFoundError(
+                f"ONNX export not found in {self.model_dir}. Run: python embeddings/export_onnx.py --model_name {model_name}"
+                + (" --quantize" if quantized else "")
+            )
+
+        meta = {}
+        meta_path = os.path.join(self.model_dir, META_FILE)
+        if os.path.isfile(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        self.max_seq_length = meta.get("max_seq_length", DEFAULT_MAX_SEQ_LENGTH)
+        self.normalize = meta.get("normalize", True)
+
+        logger.info(f"Initializing OnnxEmbedder with {model_file}")
+        self.tokenizer = Tokenizer.from_file(tokenizer_file)
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = self.get_embeddings(["test"]).shape[1]
+        logger.info(f"Successfully loaded ONNX model {model_name} (Dim: {self.dimension}, int8: {quantized})")
+
+    def get_embeddings(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Embed a list of texts
+
+        Args:
+            texts (list): Texts to embed
+            batch_size (int): Texts per ONNX Runtime call
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimension)
+        """
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # Mean pooling over non-padding tokens
+            mask = attention_mask[:, :, None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32, copy=False))
+        if not outputs:
+            return np.zeros((0, getattr(self, "dimension", 0)), dtype=np.float32)
+        return np.concatenate(outputs, axis=0)
+
+    def get_embedding(self, content, content_type='text'):
+        """Generate a float32 vector for text or an image (images use a placeholder text, as in LocalEmbedder)."""
+        try:
+            if content_type == 'text':
+                return self.get_embeddings([content])[0]
+            elif content_type == 'image':
+                if hasattr(content, 'convert'):  # Check if it's a PIL Image
+                    return self.get_embeddings([IMAGE_PLACEHOLDER_TEXT])[0]
+                else:
+                    raise ValueError(f"Unsupported image type: {type(content)}")
+            else:
+                raise ValueError(f"Unsupported content type: {content_type}")
+        except Exception as e:
+            logger.error(f"Error generating embedding: {str(e)}")
+            raise EmbeddingError(f"Could not embed {content_type} content: {e}") from e
@@ -0,0 +1,165 @@
+# FILE: python/embeddings/projection.py
+# Learned dimensionality reduction of stored vectors. A PCA projection is fitted on a sample of a
+# collection's full vectors and saved as a versioned artifact; ingestion then also writes the
+# projected (e.g. 128-d) vector as its own Qdrant named vector, which carries the HNSW index, while
+# the full vector stays on disk for exact rescoring of the top candidates (local_llm.retrieve_context).
+#
+# Artifacts: <PROJECTION_DIR>/<collection>/<vector>/v<version>.npz (mean, components, explained
+# variance ratio, JSON metadata). The registry (embeddings.registry) records which version a vector
+# uses under its "projection" key; reduce_vectors.py fits, backfills, reports recall and drops them.
+# Independent of quantization: the reduced vector can be quantized on top.
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import numpy as np
+from .vectors import as_matrix
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+PROJECTION_DIR = os.getenv("PROJECTION_DIR", os.path.join(RAG_DATA_DIR, "projections"))
+PROJECTION_STATES = ("backfilling", "ready") # Written by ingestion in both; searched only when ready
+# --- End Configuration ---
+
+
+def _safe_name(name):
+    return re.sub(r'[^\w\-\.]', '_', name) or "_unnamed"
+
+
+class PcaProjection:
+    """Mean-centred PCA onto the top principal components; outputs unit-length float32 vectors."""
+
+    def __init__(self, mean, components, explained=None, meta=None):
+        self.mean = as_matrix(mean).reshape(-1)
+        self.components = as_matrix(components)
+        self.explained = np.asarray(explained if explained is not None else [], dtype=np.float32)
+        self.meta = meta or {}
+
+    @property
+    def dimension(self):
+        return self.components.shape[0]
+
+    @property
+    def source_dimension(self):
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, sample, dimension, **meta):
+        """
+        Fit on a (n, source_dim) sample of full vectors
+
+        Args:
+            sample (np.ndarray): Full vectors, n > dimension
+            dimension (int): Output dimension
+            **meta: Extra metadata stored with the artifact
+
+        Returns:
+            PcaProjection: The fitted projection
+        """
+        sample = as_matrix(sample).astype(np.float64)
+        if not 0 < dimension < sample.shape[1]: raise ValueError(f"Dimension must be between 1 and {sample.shape[1] - 1}, got {dimension}")
+        if len(sample) <= dimension: raise ValueError(f"Need more than {dimension} sample vectors, got {len(sample)}")
+        mean = sample.mean(axis=0)
+        _, singular, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        variance = singular ** 2
+        explained = variance[:dimension] / variance.sum()
+        return cls(mean, vt[:dimension], explained, {"sample_size": len(sample), "explained_variance": round(float(explained.sum()), 4), **meta})
+
+    def transform(self, vectors):
+        """Project (n, source_dim) or (source_dim,) vectors; returns float32 rows of unit length."""
+        vectors = as_matrix(vectors)
+        if vectors.shape[1] != self.source_dimension:
+            raise ValueError(f"Projection expects {self.source_dimension}-d vectors, got {vectors.shape[1]}-d")
+        projected = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return np.ascontiguousarray(projected / np.where(norms > 0, norms, 1.0), dtype=np.float32)
+
+
+class ProjectionStore:
+    """Versioned projection artifacts on disk; loaded artifacts are cached per process."""
+
+    def __init__(self, root_dir=PROJECTION_DIR):
+        self.root_dir = root_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, collection_name, vector_name):
+        return os.path.join(self.root_dir, _safe_name(collection_name), _safe_name(vector_name))
+
+    def path(self, collection_name, vector_name, version):
+        return os.path.join(self._dir(collection_name, vector_name), f"v{version}.npz")
+
+    def versions(self, collection_name, vector_name):
+        try: names = os.listdir(self._dir(collection_name, vector_name))
+        except FileNotFoundError: return []
+        return sorted(int(m.group(1)) for m in (re.fullmatch(r'v(\d+)\.npz', n) for n in names) if m)
+
+    def save(self, collection_name, vector_name, projection):
+        """Write projection as the next version (atomically); returns the version number."""
+        directory = self._dir(collection_name, vector_name)
+        os.makedirs(directory, exist_ok=True)
+        version = (self.versions(collection_name, vector_name) or [0])[-1] + 1
+        meta = {**projection.meta, "collection": collection_name, "vector": vector_name, "version": version,
+                "dimension": projection.dimension, "source_dimension": projection.source_dimension,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        path = self.path(collection_name, vector_name, version)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, mean=projection.mean, components=projection.components, explained=projection.explained,
+                     meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+        projection.meta = meta
+        logger.info(f"Saved {projection.source_dimension}->{projection.dimension} projection v{version} of '{collection_name}'/'{vector_name}' to {path}")
+        return version
+
+    def load(self, collection_name, vector_name, version):
+        path = self.path(collection_name, vector_name, version)
+        with self._lock:
+            if path not in self._cache:
+                with np.load(path) as data:
+                    self._cache[path] = PcaProjection(data["mean"], data["components"], data["explained"], json.loads(str(data["meta"])))
+            return self._cache[path]
+
+    def delete(self, collection_name, vector_name, version):
+        path = self.path(collection_name, vector_name, version)
+        with self._lock: self._cache.pop(path, None)
+        try: os.remove(path)
+        except FileNotFoundError: pass
+
+
+def reduced_vector_name(vector_name, dimension, version):
+    """Named vector of a projection: 'all-minilm-l6-v2' -> 'all-minilm-l6-v2-pca128-v1' ('' -> 'pca128-v1')."""
+    return f"{vector_name}-pca{dimension}-v{version}" if vector_name else f"pca{dimension}-v{version}"
+
+
+def projections_for(collection_name, written, store, states=PROJECTION_STATES):
+    """
+    Projections of the written vectors of a collection (current and, during a refit, previous)
+
+    Args:
+        collection_name (str): Logical collection
+        written (dict): {vector_name: spec} from ModelRegistry.written
+        store (ProjectionStore): Artifact store
+        states (tuple): Projection states to include
+
+    Returns:
+        list: (source vector_name, reduced vector_name, PcaProjection) tuples
+    """
+    found = []
+    for vector_name, spec in written.items():
+        for projection in (spec.get("projection"), spec.get("previous_projection")):
+            if projection and projection["state"] in states:
+                found.append((vector_name, projection["vector"], store.load(collection_name, vector_name, projection["version"])))
+    return found
+
+
+def searched_projection(spec):
+    """Projection a query of the vector spec searches: the current one once ready, else the previous one."""
+    for projection in (spec.get("projection"), spec.get("previous_projection")):
+        if projection and projection["state"] == "ready": return projection
+    return None
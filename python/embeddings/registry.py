@@ -0,0 +1,250 @@
+# FILE: python/embeddings/registry.py
+# Embedding model registry. Each collection stores one Qdrant named vector per embedding model
+# and the registry (a small JSON file shared by every process) records, per logical collection,
+# which vector queries use ("active") and which vectors ingestion writes. Model dimensions are
+# detected from the model's own output the first time it is used and cached here, so nothing
+# else hardcodes a vector size.
+#
+# Vector states: 'active' (queried and written), 'backfilling' (written by ingest while reembed.py
+# fills in existing points), 'ready' (complete, waiting for cutover), 'standby' (previous active
+# vector, still written so a cutover can be rolled back until it is dropped).
+#
+# A vector can also carry a "projection" (embeddings.projection): a reduced copy of it stored as a
+# further named vector that queries search before rescoring with the full one.
+#
+# Collections created before the registry have a single unnamed vector; they are adopted as
+# vector "" (Qdrant's default vector name) of DEFAULT_MODEL_NAME, which is what produced them.
+
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+from .vectors import as_vector
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2") # Model of collections that are not registered yet
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", os.path.join(RAG_DATA_DIR, "model_registry.json"))
+REGISTRY_VERSION = 1
+LEGACY_VECTOR = ""  # Unnamed vector of collections created before the registry
+WRITTEN_STATES = ("active", "backfilling", "ready", "standby")
+DIMENSION_PROBE = "dimension probe"
+# --- End Configuration ---
+
+
+def vector_name_for(model_name):
+    """Qdrant vector name for a model: 'BAAI/bge-small-en-v1.5' -> 'baai_bge-small-en-v1_5'."""
+    return re.sub(r'[^a-z0-9_\-]', '_', model_name.lower())
+
+
+def vector_of(record, vector_name):
+    """A record's vector under vector_name (Qdrant returns a plain list when only the unnamed vector exists)."""
+    vector = record.vector
+    if isinstance(vector, dict): return vector.get(vector_name)
+    return vector if vector_name == LEGACY_VECTOR else None
+
+
+def using(vector_name):
+    """query_points 'using' argument for a vector name (None addresses the unnamed vector)."""
+    return vector_name or None
+
+
+class ModelRegistry:
+    """JSON registry of model dimensions and per-collection vectors; updates are serialized with a file lock."""
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+
+    # --- Storage ---
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable model registry {self.path}: {e}")
+            data = {}
+        if data.get("version") != REGISTRY_VERSION: data = {"version": REGISTRY_VERSION}
+        data.setdefault("models", {})
+        data.setdefault("collections", {})
+        return data
+
+    def _update(self, change):
+        """Apply change(data) under the registry lock and write the result atomically; returns change's result."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                data = self.load()
+                result = change(data)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.path)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # --- Models ---
+    def dimension(self, model_name, embedder=None):
+        """
+        Output dimension of a model: cached, else measured on the embedder (loaded when not given)
+
+        Args:
+            model_name (str): Model name as passed to get_embedder
+            embedder (object, optional): Loaded embedder of that model, to avoid loading it again
+
+        Returns:
+            int: Vector size
+        """
+        cached = self.load()["models"].get(model_name, {}).get("dimension")
+        if cached: return cached
+        if embedder is None:
+            from .embed_factory import get_embedder
+            embedder = get_embedder(model_name)
+        size = getattr(embedder, "dimension", None) or len(as_vector(embedder.get_embedding(DIMENSION_PROBE, "text")))
+        size = int(size)
+        logger.info(f"Detected dimension {size} for embedding model {model_name}")
+
+        def record(data):
+            data["models"][model_name] = {"dimension": size, "detected_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._update(record)
+        return size
+
+    # --- Collections ---
+    def entry(self, collection_name):
+        """Registry entry of a collection, or None when it was never registered."""
+        return self.load()["collections"].get(collection_name)
+
+    def active(self, collection_name):
+        """(vector_name, model_name) that queries of the collection use."""
+        entry = self.entry(collection_name)
+        if not entry: return LEGACY_VECTOR, DEFAULT_MODEL_NAME
+        return entry["active"], entry["vectors"][entry["active"]]["model"]
+
+    def written(self, collection_name):
+        """{vector_name: {"model", "dimension", "state", ...}} that ingestion writes, active vector first."""
+        entry = self.entry(collection_name)
+        if not entry: return {}
+        vectors = {name: spec for name, spec in entry["vectors"].items() if spec["state"] in WRITTEN_STATES}
+        return dict(sorted(vectors.items(), key=lambda item: item[0] != entry["active"]))
+
+    def register(self, collection_name, model_name, dimension, vector_name=None, replace=False):
+        """
+        Register a collection with one active vector (no-op when already registered, unless replace)
+
+        Returns:
+            dict: The collection's entry
+        """
+        vector_name = vector_name_for(model_name) if vector_name is None else vector_name
+
+        def change(data):
+            if collection_name in data["collections"] and not replace: return data["collections"][collection_name]
+            entry = {"active": vector_name, "vectors": {vector_name: {"model": model_name, "dimension": dimension, "state": "active"}},
+                     "registered_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            data["collections"][collection_name] = entry
+            data["models"].setdefault(model_name, {"dimension": dimension, "detected_at": entry["registered_at"]})
+            logger.info(f"Registered collection '{collection_name}': vector '{vector_name}' = {model_name} ({dimension}-d)")
+            return entry
+        return self._update(change)
+
+    def add_vector(self, collection_name, model_name, dimension):
+        """Start writing a new model's vector (state 'backfilling'); returns its vector name."""
+        vector_name = vector_name_for(model_name)
+
+        def change(data):
+            entry = data["collections"].get(collection_name)
+            if not entry: raise ValueError(f"Collection '{collection_name}' is not registered")
+            spec = entry["vectors"].get(vector_name)
+            if spec and spec["model"] != model_name:
+                raise ValueError(f"Vector name '{vector_name}' already belongs to model {spec['model']}")
+            if spec and spec["state"] in ("active", "ready", "standby"): return vector_name
+            entry["vectors"][vector_name] = {"model": model_name, "dimension": dimension, "state": "backfilling",
+                                             "done": 0, "failed": 0, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            return vector_name
+        return self._update(change)
+
+    def update_vector(self, collection_name, vector_name, **fields):
+        """Merge fields (state, progress counters, ...) into a vector's entry."""
+        def change(data):
+            spec = data["collections"][collection_name]["vectors"][vector_name]
+            spec.update(fields, updated_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            return dict(spec)
+        return self._update(change)
+
+    def set_projection(self, collection_name, vector_name, projection):
+        """
+        Attach a new projection to a vector, or detach all with None
+
+        A ready projection that is replaced stays as "previous_projection" (still searched and written)
+        until update_projection marks the new one ready.
+
+        Args:
+            projection (dict): {"vector": reduced vector name, "version", "dimension", "state": 'backfilling'|'ready', ...}
+
+        Returns:
+            list: Projections that were detached
+        """
+        def change(data):
+            spec = data["collections"][collection_name]["vectors"][vector_name]
+            current, previous = spec.pop("projection", None), spec.pop("previous_projection", None)
+            if not projection: return [p for p in (current, previous) if p]
+            spec["projection"] = dict(projection, updated_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            if current and current["state"] == "ready": current, previous = None, current
+            if previous: spec["previous_projection"] = previous
+            return [p for p in (current,) if p]
+        return self._update(change)
+
+    def update_projection(self, collection_name, vector_name, **fields):
+        """
+        Merge fields into a vector's projection; once it is 'ready' the previous projection is detached
+
+        Returns:
+            dict: The detached previous projection, if any
+        """
+        def change(data):
+            spec = data["collections"][collection_name]["vectors"][vector_name]
+            spec["projection"].update(fields, updated_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            return spec.pop("previous_projection", None) if spec["projection"]["state"] == "ready" else None
+        return self._update(change)
+
+    def cutover(self, collection_name, vector_name):
+        """Make vector_name the one queries use; the previous active vector goes to 'standby'."""
+        def change(data):
+            entry = data["collections"][collection_name]
+            spec = entry["vectors"].get(vector_name)
+            if not spec: raise ValueError(f"Collection '{collection_name}' has no vector '{vector_name}'")
+            if spec["state"] not in ("ready", "standby", "active"):
+                raise ValueError(f"Vector '{vector_name}' is {spec['state']}; finish the backfill before the cutover")
+            previous = entry["active"]
+            if previous != vector_name: entry["vectors"][previous]["state"] = "standby"
+            spec["state"] = "active"
+            entry["active"] = vector_name
+            entry["cutover_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            return previous
+        return self._update(change)
+
+    def remove_vector(self, collection_name, vector_name):
+        def change(data):
+            entry = data["collections"][collection_name]
+            if entry["active"] == vector_name: raise ValueError(f"Vector '{vector_name}' is active; cut over to another vector first")
+            return entry["vectors"].pop(vector_name, None)
+        return self._update(change)
+
+    def restore(self, collection_name, entry):
+        """Replace a collection's entry with one saved elsewhere (qdrant_utils import of an export)."""
+        def change(data):
+            data["collections"][collection_name] = entry
+            for spec in entry["vectors"].values():
+                data["models"].setdefault(spec["model"], {"dimension": spec["dimension"], "detected_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+            return entry
+        return self._update(change)
+
+    def forget(self, collection_name):
+        """Drop a collection's entry (its collection was deleted)."""
+        return self._update(lambda data: data["collections"].pop(collection_name, None))
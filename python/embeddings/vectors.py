@@ -0,0 +1,69 @@
+# FILE: python/embeddings/vectors.py
+# Shared vector contract of the embedders: get_embeddings returns one contiguous float32 (n, dim)
+# NumPy array and get_embedding one contiguous float32 (dim,) array. Failures are raised, never
+# returned as zero vectors, so callers do not compare every vector against a zero list.
+
+import numpy as np
+
+# Text embedded in place of an image by the text-only models; every embedder must use the same one
+IMAGE_PLACEHOLDER_TEXT = "image content placeholder"
+
+
+class EmbeddingError(RuntimeError):
+    """The embedding call failed (nothing usable was produced)."""
+
+
+class PartialEmbeddingError(EmbeddingError):
+    """
+    Some texts of a batch could not be embedded
+
+    Attributes:
+        vectors (np.ndarray): float32 (n, dim) array for the whole batch; rows of failed texts are zero
+        failed (np.ndarray): Sorted indices (int64) of the texts that failed
+    """
+
+    def __init__(self, vectors, failed, message=None):
+        self.vectors = vectors
+        self.failed = np.asarray(sorted(failed), dtype=np.int64)
+        super().__init__(message or f"{len(self.failed)} of {len(vectors)} texts could not be embedded")
+
+    @property
+    def ok(self):
+        """Boolean mask of the rows that were embedded."""
+        mask = np.ones(len(self.vectors), dtype=bool)
+        mask[self.failed] = False
+        return mask
+
+
+def as_matrix(vectors, dimension=0):
+    """Contiguous float32 (n, dim) view or copy of vectors (copies only when the dtype or layout differ)."""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if not matrix.size: return matrix.reshape(0, matrix.shape[-1] if matrix.ndim == 2 else dimension)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+
+def as_vector(vector):
+    """Contiguous float32 (dim,) array."""
+    return np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+
+
+def concat_batches(parts):
+    """
+    Concatenate per-chunk results in order, merging partial failures into one PartialEmbeddingError
+
+    Args:
+        parts (list): Each an array or a PartialEmbeddingError for one consecutive chunk of texts
+
+    Returns:
+        np.ndarray: The concatenated float32 matrix when no chunk failed
+    """
+    arrays, failed, offset = [], [], 0
+    for part in parts:
+        if isinstance(part, PartialEmbeddingError):
+            failed.extend(int(i) + offset for i in part.failed)
+            part = part.vectors
+        arrays.append(part)
+        offset += len(part)
+    vectors = np.concatenate(arrays, axis=0) if len(arrays) > 1 else as_matrix(arrays[0])
+    if failed: raise PartialEmbeddingError(vectors, failed)
+    return vectors
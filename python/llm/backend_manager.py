@@ -0,0 +1,273 @@
+# FILE: python/llm/backend_manager.py
+# Routing across one or more Ollama hosts. Health and model-availability probes are cached on
+# disk with a TTL (every query runs in a fresh process, so an in-memory cache would never hit),
+# requests go to the healthy host with the fewest outstanding requests across all processes,
+# and hosts that keep failing are ejected for a while and re-probed before being re-added.
+#
+# Usage:
+#   python llm/backend_manager.py status
+#   python llm/backend_manager.py preload --model tinyllama
+
+import argparse
+import fcntl
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+import requests
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_STATE_DIR = os.getenv("OLLAMA_STATE_DIR", os.path.join(
+    os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")), "ollama"))
+PROBE_TTL_S = float(os.getenv("OLLAMA_PROBE_TTL", 30))          # Reuse a probe result for this long
+PROBE_TIMEOUT_S = float(os.getenv("OLLAMA_PROBE_TIMEOUT", 2))   # /api/tags timeout
+EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER", 2))  # Consecutive request failures before ejection
+EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", 30))    # Ejected hosts are re-probed after this
+PRELOAD_TIMEOUT_S = 120
+STATE_FILE = "probes.json"
+LOCK_FILE = "probes.lock"
+INFLIGHT_DIR = "inflight"
+# --- End Configuration ---
+
+
+def hosts_from_env(default="http://localhost:11434"):
+    """OLLAMA_HOSTS (comma-separated) or OLLAMA_HOST_URL, without trailing slashes."""
+    raw = os.getenv("OLLAMA_HOSTS") or os.getenv("OLLAMA_HOST_URL") or default
+    return [h.strip().rstrip("/") for h in raw.split(",") if h.strip()]
+
+
+def _slug(host):
+    return re.sub(r'[^\w\-_\.]', '_', host)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class OllamaBackendManager:
+    """
+    Picks an Ollama host per request and keeps shared, file-backed health state
+
+    Probe results, failure counts and ejections live in a small JSON file guarded by flock;
+    outstanding requests are marker files (one per in-flight request, named after the owning
+    pid) so every query process sees the same load picture.
+    """
+
+    def __init__(self, hosts, model_name=None, state_dir=DEFAULT_STATE_DIR, probe_ttl=PROBE_TTL_S,
+                 probe_timeout=PROBE_TIMEOUT_S, eject_after=EJECT_AFTER_FAILURES, eject_seconds=EJECT_SECONDS,
+                 keep_alive=None, preload=False):
+        """
+        Args:
+            hosts (list): Ollama base URLs, e.g. ["http://gpu-a:11434", "http://gpu-b:11434"]
+            model_name (str, optional): Model requests will use; hosts without it are skipped
+            state_dir (str): Directory for the shared probe state and in-flight markers
+            probe_ttl (float): Seconds a probe result stays valid
+            probe_timeout (float): Timeout for /api/tags probes
+            eject_after (int): Consecutive failures that eject a host
+            eject_seconds (float): How long an ejected host is skipped before re-probing
+            keep_alive (str|int, optional): keep_alive sent with preload requests
+            preload (bool): Load the model on a host (in the background) whenever a probe finds it healthy;
+                off by default: query processes only route, preloading is done once at server startup ('preload' action)
+        """
+        if not hosts: raise ValueError("At least one Ollama host is required")
+        self.hosts = [h.rstrip("/") for h in hosts]
+        self.model_name = model_name
+        self.state_dir = state_dir
+        self.probe_ttl = probe_ttl
+        self.probe_timeout = probe_timeout
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.keep_alive = keep_alive
+        self.preload_on_probe = preload
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        os.makedirs(os.path.join(state_dir, INFLIGHT_DIR), exist_ok=True)
+
+    @classmethod
+    def from_env(cls, model_name=None, **kwargs):
+        return cls(hosts_from_env(), model_name=model_name, **kwargs)
+
+    # --- Shared state ---
+    @contextmanager
+    def _state(self, write=False):
+        """Yield the probe state dict under a file lock; persisted on exit when write=True."""
+        path = os.path.join(self.state_dir, STATE_FILE)
+        with self._lock, open(os.path.join(self.state_dir, LOCK_FILE), "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = {}
+                yield state
+                if write:
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(state, f)
+                    os.replace(tmp_path, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _has_model(self, entry):
+        if not self.model_name: return True
+        models = entry.get("models") or []
+        return self.model_name in models or f"{self.model_name}:latest" in models
+
+    # --- Probing ---
+    def probe(self, host, force=False):
+        """
+        Return the cached probe entry for host, probing /api/tags when it is stale
+
+        Returns:
+            dict: {"healthy": bool, "models": [...], "checked_at": ts, "failures": int, "ejected_until": ts}
+        """
+        now = time.time()
+        with self._state() as state:
+            entry = dict(state.get(host) or {})
+        fresh = now - entry.get("checked_at", 0) < self.probe_ttl
+        ejected = entry.get("ejected_until", 0) > now
+        if not force and (fresh or ejected):
+            return entry
+
+        try:
+            response = requests.get(f"{host}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+            models = [m.get("name") for m in response.json().get("models", [])]
+            update = {"healthy": True, "models": models, "checked_at": now, "failures": 0, "ejected_until": 0, "error": None}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            update = {"healthy": False, "checked_at": now, "ejected_until": now + self.eject_seconds, "error": str(e)[:200]}
+        with self._state(write=True) as state:
+            was_healthy = (state.get(host) or {}).get("healthy")
+            entry = {**(state.get(host) or {}), **update}
+            state[host] = entry
+        if entry["healthy"] and was_healthy is False: logger.info(f"Ollama host {host} is healthy again; re-added.")
+        if not entry["healthy"]: logger.warning(f"Ollama host {host} failed its probe: {entry.get('error')}")
+        elif not self._has_model(entry):
+            logger.warning(f"Model '{self.model_name}' not found on {host}: {entry.get('models')}. Run 'ollama pull {self.model_name}' there.")
+        elif self.preload_on_probe:
+            threading.Thread(target=self.preload, args=(host,), daemon=True).start()
+        return entry
+
+    def usable_hosts(self):
+        """Healthy, non-ejected hosts that have the model (probing stale entries first)."""
+        now = time.time()
+        entries = {host: self.probe(host) for host in self.hosts}
+        usable = [h for h, e in entries.items() if e.get("healthy") and e.get("ejected_until", 0) <= now and self._has_model(e)]
+        if usable: return usable
+        # Nothing qualifies: prefer anything not ejected, then everything, so the request fails with a real error
+        reachable = [h for h, e in entries.items() if e.get("ejected_until", 0) <= now]
+        return reachable or list(self.hosts)
+
+    # --- Outstanding requests ---
+    def _inflight_dir(self, host):
+        path = os.path.join(self.state_dir, INFLIGHT_DIR, _slug(host))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def outstanding(self, host):
+        """In-flight requests to host across all processes; markers of dead processes are removed."""
+        count = 0
+        path = self._inflight_dir(host)
+        for name in os.listdir(path):
+            try:
+                pid = int(name.split(".", 1)[0])
+            except ValueError:
+                continue
+            if pid_alive(pid): count += 1
+            else:
+                try: os.remove(os.path.join(path, name))
+                except FileNotFoundError: pass
+        return count
+
+    def pick_host(self, exclude=()):
+        """Least-outstanding-requests choice among usable hosts; ties are broken randomly."""
+        candidates = [h for h in self.usable_hosts() if h not in exclude] or [h for h in self.hosts if h not in exclude]
+        if not candidates: return None
+        loads = {h: self.outstanding(h) for h in candidates}
+        least = min(loads.values())
+        return random.choice([h for h, load in loads.items() if load == least])
+
+    @contextmanager
+    def acquire(self, exclude=()):
+        """Pick a host and count the request as outstanding there until the block exits."""
+        host = self.pick_host(exclude)
+        if host is None: raise RuntimeError("No Ollama host available")
+        marker = os.path.join(self._inflight_dir(host), f"{os.getpid()}.{threading.get_ident()}.{next(self._seq)}")
+        open(marker, "w").close()
+        try:
+            yield host
+        finally:
+            try: os.remove(marker)
+            except FileNotFoundError: pass
+
+    # --- Outcomes ---
+    def report_success(self, host):
+        with self._state() as state:
+            if not (state.get(host) or {}).get("failures"): return
+        with self._state(write=True) as state:
+            state.setdefault(host, {})["failures"] = 0
+
+    def report_failure(self, host, error=None):
+        """Count a failed request; after eject_after in a row the host is ejected for eject_seconds."""
+        with self._state(write=True) as state:
+            entry = state.setdefault(host, {})
+            entry["failures"] = entry.get("failures", 0) + 1
+            entry["error"] = str(error)[:200] if error else entry.get("error")
+            if entry["failures"] >= self.eject_after:
+                entry.update({"healthy": False, "ejected_until": time.time() + self.eject_seconds, "failures": 0})
+                logger.warning(f"Ejecting Ollama host {host} for {self.eject_seconds:.0f}s after repeated failures: {error}")
+
+    # --- Model management ---
+    def preload(self, host=None):
+        """Load the model into memory on one host (or every usable host) so the first query skips the load."""
+        if not self.model_name: return {}
+        results = {}
+        for target in ([host] if host else self.usable_hosts()):
+            payload = {"model": self.model_name, "prompt": ""}
+            if self.keep_alive is not None: payload["keep_alive"] = self.keep_alive
+            try:
+                response = requests.post(f"{target}/api/generate", json=payload, timeout=(self.probe_timeout, PRELOAD_TIMEOUT_S))
+                results[target] = response.status_code == 200
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Preloading {self.model_name} on {target} failed: {e}")
+                results[target] = False
+        return results
+
+    def status(self):
+        """Probe state plus current outstanding requests for every host."""
+        return {host: {**self.probe(host), "outstanding": self.outstanding(host)} for host in self.hosts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or warm the configured Ollama hosts (OLLAMA_HOSTS).')
+    parser.add_argument('action', choices=['status', 'preload'], help='status: probe and print; preload: load the model on every healthy host')
+    parser.add_argument('--model', default=os.getenv("LLM_MODEL_NAME", "tinyllama"), help='Model to check/preload')
+    parser.add_argument('--keep_alive', default=os.getenv("OLLAMA_KEEP_ALIVE", "30m"), help='keep_alive for preload')
+    args = parser.parse_args()
+
+    manager = OllamaBackendManager.from_env(args.model, keep_alive=args.keep_alive, preload=False)
+    if args.action == "status":
+        print(json.dumps(manager.status(), indent=2))
+    else:
+        for host in manager.hosts: manager.probe(host, force=True)
+        results = manager.preload()
+        print(json.dumps({"model": args.model, "preloaded": results}))
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,117 @@
 # D:\rag-app\python\llm\ollama_llm.py
 
 import logging
+import os
 import requests
 import json
 import time
+from contextlib import contextmanager
+from .scheduler import DeadlineExceeded, remaining_s
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# --- Configuration ---
+CONNECT_TIMEOUT_S = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT_S = float(os.getenv("OLLAMA_READ_TIMEOUT", 300))
+# --- End Configuration ---
+
+class LLMGenerationError(RuntimeError):
+    """Raised by callers when a generation failed (the LLM returned its apology text and set last_error)."""
+
+
 class OllamaLLM:
     """
     Class to generate text responses using the Ollama API
     """
 
-    def __init__(self, model_name='phi2'):
+    def __init__(self, model_name='phi2', keep_alive=None, backends=None, timeout=(CONNECT_TIMEOUT_S, READ_TIMEOUT_S)):
         """
         Initialize the OllamaLLM with a model
 
         Args:
             model_name (str): Name of the Ollama model to use
+            keep_alive (str|int, optional): How long Ollama keeps the model loaded after a request (e.g. "30m", -1)
+            backends (OllamaBackendManager, optional): Routes requests across hosts; without it api_base is used
+            timeout (tuple): (connect, read) timeout in seconds for generation requests
         """
         logger.info(f"Initializing OllamaLLM with model: {model_name}")
         self.model_name = model_name
         self.api_base = "http://localhost:11434/api"
+        self.keep_alive = keep_alive
+        self.backends = backends
+        self.timeout = timeout
+        self.last_context = None # Ollama's context from the last generation, for continuing a conversation
+        self.last_stats = {}     # prompt_eval_count / prompt_eval_duration / eval_count of the last generation
+        self.last_host = None
+        self.last_error = None   # Why the last generation failed (its returned text is then an apology), or None
+        # Host health and model availability are probed (and cached) by the backend manager on first use
+
+    @contextmanager
+    def _generate_stream(self, payload, timeout):
+        """
+        POST /api/generate (streamed) and yield the open response
 
-        # Verify that Ollama is running and the model is available
-        try:
-            response = requests.get(f"{self.api_base}/tags")
-            if response.status_code == 200:
-                available_models = [model['name'] for model in response.json().get('models', [])]
-                if model_name not in available_models:
-                    logger.warning(f"Model {model_name} not found in available models: {available_models}")
-                    logger.info(f"You may need to run: ollama pull {model_name}")
-                else:
-                    logger.info(f"Model {model_name} is available")
-            else:
-                logger.warning(f"Could not check available models. Status code: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Error checking Ollama API: {str(e)}")
-            logger.warning("Make sure Ollama is running on localhost:11434")
-
-    def generate_response(self, prompt, context=None, max_tokens=1000, temperature=0.7):
+        Through the backend manager the request counts as outstanding on its host until the stream
+        has been read and closed, and the host's outcome is reported then. Connection errors before
+        anything was generated fail over to another host.
+        """
+        if not self.backends:
+            self.last_host = self.api_base
+            with requests.post(f"{self.api_base}/generate", json=payload, timeout=timeout, stream=True) as response:
+                yield response
+            return
+        tried = []
+        while True:
+            with self.backends.acquire(exclude=tried) as host:
+                self.last_host = host
+                try:
+                    response = requests.post(f"{host}/api/generate", json=payload, timeout=timeout, stream=True)
+                except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                    # Nothing was generated yet, so another host can take the request
+                    self.backends.report_failure(host, e)
+                    tried.append(host)
+                    if len(tried) >= len(self.backends.hosts): raise
+                    logger.warning(f"Ollama host {host} unreachable, retrying on another host: {e}")
+                    continue
+                except requests.exceptions.RequestException as e:
+                    self.backends.report_failure(host, e)
+                    raise
+                with response:
+                    try:
+                        yield response
+                    except requests.exceptions.RequestException as e: # Stream broke or stalled mid-generation
+                        self.backends.report_failure(host, e)
+                        raise
+                    if response.status_code >= 500: self.backends.report_failure(host, f"HTTP {response.status_code}")
+                    else: self.backends.report_success(host)
+                return
+
+    def generate_response(self, prompt, context=None, max_tokens=1000, temperature=0.7, keep_alive=None, deadline=None):
         """
         Generate a response for the provided prompt
 
         Args:
             prompt (str): The prompt to generate a response for
-            context (list, optional): Additional context for the prompt
+            context (list, optional): Ollama context returned by an earlier call; the prompt continues it
             max_tokens (int, optional): Maximum number of tokens to generate
             temperature (float, optional): Sampling temperature
+            keep_alive (str|int, optional): Overrides the instance keep_alive for this request
+            deadline (float, optional): time.monotonic() deadline; the stream is closed (which stops
+                generation on the server) and DeadlineExceeded raised once it passes
 
         Returns:
-            str: The generated response
+            str: The generated response; on failure an apology, with the reason in last_error
         """
         if not prompt:
             logger.warning("Empty prompt provided")
             return "Please provide a question or prompt."
 
         logger.info(f"Generating response for prompt: {prompt[:50]}...")
+        self.last_context = None
+        self.last_stats = {}
+        self.last_error = None
 
         try:
             # Prepare the request payload
@@ -70,28 +123,56 @@ class OllamaLLM:
                     "temperature": temperature
                 }
             }
-
-            # Make the request to the Ollama API
-            response = requests.post(f"{self.api_base}/generate", json=payload)
-
-            if response.status_code == 200:
-                # Extract the response text
-                response_text = response.text
-
-                # Parse the response
-                responses = [json.loads(line) for line in response_text.strip().split('\n')]
-                full_response = ''.join(r.get('response', '') for r in responses)
-
-                logger.info(f"Successfully generated response: {full_response[:50]}...")
-                return full_response
-            else:
-                error_msg = f"API error: {response.status_code} - {response.text}"
-                logger.error(error_msg)
-                return f"Sorry, I encountered an error: {error_msg}"
-
+            if context:
+                payload["context"] = context
+            keep_alive = keep_alive if keep_alive is not None else self.keep_alive
+            if keep_alive is not None:
+                payload["keep_alive"] = keep_alive
+
+            # Make the request to the Ollama API; the read timeout never outlives the deadline
+            left = remaining_s(deadline)
+            if left is not None and left <= 0: raise DeadlineExceeded("Deadline passed before generation started")
+            timeout = self.timeout if left is None else (self.timeout[0], max(0.05, min(self.timeout[1], left)))
+            try:
+                with self._generate_stream(payload, timeout) as response:
+                    if response.status_code != 200:
+                        error_msg = f"API error: {response.status_code} - {response.text}"
+                        logger.error(error_msg)
+                        self.last_error = error_msg
+                        return f"Sorry, I encountered an error: {error_msg}"
+
+                    # Read the NDJSON stream chunk by chunk so a deadline can stop it mid-generation
+                    parts = []
+                    final = {}
+                    try:
+                        for line in response.iter_lines():
+                            if not line: continue
+                            chunk = json.loads(line)
+                            parts.append(chunk.get('response', ''))
+                            if chunk.get('done'): final = chunk
+                            if deadline is not None and remaining_s(deadline) <= 0:
+                                raise DeadlineExceeded(f"Deadline passed during generation after {len(parts)} chunks")
+                    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+                        # requests surfaces a read timeout inside a stream as ConnectionError
+                        if deadline is not None and remaining_s(deadline) <= 0: raise DeadlineExceeded("Deadline passed during generation")
+                        raise
+                    full_response = ''.join(parts)
+                    self.last_context = final.get('context')
+                    self.last_stats = {k: final[k] for k in ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration") if k in final}
+            except requests.exceptions.ReadTimeout:
+                if deadline is not None and remaining_s(deadline) <= 0: raise DeadlineExceeded("Deadline passed while waiting for the model")
+                raise
+
+            logger.info(f"Successfully generated response: {full_response[:50]}...")
+            return full_response
+
+        except DeadlineExceeded:
+            logger.warning(f"Generation cancelled: deadline exceeded ({self.last_host})")
+            raise
         except Exception as e:
             error_msg = f"Error generating response: {str(e)}"
             logger.error(error_msg)
+            self.last_error = error_msg
             return f"Sorry, I encountered an error: {error_msg}"
 
     def generate_answer(self, query, retrieved_contexts):
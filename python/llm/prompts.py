@@ -0,0 +1,53 @@
+# FILE: python/llm/prompts.py
+# Prompt construction for RAG answers. The 'prefix_stable' layout puts the fixed instruction
+# first and the per-request parts (history, retrieved context, question) after it, so the
+# model server can reuse the cached prefix instead of re-running prefill over it.
+
+# --- Configuration ---
+PROMPT_LAYOUTS = ("prefix_stable", "legacy")
+DEFAULT_PROMPT_LAYOUT = "prefix_stable"
+# --- End Configuration ---
+
+
+def format_history_block(session):
+    """Render a stored session (rolling summary + recent turns) as the prompt's history block."""
+    parts = []
+    if session.get("summary"):
+        parts.append(f"Summary of earlier conversation:\n{session['summary']}")
+    for turn in session.get("turns", []):
+        parts.append(f"User: {turn.get('user', '')}\nAssistant: {turn.get('assistant', '')}")
+    if not parts: return ""
+    return "Previous Conversation History:\n---\n" + "\n\n".join(parts) + "\n---\n\n"
+
+
+def build_rag_prompt(query, context_str, system_instruction, history_str="", layout=DEFAULT_PROMPT_LAYOUT, continuation=False):
+    """
+    Assemble the generation prompt
+
+    Args:
+        query (str): User question
+        context_str (str): Formatted 'Source [n]' context (may be empty)
+        system_instruction (str): Fixed instruction for this command type; with continuation, only a
+            per-turn instruction (None when the one the conversation started with still applies)
+        history_str (str): History block (empty when none)
+        layout (str): 'prefix_stable' (instruction first) or 'legacy' (history first)
+        continuation (bool): The model already holds the earlier conversation (Ollama context),
+            so only the new context, the per-turn instruction and the question are sent
+
+    Returns:
+        str: Prompt text
+    """
+    if continuation:
+        context_block = f"Context:\n---\n{context_str}\n---\n\n" if context_str else "Context: [No relevant context provided]\n\n"
+        instruction_block = f"Instruction: {system_instruction}\n\n" if system_instruction else ""
+        return f"\n\n{context_block}{instruction_block}User Question: {query}\n\nAssistant Answer (Cite sources like [1]):"
+
+    if layout == "legacy":
+        if not context_str:
+            return f"{history_str}Instruction: {system_instruction}\n\nUser Question: {query}\n\nContext: [No relevant context provided]\n\nAssistant Answer:"
+        return f"{history_str}Instruction: {system_instruction}\n\nContext:\n---\n{context_str}\n---\n\nUser Question: {query}\n\nAssistant Answer (Cite sources like [1]):"
+
+    # prefix_stable: least-changing parts first (instruction, then history, which only grows at its end)
+    if not context_str:
+        return f"Instruction: {system_instruction}\n\n{history_str}Context: [No relevant context provided]\n\nUser Question: {query}\n\nAssistant Answer:"
+    return f"Instruction: {system_instruction}\n\n{history_str}Context:\n---\n{context_str}\n---\n\nUser Question: {query}\n\nAssistant Answer (Cite sources like [1]):"
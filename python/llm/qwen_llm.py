@@ -1,17 +1,79 @@
 # python/llm/qwen_llm.py
 import logging
+import os
+import threading
+from collections import OrderedDict
 import torch
 from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
-from qwen_vl_utils import process_vision_info
+from qwen_vl_utils import fetch_image
 
 logger = logging.getLogger(__name__)
 
+# --- Configuration ---
+DEFAULT_MAX_PIXELS = 512 * 28 * 28          # Per-image pixel budget (Qwen works on 28x28 patches)
+DEFAULT_MAX_TOTAL_PIXELS = 4 * DEFAULT_MAX_PIXELS  # Per-request budget, shared by that request's images
+DEFAULT_MAX_BATCH_SIZE = 4                  # Requests per generate() call
+DEFAULT_IMAGE_CACHE_BYTES = 512 * 1024 * 1024
+NO_IMAGES_ANSWER = "No relevant images found for this query."
+# --- End Configuration ---
+
+
+class ImageFeatureCache:
+    """LRU cache of preprocessed image tensors keyed by (path, mtime, pixel budget), bounded by bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image_path, max_pixels):
+        path = os.path.abspath(image_path)
+        # mtime_ns invalidates entries when a page image is re-extracted in place
+        return (path, os.stat(path).st_mtime_ns, max_pixels)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, features):
+        size = sum(t.element_size() * t.nelement() for t in features.values())
+        if size > self.max_bytes: return
+        with self._lock:
+            if key in self._entries: return
+            self._entries[key] = (features, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+
+
 class QwenVLModel:
     """Qwen 2.5 Vision-Language model implementation"""
 
     def __init__(self, model_path, params=None):
+        """
+        Args:
+            model_path (str): Hugging Face model ID or local path
+            params (dict, optional): Generation and preprocessing settings:
+                max_new_tokens, temperature, do_sample, max_pixels (per image),
+                max_total_pixels (per request), max_batch_size, image_cache_bytes
+        """
         self.model_path = model_path
         self.params = params or {}
+        self.max_pixels = self.params.get("max_pixels", DEFAULT_MAX_PIXELS)
+        self.max_total_pixels = self.params.get("max_total_pixels", DEFAULT_MAX_TOTAL_PIXELS)
+        self.max_batch_size = self.params.get("max_batch_size", DEFAULT_MAX_BATCH_SIZE)
+        self.image_cache = ImageFeatureCache(self.params.get("image_cache_bytes", DEFAULT_IMAGE_CACHE_BYTES))
         self._load_model()
 
     def _load_model(self):
@@ -33,70 +95,104 @@ class QwenVLModel:
             logger.error(f"Error loading Qwen model: {e}")
             raise
 
-    def generate_response(self, query, image_paths):
-        """Generate a response based on the query and images"""
+    def _image_budget(self, n_images):
+        """Per-image pixel budget for a request with n_images images."""
+        return max(28 * 28, min(self.max_pixels, self.max_total_pixels // max(1, n_images)))
+
+    def _image_features(self, image_path, max_pixels):
+        """Resize (within max_pixels) and run the image processor once per image version; cached."""
+        key = ImageFeatureCache.key(image_path, max_pixels)
+        features = self.image_cache.get(key)
+        if features is None:
+            image = fetch_image({"image": image_path, "max_pixels": max_pixels})
+            processed = self.processor.image_processor(images=[image], return_tensors="pt")
+            features = {"pixel_values": processed["pixel_values"], "image_grid_thw": processed["image_grid_thw"]}
+            self.image_cache.put(key, features)
+        return features
+
+    def _build_text(self, query, image_paths):
+        messages = [{"role": "user", "content": [{"type": "image", "image": p} for p in image_paths]}]
+        messages[0]["content"].append({
+            "type": "text",
+            "text": f"Question: {query}\nPlease analyze these document images and provide a detailed answer."
+        })
+        return self.processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def _expand_image_tokens(self, text, grids):
+        """Repeat each image placeholder once per merged patch, as the processor does for raw images."""
+        image_token = getattr(self.processor, "image_token", "<|image_pad|>")
+        merge_length = self.processor.image_processor.merge_size ** 2
+        for grid in grids:
+            text = text.replace(image_token, "<|placeholder|>" * int(grid.prod() // merge_length), 1)
+        return text.replace("<|placeholder|>", image_token)
+
+    def _generate_batch(self, batch):
+        """One padded generate() call for [(query, image_paths), ...], all with images."""
+        texts, pixel_values, grids = [], [], []
+        for query, image_paths in batch:
+            budget = self._image_budget(len(image_paths))
+            features = [self._image_features(p, budget) for p in image_paths]
+            request_grids = [f["image_grid_thw"] for f in features]
+            texts.append(self._expand_image_tokens(self._build_text(query, image_paths), [g[0] for g in request_grids]))
+            pixel_values += [f["pixel_values"] for f in features]
+            grids += request_grids
+
+        tokenizer = self.processor.tokenizer
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left" # Decoder-only generation needs the prompts right-aligned
         try:
-            if not image_paths:
-                return "No relevant images found for this query."
-
-            # Build messages with images
-            messages = [{"role": "user", "content": []}]
-
-            # Add images to message
-            for img_path in image_paths:
-                messages[0]["content"].append({
-                    "type": "image",
-                    "image": img_path
-                })
-
-            # Add text query
-            messages[0]["content"].append({
-                "type": "text",
-                "text": f"Question: {query}\nPlease analyze these document images and provide a detailed answer."
-            })
-
-            # Process with Qwen
-            text = self.processor.apply_chat_template(
-                messages, tokenize=False, add_generation_prompt=True
-            )
-
-            image_inputs, video_inputs = process_vision_info(messages)
-            inputs = self.processor(
-                text=[text],
-                images=image_inputs,
-                videos=video_inputs,
-                padding=True,
-                return_tensors="pt"
-            )
-            inputs = inputs.to(self.model.device)
-
-            # Extract generation parameters
-            max_new_tokens = self.params.get("max_new_tokens", 512)
-            temperature = self.params.get("temperature", 0.7)
-            do_sample = self.params.get("do_sample", True)
-
-            # Generate response
-            with torch.no_grad():
-                generated_ids = self.model.generate(
-                    **inputs,
-                    max_new_tokens=max_new_tokens,
-                    do_sample=do_sample,
-                    temperature=temperature
-                )
-
-            # Decode response
-            generated_ids_trimmed = [
-                out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-            ]
-
-            output_text = self.processor.batch_decode(
-                generated_ids_trimmed,
-                skip_special_tokens=True,
-                clean_up_tokenization_spaces=False
+            inputs = tokenizer(texts, padding=True, return_tensors="pt")
+        finally:
+            tokenizer.padding_side = padding_side
+        inputs["pixel_values"] = torch.cat(pixel_values, dim=0)
+        inputs["image_grid_thw"] = torch.cat(grids, dim=0)
+        inputs = inputs.to(self.model.device)
+
+        # Extract generation parameters
+        max_new_tokens = self.params.get("max_new_tokens", 512)
+        temperature = self.params.get("temperature", 0.7)
+        do_sample = self.params.get("do_sample", True)
+
+        with torch.no_grad():
+            generated_ids = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=do_sample,
+                temperature=temperature
             )
 
-            return output_text[0]
-
+        # With left padding every prompt ends at the same position
+        generated_ids_trimmed = generated_ids[:, inputs.input_ids.shape[1]:]
+        return self.processor.batch_decode(
+            generated_ids_trimmed,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=False
+        )
+
+    def generate_batch(self, requests):
+        """
+        Generate answers for several (query, image_paths) pairs with batched decoding
+
+        Args:
+            requests (list): [(query, image_paths), ...]
+
+        Returns:
+            list: One answer per request, in input order
+        """
+        answers = [NO_IMAGES_ANSWER] * len(requests)
+        pending = [i for i, (_, image_paths) in enumerate(requests) if image_paths]
+        try:
+            for start in range(0, len(pending), self.max_batch_size):
+                indices = pending[start:start + self.max_batch_size]
+                outputs = self._generate_batch([requests[i] for i in indices])
+                for i, output in zip(indices, outputs):
+                    answers[i] = output
+            logger.info(f"Image feature cache: {self.image_cache.hits} hits, {self.image_cache.misses} misses, {self.image_cache.bytes / 1e6:.1f} MB")
+            return answers
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def generate_response(self, query, image_paths):
+        """Generate a response based on the query and images"""
+        return self.generate_batch([(query, image_paths)])[0]
@@ -0,0 +1,208 @@
+# FILE: python/llm/scheduler.py
+# Admission control for LLM generation. A fixed number of slots bounds concurrent generations
+# across all query processes; callers beyond that wait in a bounded priority queue (interactive
+# before bulk, then first come first served), are rejected immediately when the queue is full,
+# and give up when their deadline passes. State is plain files, so processes that die (e.g. a
+# query killed after its client disconnected) release their slot and queue place automatically.
+
+import contextvars
+import fcntl
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from .backend_manager import DEFAULT_STATE_DIR, pid_alive
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PRIORITIES = {"interactive": 0, "bulk": 1}
+DEFAULT_MAX_CONCURRENCY = 2
+DEFAULT_MAX_QUEUE = 16
+POLL_INTERVAL_S = 0.02
+SLOTS_DIR = "slots"
+QUEUE_DIR = "queue"
+# --- End Configuration ---
+
+_request_options = contextvars.ContextVar("llm_request_options", default={})
+
+
+class SchedulerRejected(RuntimeError):
+    """The wait queue is full; the caller should retry later."""
+
+
+class DeadlineExceeded(RuntimeError):
+    """The request's deadline passed while queued or while generating."""
+
+
+def remaining_s(deadline):
+    """Seconds until a time.monotonic() deadline (None when there is no deadline)."""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def request_options(priority=None, deadline=None):
+    """Set the priority class and monotonic deadline used by ScheduledLLM calls in this context."""
+    token = _request_options.set({"priority": priority, "deadline": deadline})
+    try:
+        yield
+    finally:
+        _request_options.reset(token)
+
+
+class GenerationScheduler:
+    """
+    Cross-process concurrency limit with a bounded priority queue
+
+    A slot is an exclusive flock on one of max_concurrency slot files, held for the duration of
+    a generation. Waiters are marker files named '<priority>-<enqueue ns>-<pid>-<n>'; only waiters
+    ranked ahead of the number of free slots try to take one, which keeps the ordering.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                 state_dir=DEFAULT_STATE_DIR, poll_interval=POLL_INTERVAL_S):
+        """
+        Args:
+            max_concurrency (int): Generations allowed to run at once (all processes)
+            max_queue (int): Waiting requests before new ones are rejected
+            state_dir (str): Directory for slot and queue files (shared by all query processes)
+            poll_interval (float): How often waiters re-check for a free slot
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.interactive_reserve = max(1, self.max_queue // 4) if self.max_queue > 1 else 0
+        self.poll_interval = poll_interval
+        self.slots_dir = os.path.join(state_dir, SLOTS_DIR)
+        self.queue_dir = os.path.join(state_dir, QUEUE_DIR)
+        os.makedirs(self.slots_dir, exist_ok=True)
+        os.makedirs(self.queue_dir, exist_ok=True)
+        self._seq = itertools.count()
+
+    # --- Slots ---
+    def _slot_path(self, index):
+        return os.path.join(self.slots_dir, f"slot-{index}.lock")
+
+    def _try_slot(self):
+        """Open file holding an exclusive lock on a free slot, or None."""
+        for index in range(self.max_concurrency):
+            f = open(self._slot_path(index), "a+")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+
+    def free_slots(self):
+        free = 0
+        for index in range(self.max_concurrency):
+            with open(self._slot_path(index), "a+") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    free += 1
+                except BlockingIOError:
+                    pass
+        return free
+
+    # --- Queue ---
+    def _waiters(self):
+        """Live waiter names in service order; entries of dead processes are removed."""
+        live = []
+        for name in os.listdir(self.queue_dir):
+            parts = name.split("-")
+            try:
+                priority, enqueued, pid = int(parts[0]), int(parts[1]), int(parts[2])
+            except (IndexError, ValueError):
+                continue
+            if pid_alive(pid): live.append((priority, enqueued, name))
+            else:
+                try: os.remove(os.path.join(self.queue_dir, name))
+                except FileNotFoundError: pass
+        return [name for _, _, name in sorted(live)]
+
+    @contextmanager
+    def slot(self, priority="interactive", deadline=None):
+        """
+        Hold a generation slot for the duration of the block
+
+        Args:
+            priority (str): 'interactive' or 'bulk'
+            deadline (float, optional): time.monotonic() deadline for getting the slot
+
+        Raises:
+            SchedulerRejected: The wait queue is full
+            DeadlineExceeded: The deadline passed while waiting
+        """
+        rank = PRIORITIES.get(priority, PRIORITIES["bulk"])
+        started = time.monotonic()
+        slot_file = self._try_slot() if not self._waiters() else None
+        if slot_file is None:
+            slot_file = self._wait_for_slot(rank, deadline)
+        waited = time.monotonic() - started
+        if waited > 0.05: logger.info(f"LLM slot acquired after {waited * 1000:.0f} ms in queue ({priority})")
+        try:
+            yield waited
+        finally:
+            fcntl.flock(slot_file, fcntl.LOCK_UN)
+            slot_file.close()
+
+    def _wait_for_slot(self, rank, deadline):
+        waiters = self._waiters()
+        # Part of the queue is kept for interactive requests so a backlog of bulk work cannot lock them out
+        limit = self.max_queue if rank == PRIORITIES["interactive"] else self.max_queue - self.interactive_reserve
+        if len(waiters) >= limit:
+            raise SchedulerRejected(f"LLM queue full ({len(waiters)} waiting, {self.max_concurrency} running)")
+        name = f"{rank}-{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.{next(self._seq)}"
+        marker = os.path.join(self.queue_dir, name)
+        open(marker, "w").close()
+        try:
+            while True:
+                waiters = self._waiters()
+                position = waiters.index(name) if name in waiters else 0
+                if position < self.free_slots():
+                    slot_file = self._try_slot()
+                    if slot_file is not None: return slot_file
+                left = remaining_s(deadline)
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded(f"Deadline passed after waiting in the LLM queue (position {position + 1})")
+                time.sleep(self.poll_interval if left is None else max(0.0, min(self.poll_interval, left)))
+        finally:
+            try: os.remove(marker)
+            except FileNotFoundError: pass
+
+    def stats(self):
+        waiters = self._waiters()
+        by_class = {cls: sum(1 for w in waiters if w.startswith(f"{rank}-")) for cls, rank in PRIORITIES.items()}
+        return {"running": self.max_concurrency - self.free_slots(), "max_concurrency": self.max_concurrency,
+                "waiting": len(waiters), "waiting_by_priority": by_class, "max_queue": self.max_queue}
+
+
+class ScheduledLLM:
+    """
+    LLM wrapper whose generate_response waits for a scheduler slot first
+
+    Priority and deadline come from the arguments or from request_options(); the deadline is
+    also passed to the wrapped LLM so it can cancel a generation that runs past it. Other
+    attributes (last_stats, last_context, ...) are read from the wrapped LLM.
+    """
+
+    def __init__(self, llm, scheduler):
+        self.llm = llm
+        self.scheduler = scheduler
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def generate_response(self, prompt, *args, priority=None, deadline=None, **kwargs):
+        options = _request_options.get()
+        priority = priority or options.get("priority") or "interactive"
+        deadline = deadline if deadline is not None else options.get("deadline")
+        with self.scheduler.slot(priority, deadline):
+            left = remaining_s(deadline)
+            if left is not None and left <= 0: raise DeadlineExceeded("Deadline passed before generation started")
+            return self.llm.generate_response(prompt, *args, deadline=deadline, **kwargs)
@@ -6,15 +6,27 @@ import json
 import logging
 import re
 import sys
-import requests
 import os
 from qdrant_client import QdrantClient, models # Import models for Filter
-from sentence_transformers import SentenceTransformer
+from embeddings.embed_factory import get_embedder
+from embeddings.projection import ProjectionStore, searched_projection
+from embeddings.registry import ModelRegistry, using, vector_of
 # Assumes OllamaLLM class is correctly defined in llm/ollama_llm.py
 # If not, you might need to implement basic request logic here or in the class
-from llm.ollama_llm import OllamaLLM
+from llm.ollama_llm import LLMGenerationError, OllamaLLM
+from llm.backend_manager import OllamaBackendManager, hosts_from_env
+from llm.scheduler import DeadlineExceeded, GenerationScheduler, ScheduledLLM, SchedulerRejected, request_options
+from llm.prompts import PROMPT_LAYOUTS, build_rag_prompt, format_history_block
+from utils import routing, timing
+from utils.keyphrases import KeyphraseStore
+from utils.retrieval import adaptive_cutoff, cap_per_group, mmr_select
+from utils.text_store import TextStore
+from utils.topics import TopicStore
+from utils.sessions import SessionStore
 import time
 
+PROCESS_STARTED = time.monotonic() # Request deadlines count from process start (the backend spawns one per query)
+
 # Configure logging
 # Increased level to DEBUG temporarily if needed for deep tracing
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] [%(levelname)s] %(message)s')
@@ -23,56 +35,128 @@ logger = logging.getLogger(__name__)
 # --- Configuration ---
 QDRANT_HOST = os.getenv("QDRANT_HOST", "qdrant")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+QDRANT_PATH = os.getenv("QDRANT_PATH") # Set to use Qdrant local mode (embedded, on-disk) instead of the server
 OLLAMA_HOST_URL = os.getenv("OLLAMA_HOST_URL", "http://host.docker.internal:11434")
 OLLAMA_API_BASE = f"{OLLAMA_HOST_URL}/api"
+OLLAMA_HOSTS = hosts_from_env(OLLAMA_HOST_URL) # OLLAMA_HOSTS=http://a:11434,http://b:11434 spreads load across hosts
 
-EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
-LLM_MODEL_NAME = 'tinyllama'
 DEFAULT_COLLECTION = 'documents'
+model_registry = ModelRegistry()
+EMBEDDING_MODEL_NAME = model_registry.active(DEFAULT_COLLECTION)[1] # Preloaded; other collections may use other models (embeddings.registry)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch") # 'onnx-int8' keeps torch out of query startup
+LLM_MODEL_NAME = 'tinyllama'
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m") # Keep the model resident between queries
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "prefix_stable") # 'prefix_stable' (cacheable instruction prefix) or 'legacy'
+CARRY_LLM_CONTEXT = os.getenv("CARRY_LLM_CONTEXT", "0") == "1" # Continue Ollama's context across turns of a conversation
+MAX_CARRIED_CONTEXT_TOKENS = int(os.getenv("MAX_CARRIED_CONTEXT_TOKENS", 3072)) # Past this, restart from the summary history
 CONTEXT_RETRIEVAL_LIMIT = 5
+PER_DOC_LIMIT = int(os.getenv("PER_DOC_LIMIT", 0)) # Max chunks from one PDF in a multi-document answer (0 = no cap)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA")) if os.getenv("MMR_LAMBDA") else None # Set (e.g. 0.7) to enable MMR
+CANDIDATE_MULTIPLIER = 4 # Candidates fetched per selected chunk when capping or MMR is on
+MIN_RELEVANCE_SCORE = float(os.getenv("MIN_RELEVANCE_SCORE", 0.25)) # Best hit below this -> canned answer, no LLM call
+MIN_HIT_SCORE = float(os.getenv("MIN_HIT_SCORE", 0.15)) # Question hits below this are dropped from the prompt
+SCORE_GAP = float(os.getenv("SCORE_GAP", 0.1)) if os.getenv("SCORE_GAP", "") != "off" else None # Stop at a drop this large between consecutive hits
+SCORE_RELATIVE_FLOOR = float(os.getenv("SCORE_RELATIVE_FLOOR", 0.0)) # Also stop below this fraction of the best score (0 = off)
+COMMAND_MIN_HITS = 3 # Document-wide commands keep at least this many hits whatever the score gaps
+NO_RELEVANT_CONTEXT_ANSWER = "I could not find anything relevant to this question in the selected document(s)."
 MAX_CONTEXT_CHAR_LIMIT = 4096
 MAX_HISTORY_TOKENS = 500
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(RAG_DATA_DIR, "sessions.sqlite3"))
+SESSION_SUMMARY_MODE = os.getenv("SESSION_SUMMARY_MODE", "extractive") # 'llm' folds old turns with one bounded LLM call
+SESSION_SUMMARY_MAX_WORDS = 200
+SESSION_SUMMARY_DEADLINE_S = 30
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 2 * len(OLLAMA_HOSTS))) # Generations at once, all query processes
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 16)) # Waiting generations before new queries are rejected
+DEADLINES_S = {"interactive": float(os.getenv("INTERACTIVE_DEADLINE_S", 60)), "bulk": float(os.getenv("BULK_DEADLINE_S", 300))}
+COMMAND_PRIORITIES = {"summary": "bulk", "topics": "bulk", "explain_topics": "bulk", "keywords": "bulk", "questions": "bulk"}
+EXIT_TEMPFAIL = 75 # Exit code for overload/deadline errors so the backend can answer 503/504
+KEYPHRASE_DIR = os.getenv("KEYPHRASE_DIR", os.path.join(RAG_DATA_DIR, "keyphrases"))
+KEYWORDS_LLM_POLISH = os.getenv("KEYWORDS_LLM_POLISH", "0") == "1" # Let the LLM tidy the precomputed keyword list
+KEYWORDS_SHOWN = 20
+TOPIC_DIR = os.getenv("TOPIC_DIR", os.path.join(RAG_DATA_DIR, "topics"))
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", os.path.join(RAG_DATA_DIR, "text_store"))
+PROJECTION_DIR = os.getenv("PROJECTION_DIR", os.path.join(RAG_DATA_DIR, "projections"))
+VECTOR_PROJECTION = os.getenv("VECTOR_PROJECTION", "1") != "0" # Search the reduced vector when one is fitted (reduce_vectors.py)
+RESCORE_MULTIPLIER = int(os.getenv("RESCORE_MULTIPLIER", 4)) # Reduced-vector candidates per result, rescored with the full vectors
+# Only these payload fields cross the network; chunk text is hydrated from the sidecar ("text" covers older points)
+PAYLOAD_FIELDS = ["pdf_id", "source", "page", "type", "text", "text_shard", "text_offset", "text_length"]
+TOPIC_MAX_CLUSTERS = 8        # Topics shown across the selected PDFs (largest first)
+TOPIC_CHUNKS_PER_CLUSTER = 2  # Representative chunks sent per topic
+TOPIC_CHUNK_CHARS = 600       # Characters kept from each representative chunk
+TOPIC_EXPLAIN_MAX_TOKENS = 200
+TOPIC_HEADER_CHARS = 200      # Allowance for the group and source headers around each chunk
 # --- End Configuration ---
 
 # --- Client/Model Initialization ---
 embedding_model = None
 llm = None
+startup_timer = timing.StageTimer() # Import-time stages, merged into each invocation's timings
 try:
-    logger.info(f"Loading embedding model: {EMBEDDING_MODEL_NAME}")
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    logger.info(f"Loading embedding model: {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})")
+    with startup_timer.span("embedding_model_load"):
+        embedding_model = get_embedder(EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND)
     logger.info("Embedding model loaded.")
 except Exception as e:
     logger.critical(f"CRITICAL: Failed to load embedding model: {e}", exc_info=True)
     sys.exit("Embedding model failed to load")
 
 try:
-    logger.info(f"Initializing LLM: {LLM_MODEL_NAME} targeting {OLLAMA_API_BASE}")
-    llm = OllamaLLM(model_name=LLM_MODEL_NAME) # Assumes class exists
-    if hasattr(llm, 'api_base'):
-         llm.api_base = OLLAMA_API_BASE
-         logger.info(f"Set OllamaLLM api_base to: {OLLAMA_API_BASE}")
-    else:
-         logger.warning("Cannot dynamically set api_base on OllamaLLM instance. Ensure class implementation uses OLLAMA_API_BASE.")
+    logger.info(f"Initializing LLM: {LLM_MODEL_NAME} targeting {', '.join(OLLAMA_HOSTS)}")
+    with startup_timer.span("llm_init"):
+        # Health/model probes are cached on disk (TTL) and run lazily on the first request, not on every import
+        llm_backends = OllamaBackendManager(OLLAMA_HOSTS, model_name=LLM_MODEL_NAME, keep_alive=OLLAMA_KEEP_ALIVE, preload=False)
+        ollama_llm = OllamaLLM(model_name=LLM_MODEL_NAME, keep_alive=OLLAMA_KEEP_ALIVE, backends=llm_backends)
+        ollama_llm.api_base = OLLAMA_API_BASE
+        # Every generation waits for one of LLM_MAX_CONCURRENCY slots shared by all query processes
+        llm_scheduler = GenerationScheduler(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+        llm = ScheduledLLM(ollama_llm, llm_scheduler)
     logger.info(f"LLM instance for '{LLM_MODEL_NAME}' created.")
-    # Check connection to host Ollama
-    try:
-        logger.info(f"Checking connection to Ollama host at {OLLAMA_HOST_URL}...")
-        test_response = requests.get(f"{OLLAMA_HOST_URL}/api/tags", timeout=10) # Increased timeout slightly
-        test_response.raise_for_status()
-        logger.info(f"Successfully connected to Ollama at {OLLAMA_HOST_URL}")
-        available_models = [m.get('name') for m in test_response.json().get('models', [])]
-        if LLM_MODEL_NAME not in available_models and f"{LLM_MODEL_NAME}:latest" not in available_models:
-            logger.warning(f"Model '{LLM_MODEL_NAME}' not found in host Ollama models: {available_models}. Please run 'ollama pull {LLM_MODEL_NAME}' on the host.")
-    except requests.exceptions.ConnectionError as conn_err:
-         logger.error(f"Could not connect to Ollama at {OLLAMA_HOST_URL}. Is Ollama application running on the host? Error: {conn_err}")
-    except requests.exceptions.RequestException as req_err:
-         logger.error(f"Error communicating with Ollama at {OLLAMA_HOST_URL}: {req_err}")
 except Exception as e:
-     logger.critical(f"CRITICAL: LLM init/check failed: {e}", exc_info=True)
+     logger.critical(f"CRITICAL: LLM init failed: {e}", exc_info=True)
      sys.exit("LLM failed to initialize")
 
+query_embedders = {EMBEDDING_MODEL_NAME: embedding_model}
+
+def query_embedder(collection_name):
+    """
+    Embedder and vector name that queries of a collection use (its active model in the registry)
+
+    A re-embedding in progress does not change them; they switch at the cutover. Models other
+    than the preloaded one are loaded on first use and kept for the life of the process.
+
+    Returns:
+        tuple: (embedder, vector_name)
+    """
+    vector_name, model_name = model_registry.active(collection_name)
+    if model_name not in query_embedders:
+        logger.info(f"Loading embedding model: {model_name} ({EMBEDDING_BACKEND}) for collection '{collection_name}'")
+        with timing.span("embedding_model_load"):
+            query_embedders[model_name] = get_embedder(model_name, backend=EMBEDDING_BACKEND)
+    return query_embedders[model_name], vector_name
+
+def search_projection(collection_name, vector_name):
+    """(reduced vector name, PcaProjection) to search before rescoring with vector_name, or None when there is no ready projection."""
+    if not VECTOR_PROJECTION: return None
+    spec = ((model_registry.entry(collection_name) or {}).get("vectors") or {}).get(vector_name) or {}
+    projection = searched_projection(spec)
+    if not projection: return None
+    try:
+        return projection["vector"], projection_store.load(collection_name, vector_name, projection["version"])
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Projection v{projection['version']} of '{collection_name}' unavailable, searching the full vectors: {e}")
+        return None
+
+# Ollama context of the current conversation when CARRY_LLM_CONTEXT is on (loaded/saved by main)
+llm_session = {"context": None}
+text_store = TextStore(TEXT_STORE_DIR)
+projection_store = ProjectionStore(PROJECTION_DIR)
+
 def connect_qdrant(host, port, retries=5, delay=3):
-    """Connects to Qdrant with retries."""
+    """Connects to Qdrant with retries (or opens the local-mode storage at QDRANT_PATH)."""
+    if QDRANT_PATH:
+        logger.info(f"Using local-mode Qdrant at {QDRANT_PATH}")
+        return QdrantClient(path=QDRANT_PATH)
     for attempt in range(retries):
         try:
             logger.info(f"Attempting to connect to Qdrant at {host}:{port} (Attempt {attempt + 1}/{retries})...")
@@ -92,32 +176,117 @@ def connect_qdrant(host, port, retries=5, delay=3):
 
 
 # --- Core RAG Functions ---
-def retrieve_context(client, collection_name, query, pdf_id_filter, limit=CONTEXT_RETRIEVAL_LIMIT):
-    """Retrieve context from Qdrant for a specific PDF ID based on query."""
+class RetrievalError(RuntimeError):
+    """The vector search failed (Qdrant unreachable, bad collection config, ...), as opposed to finding nothing."""
+
+
+def pdf_filter(pdf_id_filter):
+    """Qdrant filter for one pdf_id or any of a list of pdf_ids."""
+    if isinstance(pdf_id_filter, (list, tuple)):
+        match = models.MatchAny(any=list(pdf_id_filter)) if len(pdf_id_filter) > 1 else models.MatchValue(value=pdf_id_filter[0])
+    else:
+        match = models.MatchValue(value=pdf_id_filter)
+    return models.Filter(must=[models.FieldCondition(key="pdf_id", match=match)])
+
+
+def retrieve_context(client, collection_name, query, pdf_id_filter, limit=CONTEXT_RETRIEVAL_LIMIT, per_doc_limit=None, mmr_lambda=None,
+                     min_score=None, min_hits=1):
+    """
+    Retrieve context from Qdrant for one PDF ID or a list of them based on query.
+
+    per_doc_limit caps the chunks taken from any single PDF and mmr_lambda enables maximal
+    marginal relevance over an enlarged candidate set; both default to the module settings.
+    Candidates below min_score are dropped, and the list is cut where scores fall off a cliff
+    (SCORE_GAP / SCORE_RELATIVE_FLOOR) once min_hits candidates are in, so fewer than limit
+    chunks may come back. Under tenant routing only the collections/shards owning the selected
+    PDFs are searched (the tenant comes from routing.tenant_scope). The query is embedded with
+    the collection's active model and searched against its named vector (query_embedder). With a
+    fitted projection the HNSW search runs on the reduced vector and its top RESCORE_MULTIPLIER x
+    candidates are rescored by Qdrant with the full vectors, so scores stay full-precision cosines.
+    Raises RetrievalError when the search fails, so an outage is reported instead of answered as
+    "no relevant context".
+    """
     if not embedding_model: raise RuntimeError("Embedding model is not loaded.")
     if not pdf_id_filter: logger.error("pdf_id_filter required"); return []
+    per_doc_limit = PER_DOC_LIMIT if per_doc_limit is None else per_doc_limit
+    mmr_lambda = MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    use_mmr = mmr_lambda is not None and 0.0 <= mmr_lambda < 1.0
+    multi_doc = isinstance(pdf_id_filter, (list, tuple)) and len(pdf_id_filter) > 1
+    cap = per_doc_limit if multi_doc else 0
+    candidate_limit = limit * CANDIDATE_MULTIPLIER if (use_mmr or cap) else limit
     logger.info(f"retrieve_context called with pdf_id_filter: '{pdf_id_filter}'")
     try:
-        query_embedding = embedding_model.encode(query).tolist()
-        qdrant_filter = models.Filter(must=[models.FieldCondition(key="pdf_id", match=models.MatchValue(value=pdf_id_filter))])
-        logger.info(f"Constructed Qdrant Filter: {qdrant_filter.model_dump_json(indent=2)}")
-        logger.info(f"Searching collection '{collection_name}' (limit={limit}) with filter...")
-        search_results = client.search(
-            collection_name=collection_name,
-            query_vector=query_embedding,
-            query_filter=qdrant_filter,
-            limit=limit,
-            with_payload=True
-        )
+        embedder, vector_name = query_embedder(collection_name)
+        with timing.span("embed_query"):
+            query_embedding = embedder.get_embedding(query, "text")
+        reduced = search_projection(collection_name, vector_name)
+        if reduced:
+            with timing.span("project_query"):
+                reduced_query = reduced[1].transform(query_embedding)[0].tolist()
+        pdf_ids = list(pdf_id_filter) if isinstance(pdf_id_filter, (list, tuple)) else [pdf_id_filter]
+        with timing.span("qdrant_search"):
+            search_results = []
+            for target_collection, shard_keys, target_pdf_ids in routing.router(collection_name).search_targets(pdf_ids):
+                qdrant_filter = pdf_filter(target_pdf_ids)
+                if logger.isEnabledFor(logging.DEBUG): logger.debug(f"Constructed Qdrant Filter: {qdrant_filter.model_dump_json(indent=2)}")
+                logger.info(f"Searching collection '{target_collection}'" + (f" shard keys {shard_keys}" if shard_keys else "")
+                            + f" (limit={candidate_limit}) with filter...")
+                prefetch = models.Prefetch(query=reduced_query, using=reduced[0], filter=qdrant_filter,
+                                           limit=candidate_limit * RESCORE_MULTIPLIER) if reduced else None
+                try:
+                    search_results += client.query_points(
+                        collection_name=target_collection,
+                        prefetch=prefetch,
+                        query=query_embedding,
+                        using=using(vector_name),
+                        query_filter=qdrant_filter,
+                        limit=candidate_limit,
+                        with_payload=PAYLOAD_FIELDS,
+                        with_vectors=[vector_name] if use_mmr and vector_name else use_mmr,
+                        shard_key_selector=shard_keys
+                    ).points
+                except Exception as e:
+                    if not routing.missing_collection(e): raise
+                    logger.warning(f"Collection '{target_collection}' does not exist; no chunks for {target_pdf_ids}.")
+            if len(search_results) > candidate_limit: # Several collections: merge by score
+                search_results = sorted(search_results, key=lambda hit: -hit.score)[:candidate_limit]
         logger.info(f"Retrieved {len(search_results)} results from Qdrant for pdf_id '{pdf_id_filter}'.")
-        valid_results = [ hit for hit in search_results if hit.payload and isinstance(hit.payload.get("text"), str) and hit.payload.get("text").strip() ]
+        valid_results = [ hit for hit in search_results if hit.payload and (
+            (isinstance(hit.payload.get("text"), str) and hit.payload.get("text").strip()) or hit.payload.get("text_shard") is not None) ]
         if len(valid_results) < len(search_results): logger.warning(f"Filtered out {len(search_results) - len(valid_results)} results lacking text payload.")
-        return valid_results
-    except Exception as e: logger.error(f"Qdrant retrieval error: {e}", exc_info=True); return []
+        keep = adaptive_cutoff([hit.score for hit in valid_results], min_score, SCORE_GAP, SCORE_RELATIVE_FLOOR, min_hits)
+        if keep < len(valid_results):
+            logger.info(f"Score cutoff kept {keep} of {len(valid_results)} candidates "
+                        f"(top {valid_results[0].score:.3f}, min_score={min_score}, gap={SCORE_GAP}).")
+            valid_results = valid_results[:keep]
+        if len(valid_results) <= limit and not cap: return hydrate_text(valid_results)
+        with timing.span("rerank"):
+            groups = [hit.payload.get("pdf_id") for hit in valid_results]
+            vectors = [vector_of(hit, vector_name) for hit in valid_results] if use_mmr else []
+            if use_mmr and all(isinstance(vector, list) for vector in vectors):
+                selected = mmr_select(query_embedding, vectors, limit, mmr_lambda, groups, cap)
+            else:
+                selected = cap_per_group(groups, limit, cap)
+        logger.info(f"Selected {len(selected)} of {len(valid_results)} candidates (mmr={use_mmr}, per_doc_limit={cap}).")
+        return hydrate_text([valid_results[i] for i in selected])
+    except Exception as e:
+        logger.error(f"Qdrant retrieval error: {e}", exc_info=True)
+        raise RetrievalError(f"Qdrant retrieval failed: {e}") from e
+
+
+def hydrate_text(hits):
+    """Fill in chunk texts from the sidecar store, only for the hits that are actually used."""
+    with timing.span("hydrate_text"):
+        return text_store.hydrate(hits)
 
 
 def format_context_for_llm(results):
     """Formats retrieved context for the LLM prompt and extracts sources."""
+    with timing.span("format_context"):
+        return _format_context_for_llm(results)
+
+
+def _format_context_for_llm(results):
     context_str = ""
     sources = []
     if not results: return context_str, sources
@@ -131,7 +300,7 @@ def format_context_for_llm(results):
             score = hit.score or 0.0
             if text:
                  context_str += f"Source [{i+1}] (Page: {page}, Document: {doc_name}, Score: {score:.3f}):\n{text}\n\n"
-                 sources.append({"id": i + 1, "page": page, "document": doc_name, "score": score})
+                 sources.append({"id": i + 1, "page": page, "document": doc_name, "pdf_id": payload.get("pdf_id"), "score": score})
         except Exception as e: logger.warning(f"Failed format hit {i}: {e}")
     return context_str.strip(), sources
 
@@ -141,9 +310,33 @@ def estimate_tokens(text):
     return len(text.split())
 
 
-def generate_rag_response(query, context_str, chat_history=None, system_instruction=None):
-    """Generates a response using the LLM with context, history, and citation attempts."""
+def summarize_turns_with_llm(summary, turns):
+    """Fold aged-out turns into the rolling summary with one bounded LLM call."""
+    turns_str = "\n".join(f"User: {t['user']}\nAssistant: {t['assistant']}" for t in turns)
+    prompt = (
+        f"Update the conversation summary with the new exchanges. Keep it under {SESSION_SUMMARY_MAX_WORDS} words, "
+        f"keep facts and document references, drop pleasantries.\n\nCurrent summary:\n{summary or '(empty)'}\n\n"
+        f"New exchanges:\n{turns_str[:MAX_CONTEXT_CHAR_LIMIT]}\n\nUpdated summary:"
+    )
+    with timing.span("session_summarize"):
+        updated = llm.generate_response(prompt, priority="bulk", deadline=time.monotonic() + SESSION_SUMMARY_DEADLINE_S).strip()
+    if getattr(llm, "last_error", None): raise LLMGenerationError(f"LLM summary failed: {llm.last_error}")
+    if not updated: raise LLMGenerationError("LLM summary was empty")
+    return " ".join(updated.split()[:SESSION_SUMMARY_MAX_WORDS])
+
+
+def generate_rag_response(query, context_str, chat_history=None, system_instruction=None, carry_context=True, max_tokens=None):
+    """
+    Generates a response using the LLM with context, history, and citation attempts.
+
+    chat_history is either a list of {"user", "assistant"} turns (truncated here) or a
+    precomputed history block from format_history_block, used as-is. With a carried Ollama
+    context the model already holds the conversation, so only the new context and question are sent.
+    carry_context=False makes a standalone call that neither uses nor updates the carried context.
+    Raises LLMGenerationError when the LLM fails, so an error is never returned as an answer.
+    """
     if not llm: raise RuntimeError("LLM is not initialized.")
+    turn_instruction = system_instruction # A command's own instruction; repeated even when continuing a carried context
     if not system_instruction:
         system_instruction = (
             "You are an AI assistant answering questions based ONLY on the provided document context. "
@@ -154,7 +347,9 @@ def generate_rag_response(query, context_str, chat_history=None, system_instruct
             "Be concise."
         )
     history_str = ""
-    if chat_history:
+    if isinstance(chat_history, str):
+        history_str = chat_history
+    elif chat_history:
         token_count = 0
         for turn in reversed(chat_history):
             turn_text = f"User: {turn.get('user', '')}\nAssistant: {turn.get('assistant', '')}\n"
@@ -171,22 +366,30 @@ def generate_rag_response(query, context_str, chat_history=None, system_instruct
         context_str = context_str[:MAX_CONTEXT_CHAR_LIMIT] + "..."
 
     # Construct prompt
-    if not context_str:
-         prompt_for_llm = f"{history_str}Instruction: {system_instruction}\n\nUser Question: {query}\n\nContext: [No relevant context provided]\n\nAssistant Answer:"
-         logger.warning("No context provided.")
-    else:
-        prompt_for_llm = ( f"{history_str}Instruction: {system_instruction}\n\nContext:\n---\n{context_str}\n---\n\nUser Question: {query}\n\nAssistant Answer (Cite sources like [1]):" )
-
-    # Use the configured OLLAMA_API_BASE when generating response
-    # Assuming llm object or its generate_response method uses self.api_base internally
-    current_llm_target = getattr(llm, 'api_base', OLLAMA_API_BASE) # Get the actual target
-    logger.info(f"Sending request to LLM '{LLM_MODEL_NAME}' at {current_llm_target}...")
+    carried_context = llm_session.get("context") if CARRY_LLM_CONTEXT and carry_context else None
+    if carried_context and len(carried_context) > MAX_CARRIED_CONTEXT_TOKENS:
+        logger.info(f"Carried context ({len(carried_context)} tokens) over budget; starting from the history block.")
+        carried_context = None
+    if not context_str: logger.warning("No context provided.")
+    if carried_context: prompt_for_llm = build_rag_prompt(query, context_str, turn_instruction, continuation=True)
+    else: prompt_for_llm = build_rag_prompt(query, context_str, system_instruction, history_str, PROMPT_LAYOUT)
+
+    # The backend manager picks the least-loaded healthy host from OLLAMA_HOSTS
+    logger.info(f"Sending request to LLM '{LLM_MODEL_NAME}' ({len(OLLAMA_HOSTS)} host(s) configured)...")
     try:
-        response = llm.generate_response(prompt_for_llm)
-        logger.info("Received response from LLM.")
+        with timing.span("llm_generate"):
+            options = {"max_tokens": max_tokens} if max_tokens else {}
+            response = llm.generate_response(prompt_for_llm, context=carried_context, **options)
+        if getattr(llm, "last_error", None): raise LLMGenerationError(llm.last_error)
+        logger.info(f"Received response from LLM at {getattr(llm, 'last_host', None)}.")
+        stats = getattr(llm, "last_stats", None) or {}
+        timer = timing.current_timer()
+        if timer and stats.get("prompt_eval_duration"): timer.add("llm_prefill", stats["prompt_eval_duration"] / 1e9)
+        if CARRY_LLM_CONTEXT and carry_context: llm_session["context"] = getattr(llm, "last_context", None)
         response = response.split("Assistant Answer")[-1].strip(':').strip()
         return response
-    except Exception as e: logger.error(f"LLM generation failed: {e}", exc_info=True); return "LLM generation error."
+    except (SchedulerRejected, DeadlineExceeded, LLMGenerationError): raise
+    except Exception as e: logger.error(f"LLM generation failed: {e}", exc_info=True); raise LLMGenerationError(f"LLM generation error: {e}") from e
 # --- End Core RAG Functions ---
 
 
@@ -205,45 +408,244 @@ def detect_command_type(query):
     if "generate questions" in query_lower: return "questions"
     return "regular_query"
 
+def keywords_from_index(chat_history, pdf_id_filter, polish=None):
+    """
+    Answer "extract keywords" from the ingest-time keyphrase artifacts (utils.keyphrases)
+
+    Covers the whole document(s) without retrieval; with polish the LLM only tidies the list.
+
+    Returns:
+        dict: Result dict, or None when no artifact exists (the caller falls back to retrieval + LLM)
+    """
+    pdf_ids = list(pdf_id_filter) if isinstance(pdf_id_filter, (list, tuple)) else [pdf_id_filter]
+    with timing.span("keyphrase_lookup"):
+        index = KeyphraseStore(KEYPHRASE_DIR).keyphrases(pdf_ids, limit=KEYWORDS_SHOWN)
+    if not index["keyphrases"]: return None
+    if index["missing"]: logger.warning(f"No keyphrase artifact for {index['missing']}; answering from the others.")
+
+    keywords = ", ".join(phrase for phrase, _ in index["keyphrases"])
+    entities = ", ".join(name for name, _ in index["entities"][:KEYWORDS_SHOWN])
+    answer = f"Keywords: {keywords}"
+    if entities: answer += f"\n\nNamed entities: {entities}"
+    sources = [{"id": i + 1, "page": "all", "document": s["document"], "pdf_id": s["pdf_id"], "score": 1.0} for i, s in enumerate(index["sources"])]
+
+    if polish is None: polish = KEYWORDS_LLM_POLISH
+    if polish:
+        system_instruction = ("Rewrite the keyword and entity lists below as a clean, grouped list. "
+                              "Merge duplicates and near-duplicates and drop fragments. Use ONLY terms that appear in the lists.")
+        try:
+            polished = generate_rag_response("Extract keywords.", answer, chat_history, system_instruction)
+        except LLMGenerationError as e: polished = None; logger.warning(f"Keyword polish failed ({e}); returning the unpolished list.")
+        if polished: answer = polished
+    return {"answer": answer, "sources": sources, "keyword_pages": index["pages"]}
+
+def load_topic_clusters(client, collection_name, pdf_id_filter):
+    """
+    Ingest-time topic clusters (utils.topics) of the selected PDFs, largest first, with the
+    payloads of their representative chunks fetched in one Qdrant call
+
+    Returns:
+        list: Cluster dicts with "pdf_id", "document" and "chunks" (payloads); [] when no artifact exists
+    """
+    pdf_ids = list(pdf_id_filter) if isinstance(pdf_id_filter, (list, tuple)) else [pdf_id_filter]
+    store = TopicStore(TOPIC_DIR)
+    clusters = []
+    for pdf_id in pdf_ids:
+        artifact = store.load(pdf_id)
+        if artifact is None: logger.info(f"No topic artifact for PDF {pdf_id}."); continue
+        clusters += [{**cluster, "pdf_id": pdf_id, "document": artifact.get("source")} for cluster in artifact["clusters"]]
+    if not clusters: return []
+    clusters = sorted(clusters, key=lambda c: -c["size"])[:TOPIC_MAX_CLUSTERS]
+
+    point_ids = {} # Target -> representative point IDs stored there
+    router = routing.router(collection_name)
+    for c in clusters:
+        point_ids.setdefault(router.target(c["pdf_id"]), []).extend(r["point_id"] for r in c["representatives"][:TOPIC_CHUNKS_PER_CLUSTER])
+    with timing.span("topic_fetch"):
+        records = [record for target, ids in point_ids.items()
+                   for record in client.retrieve(collection_name=target.collection, ids=ids, with_payload=PAYLOAD_FIELDS,
+                                                 with_vectors=False, shard_key_selector=target.shard_key)]
+    payloads = {str(r.id): r.payload or {} for r in hydrate_text(records)}
+    for cluster in clusters:
+        cluster["chunks"] = [{**payloads[str(r["point_id"])], "similarity": r["similarity"]}
+                             for r in cluster["representatives"][:TOPIC_CHUNKS_PER_CLUSTER] if str(r["point_id"]) in payloads]
+    return [c for c in clusters if c["chunks"]]
+
+def format_topic_context(clusters, start=1, chunk_chars=TOPIC_CHUNK_CHARS):
+    """Context grouped by topic; each chunk is clipped to chunk_chars so prompt size is predictable."""
+    blocks, sources = [], []
+    n = start
+    for cluster in clusters:
+        terms = f"; key terms: {', '.join(cluster['terms'])}" if cluster.get("terms") else ""
+        block = f"Topic group {cluster['id']} ({cluster['size']} passages from {cluster.get('document') or cluster['pdf_id']}{terms}):\n"
+        for chunk in cluster["chunks"]:
+            text = (chunk.get("text") or "")[:chunk_chars]
+            block += f"Source [{n}] (Page: {chunk.get('page', 'N/A')}, Document: {chunk.get('source', 'Unknown')}):\n{text}\n"
+            sources.append({"id": n, "page": chunk.get("page", "N/A"), "document": chunk.get("source", "Unknown"),
+                            "pdf_id": chunk.get("pdf_id"), "score": chunk.get("similarity", 0.0)})
+            n += 1
+        blocks.append(block.strip())
+    return "\n\n".join(blocks), sources
+
+def topics_from_clusters(client, collection_name, chat_history, pdf_id_filter, command_type):
+    """
+    Answer "list topics" / "explain each topic" from precomputed topic clusters
+
+    "topics" is one prompt over every cluster's representatives; "explain_topics" is one
+    bounded prompt per cluster. Returns None when no topic artifact exists.
+    """
+    clusters = load_topic_clusters(client, collection_name, pdf_id_filter)
+    if not clusters: return None
+    if command_type == "topics":
+        # All topics share one prompt: naming a topic needs only its centroid-nearest chunk, and the
+        # context budget is split evenly across the topics
+        clusters = [{**c, "chunks": c["chunks"][:1]} for c in clusters]
+        chunk_chars = max(100, min(TOPIC_CHUNK_CHARS, MAX_CONTEXT_CHAR_LIMIT // len(clusters) - TOPIC_HEADER_CHARS))
+        context_str, sources = format_topic_context(clusters, chunk_chars=chunk_chars)
+        system_instruction = ("The context is grouped into topic groups of related passages. "
+                              "For each topic group, give a short topic name and one line describing it, ONLY from the context.")
+        return {"answer": generate_rag_response("List topics.", context_str, chat_history, system_instruction), "sources": sources}
+
+    sections, sources = [], []
+    system_instruction = ("The passages below belong to one topic of the document. Name the topic and explain it in "
+                          "2-3 sentences using ONLY these passages, citing the source numbers.")
+    for cluster in clusters:
+        context_str, cluster_sources = format_topic_context([cluster], start=len(sources) + 1)
+        explanation = generate_rag_response("Explain this topic.", context_str, None, system_instruction,
+                                            carry_context=False, max_tokens=TOPIC_EXPLAIN_MAX_TOKENS)
+        pages = ", ".join(str(p) for p in cluster["pages"][:10]) + (" ..." if len(cluster["pages"]) > 10 else "")
+        sections.append(f"Topic {len(sections) + 1} (pages {pages}):\n{explanation}")
+        sources += cluster_sources
+    return {"answer": "\n\n".join(sections), "sources": sources}
+
 def process_command(client, collection_name, query, chat_history, pdf_id_filter, command_type, command_details=None):
     """Handle specific commands."""
     logger.info(f"Processing command: {command_type} for PDF ID: {pdf_id_filter}")
+    if command_type in ("topics", "explain_topics"):
+        result = topics_from_clusters(client, collection_name, chat_history, pdf_id_filter, command_type)
+        if result: return result
+        logger.info("No topic artifact; building topics from retrieved context.")
+    if command_type == "keywords":
+        result = keywords_from_index(chat_history, pdf_id_filter)
+        if result: return result
+        logger.info("No keyphrase artifact; extracting keywords from retrieved context with the LLM.")
     retrieval_query = query; system_instruction = None; limit = 5; query_for_llm = query
     # Define command specifics...
     if command_type == "summary": retrieval_query = "Overall summary"; limit = 15; system_instruction = "Summarize comprehensively..."; query_for_llm = "Summarize."
-    elif command_type == "definition": term=command_details; limit = 7; 
-    elif not term: return {"answer": "Specify term.", "sources":[]}; retrieval_query = f"Define '{term}'"; system_instruction = f"Define '{term}' based ONLY on context..."; query_for_llm = f"Define '{term}'."
+    elif command_type == "definition":
+        term = command_details; limit = 7
+        if not term: return {"answer": "Specify term.", "sources":[]}
+        retrieval_query = f"Define '{term}'"; system_instruction = f"Define '{term}' based ONLY on context..."; query_for_llm = f"Define '{term}'."
     elif command_type == "questions": limit = 10; system_instruction = "Generate 3-5 questions based ONLY on context..."; query_for_llm = "Generate questions."
     elif command_type == "topics": limit = 15; system_instruction = "List main topics ONLY from context..."; query_for_llm = "List topics."
     elif command_type == "explain_topics": limit = 15; system_instruction = "Identify and explain main topics ONLY from context..."; query_for_llm = "Explain topics."
     elif command_type == "keywords": limit = 10; system_instruction = "Extract keywords and named entities ONLY from context..."; query_for_llm = "Extract keywords."
     else: return process_regular_query_command(client, collection_name, query, chat_history, pdf_id_filter)
 
-    retrieved_context = retrieve_context(client, collection_name, retrieval_query, pdf_id_filter, limit=limit)
+    if command_type == "definition":
+        retrieved_context = retrieve_context(client, collection_name, retrieval_query, pdf_id_filter, limit=limit, min_score=MIN_HIT_SCORE)
+        if not is_relevant(retrieved_context): return low_relevance_result(retrieved_context)
+    else: # Document-wide commands: no score floor (generic queries score low), but stop at a cliff
+        retrieved_context = retrieve_context(client, collection_name, retrieval_query, pdf_id_filter, limit=limit, min_hits=min(limit, COMMAND_MIN_HITS))
     context_str, sources = format_context_for_llm(retrieved_context)
-    if not context_str: answer = f"Could not retrieve context for command '{command_type}'."; return {"answer": answer, "sources": []}
+    if not context_str: answer = f"Could not retrieve context for command '{command_type}'."; return {"answer": answer, "sources": [], "no_context": True}
     answer = generate_rag_response(query_for_llm, context_str, chat_history, system_instruction)
     return {"answer": answer, "sources": sources}
 
 def process_regular_query_command(client, collection_name, query, chat_history, pdf_id_filter):
     """Handle regular queries."""
     logger.info(f"Processing regular query for PDF ID {pdf_id_filter}: {query[:50]}...")
-    retrieved_context = retrieve_context(client, collection_name, query, pdf_id_filter, limit=CONTEXT_RETRIEVAL_LIMIT)
+    retrieved_context = retrieve_context(client, collection_name, query, pdf_id_filter, limit=CONTEXT_RETRIEVAL_LIMIT, min_score=MIN_HIT_SCORE)
+    if not is_relevant(retrieved_context): return low_relevance_result(retrieved_context)
     context_str, sources = format_context_for_llm(retrieved_context)
-    answer = generate_rag_response(query, context_str, chat_history, system_prompt=None) # Use default prompt
+    answer = generate_rag_response(query, context_str, chat_history, system_instruction=None) # Use default prompt
     return {"answer": answer, "sources": sources}
+
+def is_relevant(hits):
+    """True when the best hit clears MIN_RELEVANCE_SCORE (hits may be in MMR order, not score order)."""
+    return bool(hits) and max(hit.score for hit in hits) >= MIN_RELEVANCE_SCORE
+
+def low_relevance_result(hits):
+    """Canned answer for questions the documents do not cover; returned without calling the LLM."""
+    top_score = max((hit.score for hit in hits), default=None) # None when every hit was below MIN_HIT_SCORE
+    logger.info(f"No hit reaches MIN_RELEVANCE_SCORE={MIN_RELEVANCE_SCORE} (best kept: {top_score}); skipping generation.")
+    return {"answer": NO_RELEVANT_CONTEXT_ANSWER, "sources": [], "low_relevance": True}
 # --- End Command Processing ---
 
 
 # --- Main Execution ---
+def parse_pdf_ids(args):
+    """--pdf_id plus --pdf_ids (comma-separated or a JSON list), de-duplicated in order."""
+    pdf_ids = [args.pdf_id] if args.pdf_id else []
+    if args.pdf_ids:
+        raw = args.pdf_ids.strip()
+        pdf_ids += json.loads(raw) if raw.startswith("[") else [p.strip() for p in raw.split(",")]
+    return list(dict.fromkeys(str(p) for p in pdf_ids if p))
+
+def run_query(args, chat_history, qdrant_client=None, started=None):
+    """
+    Connect to Qdrant, route the query to its handler and return the result dict.
+
+    qdrant_client reuses an open client instead of connecting; started (time.monotonic()) is
+    when the request arrived, for callers serving many requests in one process (default: process start).
+    """
+    if qdrant_client is None:
+        with timing.span("qdrant_connect"):
+            qdrant_client = connect_qdrant(QDRANT_HOST, QDRANT_PORT)
+    command_info = detect_command_type(args.query)
+    command_name = command_info[0] if isinstance(command_info, tuple) else command_info
+    command_details = command_info[1] if isinstance(command_info, tuple) else None
+    pdf_ids = parse_pdf_ids(args)
+    pdf_id_filter = pdf_ids[0] if len(pdf_ids) == 1 else pdf_ids
+    priority = args.priority or COMMAND_PRIORITIES.get(command_name, "interactive")
+    deadline = (started or PROCESS_STARTED) + (args.deadline_s or DEADLINES_S[priority])
+    logger.info(f"Processing PDF(s) '{pdf_id_filter}' command: {command_name} (priority {priority})")
+
+    # Pass pdf_id(s) to handlers; LLM calls inside inherit the priority and deadline
+    with request_options(priority, deadline), routing.tenant_scope(args.tenant_id):
+        if command_name == "regular_query":
+             return process_regular_query_command(qdrant_client, args.collection_name, args.query, chat_history, pdf_id_filter)
+        return process_command(qdrant_client, args.collection_name, args.query, chat_history, pdf_id_filter, command_name, command_details)
+
+def session_summarizer():
+    return summarize_turns_with_llm if SESSION_SUMMARY_MODE == "llm" else None
+
+
+def is_answer(result):
+    """True for a real answer worth remembering; canned answers are flagged and LLM failures raise instead."""
+    answer = result.get("answer") if isinstance(result, dict) else None
+    return isinstance(answer, str) and bool(answer) and not result.get("low_relevance") and not result.get("no_context")
+
+
 def main():
     """Main entry point for the script."""
+    global PER_DOC_LIMIT, MMR_LAMBDA, PROMPT_LAYOUT, KEYWORDS_LLM_POLISH, MIN_RELEVANCE_SCORE, SCORE_GAP
     parser = argparse.ArgumentParser(description='Process query for RAG (Local Setup)')
     parser.add_argument('query', type=str, help='Query')
     parser.add_argument('--collection_name', type=str, default=DEFAULT_COLLECTION, help='Qdrant collection')
-    parser.add_argument('--pdf_id', required=True, help='PDF ID to filter by')
-    parser.add_argument('--history', type=str, default='[]', help='Chat history JSON')
+    parser.add_argument('--pdf_id', help='PDF ID to filter by')
+    parser.add_argument('--pdf_ids', help='Several PDF IDs to search together (comma-separated or JSON list)')
+    parser.add_argument('--tenant_id', default=None, help='Tenant owning the PDF(s), as given at ingest (routes the search under TENANT_ROUTING)')
+    parser.add_argument('--per_doc_limit', type=int, default=PER_DOC_LIMIT, help='Max chunks from one PDF when searching several (0 = no cap)')
+    parser.add_argument('--mmr_lambda', type=float, default=MMR_LAMBDA, help='Enable MMR selection (1.0 = relevance only, 0.0 = diversity only)')
+    parser.add_argument('--min_score', type=float, default=MIN_RELEVANCE_SCORE, help='Answer without the LLM when no chunk scores at least this')
+    parser.add_argument('--score_gap', type=float, default=SCORE_GAP, help='Stop adding chunks after a score drop larger than this (negative = off)')
+    parser.add_argument('--history', type=str, default='[]', help='Chat history JSON (seeds a new session when --conversation_id is given)')
+    parser.add_argument('--conversation_id', default=None, help='Load history from and record this turn in the session store')
+    parser.add_argument('--profile', nargs='?', const='local_llm.prof', default=None, help='Run under cProfile and dump stats to this file')
+    parser.add_argument('--metrics_file', default=None, help='Write per-stage timings in Prometheus text format to this file')
+    parser.add_argument('--prompt_layout', choices=PROMPT_LAYOUTS, default=PROMPT_LAYOUT, help='Prompt layout (prefix_stable keeps the instruction prefix cacheable)')
+    parser.add_argument('--priority', choices=['interactive', 'bulk'], default=None, help='Scheduling class (default: bulk for document-wide commands)')
+    parser.add_argument('--deadline_s', type=float, default=None, help='Give up (queued or generating) after this many seconds from start')
+    parser.add_argument('--polish_keywords', action='store_true', default=KEYWORDS_LLM_POLISH, help='Have the LLM tidy the precomputed keyword list')
+    parser.add_argument('--fast_log', action='store_true', help='Low-overhead logging: only warnings and errors')
     args = parser.parse_args()
+    if args.fast_log: timing.configure_fast_logging()
+    if not args.pdf_id and not args.pdf_ids: parser.error("--pdf_id or --pdf_ids is required")
+    PER_DOC_LIMIT, MMR_LAMBDA, PROMPT_LAYOUT = args.per_doc_limit, args.mmr_lambda, args.prompt_layout
+    KEYWORDS_LLM_POLISH = args.polish_keywords
+    MIN_RELEVANCE_SCORE = args.min_score
+    SCORE_GAP = args.score_gap if args.score_gap is None or args.score_gap >= 0 else None
 
     if not embedding_model or not llm:
          logger.critical("Models not loaded.")
@@ -258,20 +660,45 @@ def main():
         logger.error(f"Invalid chat history format: {e}")
         chat_history = [] # Default to empty on error
 
+    session_store = None
+    if args.conversation_id:
+        try:
+            session_store = SessionStore(SESSION_DB_PATH, summary_max_words=SESSION_SUMMARY_MAX_WORDS)
+            if chat_history: session_store.seed(args.conversation_id, chat_history, session_summarizer())
+            chat_history = format_history_block(session_store.load(args.conversation_id))
+            if CARRY_LLM_CONTEXT: llm_session["context"] = session_store.get_llm_context(args.conversation_id)
+        except Exception as e:
+            logger.error(f"Session store unavailable ({e}); continuing with the supplied history.", exc_info=True)
+            session_store = None
+
     result = {}
     try:
-        qdrant_client = connect_qdrant(QDRANT_HOST, QDRANT_PORT)
-        command_info = detect_command_type(args.query)
-        command_name = command_info[0] if isinstance(command_info, tuple) else command_info
-        command_details = command_info[1] if isinstance(command_info, tuple) else None
-        logger.info(f"Processing PDF '{args.pdf_id}' command: {command_name}")
-
-        # Pass pdf_id to handlers
-        if command_name == "regular_query":
-             result = process_regular_query_command(qdrant_client, args.collection_name, args.query, chat_history, args.pdf_id)
-        else:
-             result = process_command(qdrant_client, args.collection_name, args.query, chat_history, args.pdf_id, command_name, command_details)
-
+        with timing.collect() as timer:
+            for stage, seconds in startup_timer.totals.items(): timer.add(stage, seconds)
+            if args.profile:
+                result = timing.run_profiled(args.profile, run_query, args, chat_history)
+            else:
+                result = run_query(args, chat_history)
+            if session_store and is_answer(result):
+                try:
+                    with timing.span("session_update"):
+                        session_store.append_turn(args.conversation_id, args.query, result["answer"], session_summarizer())
+                        if CARRY_LLM_CONTEXT: session_store.set_llm_context(args.conversation_id, llm_session["context"])
+                except Exception as e:
+                    logger.error(f"Could not record turn for conversation {args.conversation_id}: {e}")
+            result["timings"] = timer.as_dict()
+        if args.metrics_file:
+            try: timer.write_prometheus(args.metrics_file, "query", {"collection": args.collection_name})
+            except OSError as e: logger.error(f"Could not write metrics file {args.metrics_file}: {e}")
+
+    except SchedulerRejected as e:
+        logger.warning(f"Rejected: {e}")
+        print(json.dumps({"answer": f"Error: Server busy, please retry shortly. ({e})", "sources": [], "error_code": "overloaded"}))
+        sys.exit(EXIT_TEMPFAIL)
+    except DeadlineExceeded as e:
+        logger.warning(f"Deadline exceeded: {e}")
+        print(json.dumps({"answer": f"Error: The request took too long and was cancelled. ({e})", "sources": [], "error_code": "deadline_exceeded"}))
+        sys.exit(EXIT_TEMPFAIL)
     except (ConnectionError, RuntimeError) as e:
          logger.error(f"Execution Error: {e}", exc_info=True)
          result = {"answer": f"Error: {e}", "sources": []}
@@ -0,0 +1,294 @@
+# FILE: python/reduce_vectors.py
+# Fits, reports on and removes the PCA projections of embeddings.projection.
+#
+#   python reduce_vectors.py fit --dimension 128 [--sample_size 20000] [--min_recall 0.95]
+#   python reduce_vectors.py report [--k 10] [--queries_file questions.txt]
+#   python reduce_vectors.py status
+#   python reduce_vectors.py drop
+#
+# fit samples the collection's full vectors, fits the projection and saves it as the next artifact
+# version, adds the reduced vector to every physical collection and fills it in for the existing
+# points (ingestion writes it for new ones from then on). It then measures recall@k of the reduced
+# search, with and without full-precision rescoring, against exact search on the full vectors.
+# Queries switch to the reduced vector only when the recall clears --min_recall; the full vector is
+# then moved to disk without an HNSW index, since it is only read to rescore candidates. A refit
+# replaces the previous version the same way, which stays in use until the new one is ready.
+# drop restores the index on the full vector and removes the reduced vectors.
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from embeddings.projection import PcaProjection, ProjectionStore, reduced_vector_name, searched_projection
+from embeddings.registry import ModelRegistry, using, vector_of
+from reembed import lacking, shard_keys
+from utils import routing
+from utils.qdrant_utils import ensure_collection, physical_collections, set_rescore_only
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+DEFAULT_COLLECTION = "documents"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+PROJECTION_DIR = os.getenv("PROJECTION_DIR", os.path.join(RAG_DATA_DIR, "projections"))
+DEFAULT_DIMENSION = 128
+FIT_SAMPLE_SIZE = 20000      # Full vectors the PCA is fitted on
+BACKFILL_BATCH_SIZE = 256    # Points projected and written per update request
+REPORT_QUERIES = 200         # Stored vectors used as queries when no queries file is given
+REPORT_K = 10
+RESCORE_MULTIPLIER = int(os.getenv("RESCORE_MULTIPLIER", 4)) # Same setting as local_llm: candidates per result that get rescored
+REPORT_MULTIPLIERS = tuple(sorted({1, 2, 4, 8, RESCORE_MULTIPLIER}))
+DEFAULT_MIN_RECALL = 0.95    # Rescored recall@k at RESCORE_MULTIPLIER required before queries use the projection
+# --- End Configuration ---
+
+
+def _vectors_kwarg(vector_name):
+    return [vector_name] if vector_name else True
+
+
+def _target_vector(registry, collection_name, vector_name=None):
+    """(vector_name, spec) of the given or active vector of a registered collection."""
+    entry = registry.entry(collection_name)
+    if not entry: raise ValueError(f"Collection '{collection_name}' is not in the model registry; ingest into it first")
+    vector_name = entry["active"] if vector_name is None else vector_name
+    if vector_name not in entry["vectors"]: raise ValueError(f"Collection '{collection_name}' has no vector '{vector_name}'")
+    return vector_name, entry["vectors"][vector_name]
+
+
+def sample_vectors(client, names, vector_name, sample_size):
+    """
+    Up to sample_size full vectors, spread evenly over the physical collections
+
+    Point IDs are UUIDs derived from content, so scrolling in ID order is close to a random sample.
+
+    Returns:
+        tuple: (point ids, float32 (n, dim) matrix)
+    """
+    ids, rows = [], []
+    per_collection = math.ceil(sample_size / max(1, len(names)))
+    for name in names:
+        offset, taken = None, 0
+        while taken < per_collection:
+            records, offset = client.scroll(collection_name=name, limit=min(1000, per_collection - taken), offset=offset,
+                                            with_payload=False, with_vectors=_vectors_kwarg(vector_name))
+            for record in records:
+                vector = vector_of(record, vector_name)
+                if vector is None: continue
+                ids.append(record.id); rows.append(vector)
+            taken += len(records)
+            if offset is None or not records: break
+    return ids, (np.asarray(rows, dtype=np.float32) if rows else np.zeros((0, 0), dtype=np.float32))
+
+
+def backfill_projection(client, names, router, vector_name, reduced_name, projection, batch_size=BACKFILL_BATCH_SIZE):
+    """Write the reduced vector of every point that lacks it; returns the number of points written."""
+    written = 0
+    for name in names:
+        for shard_key in shard_keys(client, name, router):
+            offset = None
+            while True:
+                records, offset = client.scroll(collection_name=name, scroll_filter=lacking(reduced_name), limit=batch_size, offset=offset,
+                                                with_payload=False, with_vectors=_vectors_kwarg(vector_name), shard_key_selector=shard_key)
+                records = [r for r in records if vector_of(r, vector_name) is not None]
+                if records:
+                    reduced = projection.transform(np.asarray([vector_of(r, vector_name) for r in records], dtype=np.float32))
+                    client.update_vectors(collection_name=name, wait=True, shard_key_selector=shard_key,
+                                          points=[models.PointVectors(id=r.id, vector={reduced_name: reduced[i].tolist()})
+                                                  for i, r in enumerate(records)])
+                    written += len(records)
+                if offset is None: break
+    return written
+
+
+def recall_report(client, names, vector_name, reduced_name, projection, queries, k=REPORT_K, multipliers=REPORT_MULTIPLIERS, exclude=None):
+    """
+    recall@k of the reduced vector against exact search on the full vectors
+
+    Args:
+        queries (np.ndarray): float32 (n, full_dim) query vectors
+        exclude (list, optional): Per query, a point id to leave out of every result list (the point a stored query vector came from)
+
+    Returns:
+        dict: {"queries", "k", "reduced_only", "rescored": {multiplier: recall}, "search_ms": {...}}
+    """
+    reduced_queries = projection.transform(queries)
+    recalls = {"reduced_only": []}
+    recalls.update({m: [] for m in multipliers})
+    timings = {key: 0.0 for key in recalls}
+    limit = k + (1 if exclude else 0)
+
+    def top(key, name, **kwargs):
+        started = time.perf_counter()
+        points = client.query_points(collection_name=name, limit=limit, with_payload=False, **kwargs).points
+        if key is not None: timings[key] += time.perf_counter() - started
+        return [(p.score, p.id) for p in points]
+
+    for i, (query, reduced_query) in enumerate(zip(queries, reduced_queries)):
+        skip = exclude[i] if exclude else None
+
+        def ids(hits):
+            return [point_id for _, point_id in sorted(hits, key=lambda hit: -hit[0]) if point_id != skip][:k]
+
+        exact = ids(sum((top(None, name, query=query.tolist(), using=using(vector_name), search_params=models.SearchParams(exact=True))
+                         for name in names), []))
+        if not exact: continue
+        found = ids(sum((top("reduced_only", name, query=reduced_query.tolist(), using=reduced_name) for name in names), []))
+        recalls["reduced_only"].append(len(set(found) & set(exact)) / len(exact))
+        for m in multipliers:
+            rescored = ids(sum((top(m, name, prefetch=models.Prefetch(query=reduced_query.tolist(), using=reduced_name, limit=limit * m),
+                                    query=query.tolist(), using=using(vector_name)) for name in names), []))
+            recalls[m].append(len(set(rescored) & set(exact)) / len(exact))
+    measured = len(recalls["reduced_only"])
+
+    def mean(values):
+        return round(float(np.mean(values)), 4) if values else None
+    return {"queries": measured, "k": k, "dimension": projection.dimension, "source_dimension": projection.source_dimension,
+            "explained_variance": projection.meta.get("explained_variance"),
+            "reduced_only": mean(recalls["reduced_only"]), "rescored": {str(m): mean(recalls[m]) for m in multipliers},
+            "search_ms": {str(key): round(1000 * timings[key] / max(1, measured), 3) for key in timings}}
+
+
+def _report_queries(client, names, vector_name, spec, count, queries_file=None):
+    """(query matrix, ids to exclude or None): embedded questions from queries_file, else stored vectors."""
+    if queries_file:
+        from embeddings.embed_factory import get_embedder
+        with open(queries_file, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:count]
+        embedder = get_embedder(spec["model"], backend=EMBEDDING_BACKEND)
+        return np.asarray([embedder.get_embedding(text, "text") for text in texts], dtype=np.float32), None
+    ids, vectors = sample_vectors(client, names, vector_name, count)
+    return vectors, ids
+
+
+def fit(collection_name, dimension=DEFAULT_DIMENSION, sample_size=FIT_SAMPLE_SIZE, vector_name=None, client=None, rescore_only=True,
+        min_recall=DEFAULT_MIN_RECALL, report_queries=REPORT_QUERIES, queries_file=None, k=REPORT_K):
+    """
+    Fit a projection of a collection's vector, backfill the reduced vector and enable it if recall allows
+
+    Returns:
+        dict: {"success", "vector", "version", "state", "report", ...} or {"success": False, "error"}
+    """
+    registry = ModelRegistry()
+    store = ProjectionStore(PROJECTION_DIR)
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        vector_name, spec = _target_vector(registry, collection_name, vector_name)
+        router = routing.router(collection_name)
+        names = physical_collections(client, router)
+        _, sample = sample_vectors(client, names, vector_name, sample_size)
+        logger.info(f"Fitting a {dimension}-d projection of '{collection_name}'/'{vector_name or '(unnamed)'}' on {len(sample)} vectors")
+        projection = PcaProjection.fit(sample, dimension, model=spec["model"])
+        version = store.save(collection_name, vector_name, projection)
+        reduced_name = reduced_vector_name(vector_name, dimension, version)
+
+        for name in names: ensure_collection(client, name, {reduced_name: dimension})
+        # Registered first so documents ingested during the backfill get the reduced vector too
+        abandoned = registry.set_projection(collection_name, vector_name, {"vector": reduced_name, "version": version, "dimension": dimension,
+                                                                           "state": "backfilling", "rescore_only": rescore_only,
+                                                                           "explained_variance": projection.meta["explained_variance"]})
+        for name in names: # An earlier fit that never became ready
+            for stale in abandoned: client.delete_vector_name(collection_name=name, vector_name=stale["vector"])
+        started = time.perf_counter()
+        written = backfill_projection(client, names, router, vector_name, reduced_name, projection)
+        logger.info(f"Wrote {written} reduced vectors in {time.perf_counter() - started:.1f}s")
+
+        queries, exclude = _report_queries(client, names, vector_name, spec, report_queries, queries_file)
+        report = recall_report(client, names, vector_name, reduced_name, projection, queries, k, exclude=exclude)
+        recall = report["rescored"].get(str(RESCORE_MULTIPLIER))
+        if min_recall and (recall is None or recall < min_recall):
+            registry.update_projection(collection_name, vector_name, report=report)
+            return {"success": False, "vector": reduced_name, "version": version, "state": "backfilling", "report": report,
+                    "error": f"Rescored recall@{k} {recall} is below {min_recall}; queries keep the current vectors (refit with a larger dimension)"}
+
+        previous = registry.update_projection(collection_name, vector_name, state="ready", report=report)
+        if rescore_only:
+            for name in names: set_rescore_only(client, name, [vector_name])
+        if previous:
+            for name in names: client.delete_vector_name(collection_name=name, vector_name=previous["vector"])
+        return {"success": True, "vector": reduced_name, "version": version, "state": "ready", "points": written, "report": report,
+                "replaced": previous["vector"] if previous else None}
+    except Exception as e:
+        logger.error(f"Projection fit for '{collection_name}' failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def report(collection_name, vector_name=None, client=None, report_queries=REPORT_QUERIES, queries_file=None, k=REPORT_K):
+    """Recall report of the projection queries currently search."""
+    registry = ModelRegistry()
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        vector_name, spec = _target_vector(registry, collection_name, vector_name)
+        projection_spec = searched_projection(spec) or spec.get("projection")
+        if not projection_spec: return {"success": False, "error": f"Vector '{vector_name}' has no projection; run fit first"}
+        projection = ProjectionStore(PROJECTION_DIR).load(collection_name, vector_name, projection_spec["version"])
+        names = physical_collections(client, routing.router(collection_name))
+        queries, exclude = _report_queries(client, names, vector_name, spec, report_queries, queries_file)
+        result = recall_report(client, names, vector_name, projection_spec["vector"], projection, queries, k, exclude=exclude)
+        return {"success": True, "vector": projection_spec["vector"], "state": projection_spec["state"], "report": result}
+    except Exception as e:
+        logger.error(f"Recall report for '{collection_name}' failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def drop(collection_name, vector_name=None, client=None):
+    """Search the full vector again (re-indexed in memory) and delete every reduced vector of it; artifacts are kept."""
+    registry = ModelRegistry()
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        vector_name, _ = _target_vector(registry, collection_name, vector_name)
+        detached = registry.set_projection(collection_name, vector_name, None) # Queries and ingestion stop using them first
+        names = physical_collections(client, routing.router(collection_name))
+        for name in names:
+            if any(p.get("rescore_only") for p in detached): set_rescore_only(client, name, [vector_name], rescore_only=False)
+            for projection in detached:
+                try: client.delete_vector_name(collection_name=name, vector_name=projection["vector"])
+                except Exception as e: logger.warning(f"Could not delete vector '{projection['vector']}' of '{name}': {e}")
+        return {"success": True, "dropped": [p["vector"] for p in detached], "collections": names}
+    except Exception as e:
+        logger.error(f"Could not drop the projection of '{collection_name}': {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reduced (PCA-projected) vectors searched before full-precision rescoring")
+    parser.add_argument("action", choices=["fit", "report", "status", "drop"], help="Action to perform")
+    parser.add_argument("--collection_name", default=DEFAULT_COLLECTION, help=f"Logical collection (default: {DEFAULT_COLLECTION})")
+    parser.add_argument("--vector", default=None, help="Vector to project (default: the active vector)")
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION, help="Reduced dimension (fit)")
+    parser.add_argument("--sample_size", type=int, default=FIT_SAMPLE_SIZE, help="Vectors sampled to fit the projection (fit)")
+    parser.add_argument("--keep_full_index", action="store_true", help="Leave the full vector indexed in memory (fit)")
+    parser.add_argument("--min_recall", type=float, default=DEFAULT_MIN_RECALL, help="Rescored recall@k needed to enable the projection (fit; 0 = always)")
+    parser.add_argument("--queries", type=int, default=REPORT_QUERIES, help="Queries measured by the recall report")
+    parser.add_argument("--queries_file", help="Questions (one per line) to measure recall with instead of stored vectors")
+    parser.add_argument("--k", type=int, default=REPORT_K, help="Recall cutoff")
+    args = parser.parse_args()
+
+    if args.action == "status":
+        entry = ModelRegistry().entry(args.collection_name) or {}
+        result = {"success": True, "collection": args.collection_name,
+                  "projections": {name: {key: spec[key] for key in ("projection", "previous_projection") if key in spec}
+                                  for name, spec in entry.get("vectors", {}).items()}}
+    elif args.action == "fit":
+        result = fit(args.collection_name, args.dimension, args.sample_size, args.vector, rescore_only=not args.keep_full_index,
+                     min_recall=args.min_recall, report_queries=args.queries, queries_file=args.queries_file, k=args.k)
+    elif args.action == "report":
+        result = report(args.collection_name, args.vector, report_queries=args.queries, queries_file=args.queries_file, k=args.k)
+    else:
+        result = drop(args.collection_name, args.vector)
+    print(json.dumps(result, indent=2))
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
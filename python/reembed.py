@@ -0,0 +1,277 @@
+# FILE: python/reembed.py
+# Background re-embedding of a collection with a new embedding model. The new model gets its own
+# Qdrant named vector next to the current one, so queries keep using the current vector (and
+# model) until an explicit cutover; nothing is deleted or recreated on the way.
+#
+#   python reembed.py start  --model BAAI/bge-small-en-v1.5 [--detach]   # add the vector, then backfill
+#   python reembed.py status                                             # progress of every vector
+#   python reembed.py run    --vector baai_bge-small-en-v1_5             # resume an interrupted backfill
+#   python reembed.py cutover --vector baai_bge-small-en-v1_5            # queries switch to the new model
+#   python reembed.py drop   --vector all-minilm-l6-v2                   # free the old vector after a cutover
+#
+# From 'start' on, ingestion writes the new vector for new documents as well (embeddings.registry),
+# so the backfill only has to cover the points that existed before. It scrolls the points that lack
+# the vector, re-embeds their text (from the sidecar store) or image file, and writes just that
+# vector with update_vectors, at a bounded rate and lowered CPU priority to leave room for queries.
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from embeddings.embed_factory import get_embedder
+from embeddings.registry import ModelRegistry, vector_name_for
+from embeddings.vectors import EmbeddingError, PartialEmbeddingError, as_matrix, as_vector
+from utils import routing
+from utils.qdrant_utils import collection_vectors, ensure_collection, physical_collections
+from utils.text_store import TextStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+DEFAULT_COLLECTION = "documents"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", os.path.join(RAG_DATA_DIR, "text_store"))
+REEMBED_LOG_DIR = os.getenv("REEMBED_LOG_DIR", os.path.join(RAG_DATA_DIR, "reembed"))
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", 64))        # Points embedded and written per request
+REEMBED_POINTS_PER_S = float(os.getenv("REEMBED_POINTS_PER_S", 50))  # Backfill rate cap (0 = unthrottled)
+REEMBED_NICE = int(os.getenv("REEMBED_NICE", 10))                    # CPU niceness of the backfill process
+# --- End Configuration ---
+
+
+def shard_keys(client, collection_name, router):
+    """Shard keys to visit one by one (shard_key routing), or [None] for a plain collection."""
+    if router.mode != "shard_key": return [None]
+    info = client.collection_cluster_info(collection_name)
+    keys = {shard.shard_key for shard in list(info.local_shards) + list(info.remote_shards) if shard.shard_key is not None}
+    return sorted(keys, key=str) or [None]
+
+
+def lacking(vector_name):
+    """Filter of the points that do not have vector_name yet."""
+    return models.Filter(must_not=[models.HasVectorCondition(has_vector=vector_name)])
+
+
+def start(collection_name, model_name, client=None, embedder=None):
+    """
+    Add a named vector for model_name to every physical collection and register it as 'backfilling'
+
+    The vector's size is detected from the model. Ingestion starts writing it right away; queries
+    keep using the active vector.
+
+    Returns:
+        dict: {"success", "vector", "dimension", "collections"} or {"success": False, "error"}
+    """
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        registry = ModelRegistry()
+        written = collection_vectors(client, collection_name)
+        vector_name = vector_name_for(model_name)
+        if vector_name in written and written[vector_name]["model"] == model_name and written[vector_name]["state"] != "backfilling":
+            return {"success": True, "vector": vector_name, "state": written[vector_name]["state"], "note": "vector already complete"}
+        dimension = registry.dimension(model_name, embedder)
+        names = physical_collections(client, routing.router(collection_name))
+        for name in names: # Created in Qdrant before ingestion is told to write it
+            ensure_collection(client, name, {vector_name: dimension})
+        registry.add_vector(collection_name, model_name, dimension)
+        logger.info(f"Vector '{vector_name}' ({model_name}, {dimension}-d) added to {len(names)} collection(s) of '{collection_name}'")
+        return {"success": True, "vector": vector_name, "dimension": dimension, "collections": names}
+    except Exception as e:
+        logger.error(f"Could not start re-embedding '{collection_name}' with {model_name}: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def embed_records(embedder, records, text_store):
+    """
+    New vectors for scrolled records: texts in one batch, images from their files
+
+    Returns:
+        tuple: ([point_id, ...], float32 matrix) of the records that could be embedded
+    """
+    from PIL import Image
+    ids, rows, texts, text_ids = [], [], [], []
+    for record in text_store.hydrate([r for r in records if (r.payload or {}).get("type") != "image"]):
+        text = record.payload.get("text")
+        if isinstance(text, str) and text.strip():
+            texts.append(text); text_ids.append(record.id)
+    for record in records:
+        payload = record.payload or {}
+        if payload.get("type") != "image": continue
+        try:
+            with Image.open(payload["image_path"]) as image:
+                rows.append(as_vector(embedder.get_embedding(image.convert("RGB"), "image")))
+            ids.append(record.id)
+        except (OSError, KeyError, EmbeddingError) as e:
+            logger.warning(f"Cannot re-embed image point {record.id}: {e}")
+    if texts:
+        try:
+            vectors, ok = as_matrix(embedder.get_embeddings(texts)), None
+        except PartialEmbeddingError as e:
+            vectors, ok = e.vectors, e.ok
+        for i, point_id in enumerate(text_ids):
+            if ok is None or ok[i]: ids.append(point_id); rows.append(vectors[i])
+    return ids, (as_matrix(rows) if rows else None)
+
+
+def backfill(collection_name, vector_name, client=None, embedder=None, batch_size=REEMBED_BATCH_SIZE, points_per_s=REEMBED_POINTS_PER_S,
+             max_points=None):
+    """
+    Fill vector_name in for every point that lacks it; safe to interrupt and rerun
+
+    Each batch is embedded and written with update_vectors (only that vector changes), and the
+    loop sleeps as needed to stay under points_per_s. Progress is recorded in the registry; the
+    vector becomes 'ready' (eligible for cutover) once no point lacks it.
+
+    Returns:
+        dict: {"success", "done", "failed", "remaining", "state"} or {"success": False, "error"}
+    """
+    registry = ModelRegistry()
+    owned = None
+    try:
+        spec = (registry.entry(collection_name) or {}).get("vectors", {}).get(vector_name)
+        if not spec: return {"success": False, "error": f"Collection '{collection_name}' has no vector '{vector_name}'; run start first"}
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        if embedder is None: embedder = owned = get_embedder(spec["model"], backend=EMBEDDING_BACKEND)
+        router = routing.router(collection_name)
+        text_store = TextStore(TEXT_STORE_DIR)
+        done = failed = 0
+        started = time.monotonic()
+        for name in physical_collections(client, router):
+            for shard_key in shard_keys(client, name, router):
+                offset = None
+                while max_points is None or done + failed < max_points:
+                    records, offset = client.scroll(collection_name=name, scroll_filter=lacking(vector_name), limit=batch_size, offset=offset,
+                                                    with_payload=True, with_vectors=False, shard_key_selector=shard_key)
+                    if not records: break
+                    ids, vectors = embed_records(embedder, records, text_store)
+                    if ids:
+                        client.update_vectors(collection_name=name, wait=True, shard_key_selector=shard_key,
+                                              points=[models.PointVectors(id=point_id, vector={vector_name: vectors[i].tolist()})
+                                                      for i, point_id in enumerate(ids)])
+                    done += len(ids)
+                    failed += len(records) - len(ids)
+                    registry.update_vector(collection_name, vector_name, done=spec.get("done", 0) + done, failed=failed)
+                    if points_per_s > 0: # Hold the average rate at points_per_s
+                        time.sleep(max(0.0, (done + failed) / points_per_s - (time.monotonic() - started)))
+                    if offset is None: break
+        remaining = sum(client.count(collection_name=name, count_filter=lacking(vector_name), exact=True).count
+                        for name in physical_collections(client, router))
+        state = "ready" if remaining == 0 else "backfilling"
+        registry.update_vector(collection_name, vector_name, state=state, remaining=remaining)
+        logger.info(f"Backfill of '{vector_name}' in '{collection_name}': {done} points written, {failed} failed, {remaining} remaining ({state})")
+        return {"success": True, "done": done, "failed": failed, "remaining": remaining, "state": state}
+    except Exception as e:
+        logger.error(f"Backfill of '{vector_name}' in '{collection_name}' failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+    finally:
+        if hasattr(owned, "close"): owned.close()
+
+
+def cutover(collection_name, vector_name, force=False):
+    """Switch queries to vector_name; force accepts a vector whose backfill left points without it."""
+    registry = ModelRegistry()
+    try:
+        spec = (registry.entry(collection_name) or {}).get("vectors", {}).get(vector_name)
+        if force and spec and spec["state"] == "backfilling": registry.update_vector(collection_name, vector_name, state="ready")
+        previous = registry.cutover(collection_name, vector_name)
+        logger.info(f"Queries of '{collection_name}' now use vector '{vector_name}' (was '{previous}', kept as standby)")
+        return {"success": True, "active": vector_name, "previous": previous}
+    except (KeyError, ValueError) as e:
+        return {"success": False, "error": str(e)}
+
+
+def drop(collection_name, vector_name, client=None):
+    """Delete a non-active vector from every physical collection and from the registry."""
+    registry = ModelRegistry()
+    try:
+        if registry.active(collection_name)[0] == vector_name: raise ValueError(f"Vector '{vector_name}' is active; cut over first")
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        registry.remove_vector(collection_name, vector_name) # Ingestion stops writing it before it disappears
+        names = physical_collections(client, routing.router(collection_name))
+        for name in names: client.delete_vector_name(collection_name=name, vector_name=vector_name)
+        return {"success": True, "dropped": vector_name, "collections": names}
+    except Exception as e:
+        logger.error(f"Could not drop vector '{vector_name}' of '{collection_name}': {e}")
+        return {"success": False, "error": str(e)}
+
+
+def status(collection_name):
+    entry = ModelRegistry().entry(collection_name)
+    if not entry: return {"success": True, "collection": collection_name, "registered": False}
+    return {"success": True, "collection": collection_name, **entry}
+
+
+def detach(argv, collection_name, vector_name):
+    """Rerun this script with argv in a new session, logging to REEMBED_LOG_DIR; returns the child's pid and log path."""
+    os.makedirs(REEMBED_LOG_DIR, exist_ok=True)
+    log_path = os.path.join(REEMBED_LOG_DIR, f"{collection_name}.{vector_name}.log")
+    with open(log_path, "a") as log_file:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv, stdout=log_file, stderr=subprocess.STDOUT,
+                                   stdin=subprocess.DEVNULL, start_new_session=True)
+    return {"pid": process.pid, "log": log_path}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed a collection into a new named vector, then cut queries over to it")
+    parser.add_argument("action", choices=["start", "run", "status", "cutover", "drop"], help="Action to perform")
+    parser.add_argument("--collection_name", default=DEFAULT_COLLECTION, help=f"Logical collection (default: {DEFAULT_COLLECTION})")
+    parser.add_argument("--model", help="Embedding model to add (start)")
+    parser.add_argument("--vector", help="Vector name (run, cutover, drop; default for run: the vector being backfilled)")
+    parser.add_argument("--detach", action="store_true", help="Run the backfill in the background (start, run)")
+    parser.add_argument("--no_backfill", action="store_true", help="Only add the vector; backfill later with run (start)")
+    parser.add_argument("--batch_size", type=int, default=REEMBED_BATCH_SIZE, help="Points per embedding batch and update request")
+    parser.add_argument("--points_per_s", type=float, default=REEMBED_POINTS_PER_S, help="Backfill rate cap (0 = unthrottled)")
+    parser.add_argument("--max_points", type=int, default=None, help="Stop after this many points (run again to continue)")
+    parser.add_argument("--force", action="store_true", help="Cut over even if some points could not be re-embedded (cutover)")
+    args = parser.parse_args()
+
+    if args.action == "status":
+        print(json.dumps(status(args.collection_name), indent=2))
+        return 0
+    if args.action == "cutover":
+        if not args.vector: parser.error("--vector is required for cutover")
+        result = cutover(args.collection_name, args.vector, force=args.force)
+        print(json.dumps(result))
+        return 0 if result["success"] else 1
+    if args.action == "drop":
+        if not args.vector: parser.error("--vector is required for drop")
+        result = drop(args.collection_name, args.vector)
+        print(json.dumps(result))
+        return 0 if result["success"] else 1
+
+    vector_name = args.vector
+    if args.action == "start":
+        if not args.model: parser.error("--model is required for start")
+        result = start(args.collection_name, args.model)
+        if not result["success"] or args.no_backfill or result.get("note"):
+            print(json.dumps(result))
+            return 0 if result["success"] else 1
+        vector_name = result["vector"]
+    if not vector_name: # run: the vector currently being backfilled
+        vectors = (ModelRegistry().entry(args.collection_name) or {}).get("vectors", {})
+        vector_name = next((name for name, spec in vectors.items() if spec["state"] == "backfilling"), None)
+        if vector_name is None: parser.error("no vector is being backfilled; pass --vector")
+    if args.detach:
+        argv = ["run", "--collection_name", args.collection_name, "--vector", vector_name, "--batch_size", str(args.batch_size),
+                "--points_per_s", str(args.points_per_s)] + (["--max_points", str(args.max_points)] if args.max_points else [])
+        print(json.dumps({"success": True, "vector": vector_name, "detached": detach(argv, args.collection_name, vector_name)}))
+        return 0
+    if REEMBED_NICE:
+        try: os.nice(REEMBED_NICE)
+        except OSError as e: logger.warning(f"Could not lower CPU priority: {e}")
+    result = backfill(args.collection_name, vector_name, batch_size=args.batch_size, points_per_s=args.points_per_s, max_points=args.max_points)
+    print(json.dumps(result))
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# FILE: python/utils/checkpoints.py
+# Per-pdf_id ingestion checkpoints so a failed process_pdf run can resume from the last
+# committed page segment instead of page one.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+FINGERPRINT_CHUNK_BYTES = 1 << 20
+# --- End Configuration ---
+
+
+def pdf_fingerprint(pdf_path):
+    """Size plus content hash, so a checkpoint is never applied to a different file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(FINGERPRINT_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return f"{os.path.getsize(pdf_path)}:{digest.hexdigest()}"
+
+
+class CheckpointStore:
+    """JSON checkpoint files, one per (collection, pdf_id), written atomically."""
+
+    def __init__(self, checkpoint_dir):
+        self.dir = checkpoint_dir
+
+    def _path(self, collection_name, pdf_id):
+        safe = re.sub(r'[^\w\-_\.]', '_', f"{collection_name}__{pdf_id}")
+        return os.path.join(self.dir, f"{safe}.json")
+
+    def load(self, collection_name, pdf_id, fingerprint, segment_pages):
+        """
+        Return the checkpoint for pdf_id if it matches this file and segment size, else None
+
+        Returns:
+            dict: {"next_page": int, "embeddings_count": int, ...} or None
+        """
+        path = self._path(collection_name, pdf_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return None
+        if checkpoint.get("fingerprint") != fingerprint:
+            logger.warning(f"Checkpoint for PDF {pdf_id} was taken from a different file; starting over.")
+            return None
+        if checkpoint.get("segment_pages") != segment_pages:
+            logger.warning(f"Checkpoint for PDF {pdf_id} used {checkpoint.get('segment_pages')}-page segments; starting over.")
+            return None
+        return checkpoint
+
+    def save(self, collection_name, pdf_id, fingerprint, segment_pages, next_page, embeddings_count, page_count, text_store_size=None):
+        """Record that every page before next_page has been committed to Qdrant (and how long the text shard was then)."""
+        os.makedirs(self.dir, exist_ok=True)
+        path = self._path(collection_name, pdf_id)
+        checkpoint = {
+            "pdf_id": pdf_id,
+            "collection": collection_name,
+            "fingerprint": fingerprint,
+            "segment_pages": segment_pages,
+            "next_page": next_page,
+            "page_count": page_count,
+            "embeddings_count": embeddings_count,
+            "text_store_size": text_store_size,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def clear(self, collection_name, pdf_id):
+        try:
+            os.remove(self._path(collection_name, pdf_id))
+        except FileNotFoundError:
+            pass
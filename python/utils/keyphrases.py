@@ -0,0 +1,264 @@
+# FILE: python/utils/keyphrases.py
+# Lexical statistics computed at ingest time: TF-IDF keyphrases per page and per document plus
+# capitalised named-entity candidates, stored as one small gzip'd JSON artifact per pdf_id. The
+# "extract keywords" command answers from these artifacts without retrieving or generating.
+#
+# Document-level scores are corpus-aware: a shared document-frequency table over every ingested
+# pdf_id is kept next to the artifacts, and keyphrases are re-ranked against it at query time,
+# so terms that appear in every document of the library sink even if they were ingested first.
+
+import fcntl
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+ARTIFACT_VERSION = 1
+MAX_NGRAM = 3
+CANDIDATE_TERMS = 300     # Term counts kept per document for corpus re-ranking
+DOCUMENT_KEYPHRASES = 25
+PAGE_KEYPHRASES = 8
+MAX_ENTITIES = 25
+MIN_TERM_CHARS = 3
+CORPUS_FILE = "_corpus_df.json"
+CORPUS_LOCK = "_corpus.lock"
+# --- End Configuration ---
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each either etc few for from further had has have having he her here
+hers herself him himself his how however i if in into is it its itself just may me might more most must my myself
+no nor not now of off on once only or other our ours ourselves out over own per same shall she should so some such
+than that the their theirs them themselves then there these they this those through thus to too under until up upon
+us use used using very via was we were what when where which while who whom why will with within without would yet
+you your yours yourself yourselves one two three first second also page figure table et al e g i e
+""".split())
+
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9\-']*[A-Za-z0-9]|[A-Za-z]")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+ENTITY_RE = re.compile(r"\b(?:[A-Z][a-z]+|[A-Z]{2,})(?:[ \-](?:of |for |and |the )?(?:[A-Z][a-z]+|[A-Z]{2,}))*\b")
+
+
+def _safe_name(pdf_id):
+    return re.sub(r'[^\w\-_\.]', '_', str(pdf_id))
+
+
+def candidate_terms(text):
+    """
+    Count unigram to MAX_NGRAM-gram candidates in text
+
+    Phrases never cross sentence boundaries and never start or end with a stopword;
+    tokens are lower-cased and numbers-only tokens are dropped.
+    """
+    counts = Counter()
+    for sentence in SENTENCE_RE.split(text):
+        tokens = [t.lower() for t in WORD_RE.findall(sentence)]
+        for n in range(1, MAX_NGRAM + 1):
+            for i in range(len(tokens) - n + 1):
+                gram = tokens[i:i + n]
+                if gram[0] in STOPWORDS or gram[-1] in STOPWORDS: continue
+                if n == 1 and len(gram[0]) < MIN_TERM_CHARS: continue
+                counts[" ".join(gram)] += 1
+    return counts
+
+
+def named_entities(text):
+    """Capitalised sequences and acronyms that do not merely start a sentence."""
+    counts = Counter()
+    for sentence in SENTENCE_RE.split(text):
+        for match in ENTITY_RE.finditer(sentence):
+            entity = match.group(0).strip()
+            words = entity.split()
+            if match.start() == len(sentence) - len(sentence.lstrip()) and len(words) == 1 and not entity.isupper():
+                continue # A lone capitalised word at the start of a sentence is usually just a sentence start
+            if entity.lower() in STOPWORDS or len(entity) < 2: continue
+            counts[entity] += 1
+    return counts
+
+
+def _prefer_longer(ranked, limit):
+    """Drop phrases contained in a higher-ranked phrase (keeps 'neural network', drops 'neural')."""
+    kept = []
+    for phrase, score in ranked:
+        if any(f" {phrase} " in f" {k} " or f" {k} " in f" {phrase} " for k, _ in kept): continue
+        kept.append((phrase, score))
+        if len(kept) >= limit: break
+    return kept
+
+
+def idf(n_docs, df):
+    """Smoothed IDF; stays positive so a single-document corpus still ranks by frequency."""
+    return math.log((1 + n_docs) / (1 + df)) + 1.0
+
+
+def _ngram_weight(phrase):
+    # Multi-word phrases are rarer by construction; a mild boost keeps them competitive with unigrams
+    return 1.0 + 0.5 * (phrase.count(" "))
+
+
+def build_artifact(pdf_id, page_texts, source=None, fingerprint=None):
+    """
+    Compute keyphrases and entities for one document
+
+    Args:
+        pdf_id (str): Document ID
+        page_texts (list): [(page_num (0-based), text), ...]
+        source (str, optional): File name, for display
+        fingerprint (str, optional): File fingerprint the statistics were computed from
+
+    Returns:
+        dict: The artifact (see KeyphraseStore.save)
+    """
+    page_counts = {page_num + 1: candidate_terms(text) for page_num, text in page_texts if text.strip()}
+    doc_counts = Counter()
+    page_df = Counter()
+    for counts in page_counts.values():
+        doc_counts.update(counts)
+        page_df.update(counts.keys())
+
+    # Page level: TF-IDF with the document's pages as the corpus
+    n_pages = max(1, len(page_counts))
+    pages = {}
+    for page, counts in page_counts.items():
+        total = sum(counts.values()) or 1
+        # A phrase seen once on a page is mostly an accident of wording, so only repeated phrases get the n-gram boost
+        scored = sorted(((term, tf / total * idf(n_pages, page_df[term]) * (_ngram_weight(term) if tf > 1 else 1.0))
+                         for term, tf in counts.items()), key=lambda x: -x[1])
+        pages[str(page)] = [term for term, _ in _prefer_longer(scored, PAGE_KEYPHRASES)]
+
+    # Document level: keep raw counts of the strongest candidates (spread across pages first) for corpus re-ranking
+    spread = {term: tf * math.log(1 + page_df[term]) * _ngram_weight(term) for term, tf in doc_counts.items() if tf > 1}
+    terms = {term: doc_counts[term] for term in sorted(spread, key=lambda t: -spread[t])[:CANDIDATE_TERMS]}
+
+    entities = Counter()
+    for _, text in page_texts: entities.update(named_entities(text))
+    return {
+        "version": ARTIFACT_VERSION,
+        "pdf_id": str(pdf_id),
+        "source": source,
+        "fingerprint": fingerprint,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "page_count": len(page_counts),
+        "total_terms": sum(doc_counts.values()),
+        "terms": terms,
+        "pages": pages,
+        "entities": [[name, count] for name, count in entities.most_common(MAX_ENTITIES)],
+    }
+
+
+class KeyphraseStore:
+    """Per-pdf_id keyphrase artifacts plus the shared corpus document-frequency table."""
+
+    def __init__(self, store_dir):
+        self.dir = store_dir
+
+    def _path(self, pdf_id):
+        return os.path.join(self.dir, f"{_safe_name(pdf_id)}.json.gz")
+
+    @contextmanager
+    def _corpus_lock(self):
+        """Exclusive lock over the corpus table and the artifacts (safe across concurrent ingests)."""
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, CORPUS_LOCK), "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _update_corpus(self, remove_terms=None, add_terms=None):
+        """Adjust the corpus DF table; the caller holds _corpus_lock."""
+        path = os.path.join(self.dir, CORPUS_FILE)
+        corpus = self._read_corpus()
+        df = corpus["df"]
+        for term in remove_terms or ():
+            df[term] = df.get(term, 0) - 1
+            if df[term] <= 0: del df[term]
+        for term in add_terms or (): df[term] = df.get(term, 0) + 1
+        corpus["docs"] = max(0, corpus["docs"] - (remove_terms is not None) + (add_terms is not None))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(corpus, f)
+        os.replace(tmp_path, path)
+
+    def _read_corpus(self):
+        try:
+            with open(os.path.join(self.dir, CORPUS_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"docs": 0, "df": {}}
+
+    def save(self, artifact):
+        """Write an artifact atomically and move its terms into the corpus table (replacing an older version)."""
+        path = self._path(artifact["pdf_id"])
+        # Reading the previous version, the DF update and the replace share one lock, so two saves of
+        # the same PDF cannot both subtract the same previous terms
+        with self._corpus_lock():
+            previous = self.load(artifact["pdf_id"])
+            self._update_corpus(remove_terms=previous["terms"].keys() if previous else None, add_terms=artifact["terms"].keys())
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(artifact, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        return path
+
+    def load(self, pdf_id):
+        try:
+            with gzip.open(self._path(pdf_id), "rt", encoding="utf-8") as f:
+                artifact = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable keyphrase artifact for {pdf_id}: {e}")
+            return None
+        return artifact if artifact.get("version") == ARTIFACT_VERSION else None
+
+    def delete(self, pdf_id):
+        with self._corpus_lock():
+            artifact = self.load(pdf_id)
+            if artifact is None: return False
+            self._update_corpus(remove_terms=artifact.get("terms", {}).keys())
+            try: os.remove(self._path(pdf_id))
+            except FileNotFoundError: pass
+        return True
+
+    def keyphrases(self, pdf_ids, limit=DOCUMENT_KEYPHRASES):
+        """
+        Rank keyphrases for one or more documents against the current corpus
+
+        Returns:
+            dict: {"keyphrases": [(phrase, score)], "entities": [(name, count)], "pages": {pdf_id: {page: [...]}},
+                   "sources": [{"pdf_id", "document"}, ...], "missing": [pdf_id, ...]}
+        """
+        artifacts, missing = [], []
+        for pdf_id in pdf_ids:
+            artifact = self.load(pdf_id)
+            if artifact: artifacts.append(artifact)
+            else: missing.append(pdf_id)
+        corpus = self._read_corpus()
+        n_docs, df = max(corpus["docs"], len(artifacts)), corpus["df"]
+
+        counts, entities = Counter(), Counter()
+        total = 0
+        for artifact in artifacts:
+            counts.update(artifact["terms"])
+            entities.update({name: count for name, count in artifact["entities"]})
+            total += artifact.get("total_terms") or sum(artifact["terms"].values())
+        total = total or 1
+        scored = sorted(((term, tf / total * idf(n_docs, df.get(term, 1)) * _ngram_weight(term))
+                         for term, tf in counts.items()), key=lambda x: -x[1])
+        return {
+            "keyphrases": _prefer_longer(scored, limit),
+            "entities": entities.most_common(MAX_ENTITIES),
+            "pages": {a["pdf_id"]: a["pages"] for a in artifacts},
+            "sources": [{"pdf_id": a["pdf_id"], "document": a.get("source")} for a in artifacts],
+            "missing": missing,
+        }
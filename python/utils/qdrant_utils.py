@@ -1,11 +1,27 @@
 # FILE: python/utils/qdrant_utils.py
 
 import argparse
+import gzip
+import json
 import logging
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Run as a script by the backend
+from embeddings.projection import ProjectionStore
+from embeddings.registry import DEFAULT_MODEL_NAME, LEGACY_VECTOR, ModelRegistry, vector_of
+from utils import routing
+from utils.keyphrases import KeyphraseStore
+from utils.text_store import TextStore
+from utils.topics import TopicStore
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -14,12 +30,121 @@ logger = logging.getLogger(__name__)
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
 DEFAULT_COLLECTION = "documents"
-DEFAULT_VECTOR_SIZE = 384 # Match all-MiniLM-L6-v2
+DELETE_ID_CHUNK_SIZE = 256 # pdf_ids per MatchAny filter in bulk deletes
+SCROLL_PAGE_SIZE = 1000
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+KEYPHRASE_DIR = os.getenv("KEYPHRASE_DIR", os.path.join(RAG_DATA_DIR, "keyphrases"))
+TOPIC_DIR = os.getenv("TOPIC_DIR", os.path.join(RAG_DATA_DIR, "topics"))
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", os.path.join(RAG_DATA_DIR, "text_store"))
+EXPORT_FORMAT = "rag-qdrant-export"
+EXPORT_VERSION = 2                      # 2: every named vector, routing keys, registry entry and projections
+EXPORT_VECTORS_DIR = "vectors"          # <i>.npy: float32 (rows, dim) of the i-th named vector; row r belongs to line r of the points file
+EXPORT_POINTS_FILE = "points.jsonl.gz"  # {"id": ..., "payload": {...}, "key": routing key or null} per line
+EXPORT_PROJECTION_DIR = "projections"   # Copies of the PCA projection artifacts (embeddings.projection)
+EXPORT_META_FILE = "meta.json"
+EXPORT_TEXT_DIR = "text_store"         # Copies of the sidecar shards the exported payloads reference
+IMPORT_BATCH_SIZE = 256
+IMPORT_PARALLEL = 4
+DEFAULT_HNSW_M = 16 # Qdrant's default, restored when a vector stops being rescore-only
 # --- End Configuration ---
 
 
-def reset_collection(collection_name=DEFAULT_COLLECTION, vector_size=DEFAULT_VECTOR_SIZE):
-    """Reset a Qdrant collection by recreating it."""
+def vector_config(client, collection_name):
+    """{vector_name: VectorParams} of a collection; a single unnamed vector is returned under LEGACY_VECTOR ("")."""
+    vectors_config = client.get_collection(collection_name=collection_name).config.params.vectors
+    if isinstance(vectors_config, models.VectorParams): return {LEGACY_VECTOR: vectors_config}
+    return dict(vectors_config or {})
+
+
+def set_rescore_only(client, collection_name, vector_names, rescore_only=True):
+    """Keep vectors on disk without an HNSW index (only read to rescore), or restore the default in-memory index."""
+    if not vector_names: return
+    diff = models.VectorParamsDiff(on_disk=True, hnsw_config=models.HnswConfigDiff(m=0)) if rescore_only else \
+        models.VectorParamsDiff(on_disk=False, hnsw_config=models.HnswConfigDiff(m=DEFAULT_HNSW_M))
+    client.update_collection(collection_name=collection_name, vectors_config={name: diff for name in vector_names})
+    logger.info(f"Vectors {list(vector_names)} of '{collection_name}' " + ("moved to disk, unindexed" if rescore_only else "indexed again"))
+
+
+def ensure_collection(client, collection_name, vectors, rescore_only=(), **collection_kwargs):
+    """
+    Create the collection with the given vectors, or add the named vectors it lacks
+
+    Existing collections are never dropped: a vector whose size differs from the registry raises
+    instead, and switching models goes through a new named vector (reembed.py).
+
+    Args:
+        client (QdrantClient): Client to use
+        collection_name (str): Physical collection
+        vectors (dict): {vector_name: dimension}
+        rescore_only (iterable): Vectors searched through a reduced projection (embeddings.projection);
+            they are created on disk without an HNSW index
+        **collection_kwargs: Passed to create_collection (the router's sharding method)
+    """
+    logger.info(f"Checking collection '{collection_name}'...")
+    rescore_only = set(rescore_only)
+    if not client.collection_exists(collection_name):
+        logger.info(f"Creating collection: {collection_name} vectors {vectors}" + (f" (rescore only: {sorted(rescore_only)})" if rescore_only else ""))
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config={name: models.VectorParams(size=size, distance=models.Distance.COSINE,
+                                                      **({"on_disk": True, "hnsw_config": models.HnswConfigDiff(m=0)} if name in rescore_only else {}))
+                            for name, size in vectors.items()},
+            timeout=60,
+            **collection_kwargs
+        )
+        return
+    existing = vector_config(client, collection_name)
+    for name, size in vectors.items():
+        if name not in existing:
+            if name == LEGACY_VECTOR: raise ValueError(f"Collection '{collection_name}' has no unnamed vector to write")
+            logger.info(f"Adding vector '{name}' ({size}-d) to collection '{collection_name}'")
+            client.create_vector_name(collection_name=collection_name, vector_name=name,
+                                      vector_name_config=models.DenseVectorNameConfig(dense=models.DenseVectorConfig(size=size, distance=models.Distance.COSINE)))
+            if name in rescore_only: set_rescore_only(client, collection_name, [name])
+        elif existing[name].size != size:
+            raise ValueError(f"Collection '{collection_name}' vector '{name or '(unnamed)'}' has size {existing[name].size}, "
+                             f"the registry expects {size}; re-embed into a new vector instead of recreating the collection")
+
+
+def collection_vectors(client, collection_name, embedder=None, router=None):
+    """
+    Vectors ingestion writes to a logical collection, registering it on first use
+
+    A collection that is not in the model registry yet is adopted as its existing unnamed vector
+    (legacy collections) or registered with a named vector for DEFAULT_MODEL_NAME, sized from the
+    model's own output (embedder, when given, must be that model).
+
+    Returns:
+        dict: {vector_name: {"model", "dimension", "state", ...}}, active vector first
+    """
+    registry = ModelRegistry()
+    written = registry.written(collection_name)
+    if written: return written
+    router = router or routing.router(collection_name)
+    legacy = next((params for params in (vector_config(client, name).get(LEGACY_VECTOR) for name in physical_collections(client, router))
+                   if params is not None), None)
+    if legacy is not None:
+        registry.register(collection_name, DEFAULT_MODEL_NAME, legacy.size, vector_name=LEGACY_VECTOR)
+    else:
+        registry.register(collection_name, DEFAULT_MODEL_NAME, registry.dimension(DEFAULT_MODEL_NAME, embedder))
+    return registry.written(collection_name)
+
+
+def physical_collections(client, router):
+    """Existing Qdrant collections holding a logical collection's points."""
+    if router.routed: return router.collections(client)
+    return [router.base] if client.collection_exists(router.base) else []
+
+
+def reset_collection(collection_name=DEFAULT_COLLECTION, vector_size=None, tenant_id=None):
+    """
+    Reset a Qdrant collection by recreating it (see reset_routed under tenant routing)
+
+    The new collection has one named vector for the collection's active model (other registered
+    vectors are dropped with the data); vector_size overrides the detected dimension.
+    """
+    router = routing.router(collection_name)
+    if router.routed or tenant_id: return reset_routed(router, tenant_id)
     try:
         client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
         logger.info(f"Connected to Qdrant server at {QDRANT_HOST}:{QDRANT_PORT}")
@@ -37,15 +162,12 @@ def reset_collection(collection_name=DEFAULT_COLLECTION, vector_size=DEFAULT_VEC
                   logger.warning(f"Could not confirm deletion status for {collection_name}: {e}")
 
         # Create new collection
-        logger.info(f"Creating new collection: {collection_name} with vector size: {vector_size}")
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=vector_size,
-                distance=models.Distance.COSINE
-            ),
-            timeout=60
-        )
+        registry = ModelRegistry()
+        model_name = registry.active(collection_name)[1]
+        vector_size = vector_size or registry.dimension(model_name)
+        entry = registry.register(collection_name, model_name, vector_size, replace=True)
+        logger.info(f"Creating new collection: {collection_name} with vector '{entry['active']}' ({model_name}) size: {vector_size}")
+        ensure_collection(client, collection_name, {entry["active"]: vector_size})
         logger.info(f"Collection {collection_name} reset successfully with vector size {vector_size}")
         print(f"Collection {collection_name} reset successfully")
         return True
@@ -55,17 +177,625 @@ def reset_collection(collection_name=DEFAULT_COLLECTION, vector_size=DEFAULT_VEC
         print(f"Error resetting collection {collection_name}: {str(e)}")
         return False
 
+def reset_routed(router, tenant_id=None, client=None):
+    """
+    Drop the physical collections of a routed logical collection, or only one tenant's
+
+    Routed collections and shard keys are created by the next ingest that needs them, so nothing
+    is recreated here. Per-pdf_id artifacts (keyphrases, topics, sidecar text) are left in place.
+
+    Args:
+        router (routing.Router): Router of the logical collection
+        tenant_id (str, optional): Only drop this tenant's collection (collection mode) or shard key (shard_key mode)
+        client (QdrantClient, optional): Existing client to reuse
+
+    Returns:
+        bool: True if successful
+    """
+    try:
+        if tenant_id and not router.routed:
+            raise ValueError(f"--tenant_id needs TENANT_ROUTING={' or '.join(routing.ROUTING_MODES[1:])}; '{router.base}' is a single collection")
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        dropped = []
+        if tenant_id:
+            target = router.target(None, tenant_id)
+            try:
+                if target.shard_key is not None: client.delete_shard_key(collection_name=target.collection, shard_key=target.shard_key)
+                else: client.delete_collection(collection_name=target.collection, timeout=60)
+                dropped.append(target.shard_key or target.collection)
+            except Exception as e:
+                if not routing.missing_collection(e): raise
+                logger.info(f"Tenant '{tenant_id}' has no data in '{router.base}', nothing to drop.")
+        else:
+            for name in router.collections(client):
+                client.delete_collection(collection_name=name, timeout=60)
+                dropped.append(name)
+            ModelRegistry().forget(router.base) # Re-registered by the next ingest
+        logger.info(f"Dropped {len(dropped)} routed target(s) of '{router.base}': {', '.join(dropped) or 'none'}")
+        print(f"Collection {router.base} reset successfully" + (f" for tenant {tenant_id}" if tenant_id else ""))
+        return True
+    except Exception as e:
+        logger.error(f"Error resetting routed collection {router.base}: {str(e)}", exc_info=True)
+        print(f"Error resetting collection {router.base}: {str(e)}")
+        return False
+
+def _pdf_id_filter(pdf_ids, extra_must=None):
+    """Build a payload filter matching any of the given pdf_ids."""
+    must = [models.FieldCondition(key="pdf_id", match=models.MatchAny(any=list(pdf_ids)))]
+    if extra_must: must.extend(extra_must)
+    return models.Filter(must=must)
+
+
+def _collect_image_paths(client, collection_name, qdrant_filter, shard_key=None):
+    """Scroll image points matching the filter and return their stored image paths."""
+    image_filter = models.Filter(
+        must=list(qdrant_filter.must or []) + [models.FieldCondition(key="type", match=models.MatchValue(value="image"))]
+    )
+    image_paths = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=image_filter,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=["image_path"],
+            with_vectors=False,
+            shard_key_selector=shard_key
+        )
+        for point in points:
+            image_path = (point.payload or {}).get("image_path")
+            if image_path: image_paths.add(image_path)
+        if offset is None: break
+    return image_paths
+
+
+def _remove_files(paths):
+    """Delete files, ignoring ones that are already gone. Returns the number removed."""
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            logger.debug(f"Image already removed: {path}")
+        except OSError as e:
+            logger.warning(f"Could not remove image {path}: {e}")
+    return removed
+
+
+def trigger_optimizer(client, collection_name):
+    """Ask Qdrant to re-run its optimizers (vacuums deleted points) without changing any settings."""
+    logger.info(f"Triggering optimizer pass on collection '{collection_name}'")
+    client.update_collection(collection_name=collection_name, optimizer_config=models.OptimizersConfigDiff(), timeout=60)
+
+
+def delete_pdfs(pdf_ids, collection_name=DEFAULT_COLLECTION, delete_images=True, optimize=False, client=None, tenant_id=None):
+    """
+    Delete all points belonging to the given pdf_ids, plus the PNGs their image points reference
+    and their keyphrase, topic and sidecar text files. Under tenant routing each pdf_id is deleted
+    from its owning collection/shard only.
+
+    Args:
+        pdf_ids (list): One or more pdf_ids to remove
+        collection_name (str): Name of the (logical) collection
+        delete_images (bool): Remove image files referenced by the deleted points
+        optimize (bool): Trigger a Qdrant optimizer pass once the points are deleted
+        client (QdrantClient, optional): Existing client to reuse
+        tenant_id (str, optional): Tenant the pdf_ids were ingested for
+
+    Returns:
+        dict: Result with success flag, deleted point and image counts
+    """
+    pdf_ids = [str(p) for p in dict.fromkeys(pdf_ids) if p]
+    if not pdf_ids:
+        return {"success": False, "error": "No pdf_ids provided."}
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        deleted_points = 0
+        deleted_images = 0
+        for target, target_pdf_ids in routing.router(collection_name).group(pdf_ids, tenant_id).items():
+            shard_key = target.shard_key
+            try:
+                for i in range(0, len(target_pdf_ids), DELETE_ID_CHUNK_SIZE):
+                    chunk = target_pdf_ids[i:i + DELETE_ID_CHUNK_SIZE]
+                    qdrant_filter = _pdf_id_filter(chunk)
+                    image_paths = _collect_image_paths(client, target.collection, qdrant_filter, shard_key) if delete_images else set()
+                    chunk_count = client.count(collection_name=target.collection, count_filter=qdrant_filter, exact=True,
+                                               shard_key_selector=shard_key).count
+                    client.delete(
+                        collection_name=target.collection,
+                        points_selector=models.FilterSelector(filter=qdrant_filter),
+                        wait=True,
+                        shard_key_selector=shard_key
+                    )
+                    deleted_points += chunk_count
+                    # Files are removed only after the points are gone so a failed delete never leaves dangling paths
+                    deleted_images += _remove_files(image_paths)
+                    logger.info(f"Deleted {chunk_count} points and {len(image_paths)} images for {len(chunk)} pdf_ids from '{target.collection}'.")
+            except Exception as e:
+                if not routing.missing_collection(e): raise
+                logger.info(f"Collection '{target.collection}' does not exist; nothing to delete for {len(target_pdf_ids)} pdf_ids.")
+                continue
+            if optimize: trigger_optimizer(client, target.collection)
+        keyphrases = KeyphraseStore(KEYPHRASE_DIR)
+        deleted_keyphrases = sum(1 for pdf_id in pdf_ids if keyphrases.delete(pdf_id))
+        topics, texts = TopicStore(TOPIC_DIR), TextStore(TEXT_STORE_DIR)
+        for pdf_id in pdf_ids:
+            topics.delete(pdf_id)
+            texts.delete(pdf_id)
+        return {"success": True, "pdf_ids": pdf_ids, "deleted_points": deleted_points, "deleted_images": deleted_images,
+                "deleted_keyphrases": deleted_keyphrases, "collection": collection_name}
+    except Exception as e:
+        logger.error(f"Error deleting pdf_ids from {collection_name}: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def gc_images(image_dir, collection_name=DEFAULT_COLLECTION, dry_run=False, client=None):
+    """
+    Remove PNGs in image_dir that are no longer referenced by any image point.
+
+    The image directory sits next to the uploaded PDFs and is shared by every collection (and every
+    routed tenant collection) ingested from there, so references are collected from all collections
+    on the server, not only from collection_name; a file is orphaned only when none of them uses it.
+
+    Args:
+        image_dir (str): Directory holding the extracted page images
+        collection_name (str): Collection the cleanup was requested for (logged; all collections are checked)
+        dry_run (bool): Only report orphaned files
+        client (QdrantClient, optional): Existing client to reuse
+
+    Returns:
+        dict: Result with success flag and the orphaned files found/removed
+    """
+    if not os.path.isdir(image_dir):
+        return {"success": True, "orphaned": 0, "deleted_images": 0}
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        referenced = set()
+        image_filter = models.Filter(must=[models.FieldCondition(key="type", match=models.MatchValue(value="image"))])
+        names = sorted(c.name for c in client.get_collections().collections)
+        # A scroll without a shard key reads all shards of a custom-sharded collection
+        for physical_name in names:
+            offset = None
+            while True:
+                points, offset = client.scroll(
+                    collection_name=physical_name,
+                    scroll_filter=image_filter,
+                    limit=SCROLL_PAGE_SIZE,
+                    offset=offset,
+                    with_payload=["image_path"],
+                    with_vectors=False
+                )
+                for point in points:
+                    image_path = (point.payload or {}).get("image_path")
+                    if image_path: referenced.add(os.path.abspath(image_path))
+                if offset is None: break
+        orphaned = [
+            os.path.join(image_dir, name) for name in os.listdir(image_dir)
+            if name.lower().endswith(".png") and os.path.abspath(os.path.join(image_dir, name)) not in referenced
+        ]
+        logger.info(f"Found {len(orphaned)} orphaned images in {image_dir} ({len(referenced)} referenced across {len(names)} collections; "
+                    f"requested for '{collection_name}').")
+        deleted = 0 if dry_run else _remove_files(orphaned)
+        return {"success": True, "orphaned": len(orphaned), "deleted_images": deleted, "collections_checked": len(names)}
+    except Exception as e:
+        logger.error(f"Error collecting orphaned images in {image_dir}: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def _export_entry(client, collection_name, config):
+    """Registry entry exported with a collection; an unregistered collection is described by its only vector."""
+    entry = ModelRegistry().entry(collection_name)
+    if entry: return entry
+    if len(config) != 1: raise ValueError(f"Collection '{collection_name}' has vectors {', '.join(config)} and is not registered.")
+    vector_name, params = next(iter(config.items()))
+    return {"active": vector_name, "vectors": {vector_name: {"model": DEFAULT_MODEL_NAME, "dimension": params.size, "state": "active"}}}
+
+
+def export_collection(output_dir, collection_name=DEFAULT_COLLECTION, pdf_ids=None, client=None, page_size=SCROLL_PAGE_SIZE):
+    """
+    Stream a logical collection's points (optionally only some pdf_ids) into a columnar export directory
+
+    Every routed target (collection or shard key) is read. Each named vector (re-embedding vectors
+    and PCA projections included) goes to its own float32 .npy block written through a memory map,
+    with NaN rows for points that lack it. Payloads and each point's routing key go to gzip'd JSON
+    lines in the same order, so nothing is ever held in memory as a whole. The registry entry,
+    projection artifacts and sidecar text shards are copied alongside. Image files referenced by
+    image points are not copied.
+
+    Args:
+        output_dir (str): Directory to create (must not already hold an export)
+        collection_name (str): Logical collection to export
+        pdf_ids (list, optional): Only export points of these pdf_ids
+        client (QdrantClient, optional): Existing client to reuse
+        page_size (int): Points per scroll request
+
+    Returns:
+        dict: Result with success flag, point count and output paths
+    """
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        if os.path.exists(os.path.join(output_dir, EXPORT_META_FILE)):
+            return {"success": False, "error": f"{output_dir} already contains an export"}
+        router = routing.router(collection_name)
+        targets = router.targets(client)
+        if not targets: return {"success": False, "error": f"Collection '{collection_name}' does not exist"}
+        config = {}
+        for target in targets:
+            for name, params in vector_config(client, target.collection).items(): config.setdefault(name, params)
+        entry = _export_entry(client, collection_name, config)
+        qdrant_filter = _pdf_id_filter(pdf_ids) if pdf_ids else None
+        expected = {target: client.count(collection_name=target.collection, count_filter=qdrant_filter, exact=True,
+                                         shard_key_selector=target.shard_key).count for target in targets}
+        total = sum(expected.values())
+        started = time.perf_counter()
+
+        os.makedirs(os.path.join(output_dir, EXPORT_VECTORS_DIR), exist_ok=True)
+        vector_meta, blocks = [], {}
+        for i, (name, params) in enumerate(config.items()):
+            path = os.path.join(EXPORT_VECTORS_DIR, f"{i}.npy")
+            vector_meta.append({"name": name, "size": params.size, "file": path,
+                                "distance": params.distance.value if hasattr(params.distance, "value") else str(params.distance),
+                                "rescore_only": bool(params.hnsw_config and params.hnsw_config.m == 0)})
+            blocks[name] = np.lib.format.open_memmap(os.path.join(output_dir, path), mode="w+", dtype=np.float32, shape=(total, params.size))
+        rows = 0
+        with gzip.open(os.path.join(output_dir, EXPORT_POINTS_FILE), "wt", encoding="utf-8", compresslevel=1) as points_file:
+            for target in targets:
+                key = router.key_of(target)
+                end = rows + expected[target]
+                offset = None
+                while rows < end:
+                    points, offset = client.scroll(collection_name=target.collection, scroll_filter=qdrant_filter, limit=page_size,
+                                                   offset=offset, with_payload=True, with_vectors=True, shard_key_selector=target.shard_key)
+                    points = points[:end - rows] # Points added after the count are left for the next export
+                    for j, point in enumerate(points):
+                        for name, block in blocks.items():
+                            vector = vector_of(point, name)
+                            block[rows + j] = vector if vector is not None else np.nan # Not yet backfilled
+                    points_file.write("".join(json.dumps({"id": p.id, "payload": p.payload, "key": key}, separators=(",", ":")) + "\n" for p in points))
+                    rows += len(points)
+                    if offset is None: break
+                if rows < end: logger.warning(f"{end - rows} points of '{target.collection}' disappeared during export.")
+        for block in blocks.values(): block.flush()
+        del blocks
+
+        projection_store, projections = ProjectionStore(), []
+        for vector_name, spec in entry["vectors"].items():
+            for projection in (spec.get("projection"), spec.get("previous_projection")):
+                if not projection: continue
+                path = os.path.join(EXPORT_PROJECTION_DIR, f"{len(projections)}.npz")
+                os.makedirs(os.path.join(output_dir, EXPORT_PROJECTION_DIR), exist_ok=True)
+                shutil.copy2(projection_store.path(collection_name, vector_name, projection["version"]), os.path.join(output_dir, path))
+                projections.append({"vector": vector_name, "version": projection["version"], "file": path})
+        text_dir = os.path.join(output_dir, EXPORT_TEXT_DIR)
+        text_store = TextStore(TEXT_STORE_DIR)
+        shard_paths = text_store.shard_paths(pdf_ids) if pdf_ids else text_store.all_shard_paths()
+        if shard_paths: os.makedirs(text_dir, exist_ok=True)
+        for path in shard_paths: shutil.copy2(path, os.path.join(text_dir, os.path.basename(path)))
+
+        meta = {
+            "format": EXPORT_FORMAT, "version": EXPORT_VERSION, "collection": collection_name, "routing": router.mode,
+            "vectors": vector_meta, "registry": entry, "projections": projections,
+            "rows": rows, "pdf_ids": list(pdf_ids) if pdf_ids else None, "text_shards": len(shard_paths),
+            "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(os.path.join(output_dir, EXPORT_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        seconds = time.perf_counter() - started
+        logger.info(f"Exported {rows} points ({len(vector_meta)} vectors) from {len(targets)} target(s) of '{collection_name}' to {output_dir} in {seconds:.1f}s.")
+        return {"success": True, "exported_points": rows, "targets": len(targets), "vectors": [v["name"] for v in vector_meta],
+                "output_dir": output_dir, "seconds": round(seconds, 3)}
+    except Exception as e:
+        logger.error(f"Error exporting {collection_name}: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def _iter_export_batches(input_dir, meta, batch_size):
+    """Yield (ids, payloads, keys, {vector_name: rows}) batches from an export; vectors are read from the memory maps."""
+    blocks = {v["name"]: np.load(os.path.join(input_dir, v["file"]), mmap_mode="r") for v in meta["vectors"]}
+    ids, payloads, keys = [], [], []
+    start = 0
+    with gzip.open(os.path.join(input_dir, EXPORT_POINTS_FILE), "rt", encoding="utf-8") as points_file:
+        for line in points_file:
+            if start + len(ids) >= meta["rows"]: break
+            record = json.loads(line)
+            ids.append(record["id"])
+            payloads.append(record.get("payload") or {})
+            keys.append(record.get("key"))
+            if len(ids) == batch_size:
+                yield ids, payloads, keys, {name: np.array(block[start:start + len(ids)]) for name, block in blocks.items()}
+                start += len(ids)
+                ids, payloads, keys = [], [], []
+    if ids: yield ids, payloads, keys, {name: np.array(block[start:start + len(ids)]) for name, block in blocks.items()}
+
+
+def import_collection(input_dir, collection_name=None, recreate=False, batch_size=IMPORT_BATCH_SIZE, parallel=IMPORT_PARALLEL, client=None):
+    """
+    Bulk-load an export directory into a logical collection with parallel upsert batches
+
+    Points are placed by the current TENANT_ROUTING: a point exported under a tenant key goes to
+    that tenant's target, others are routed by pdf_id. Every exported vector is written. The
+    exported registry entry and projection artifacts are restored when the collection is new
+    (or recreated).
+
+    Args:
+        input_dir (str): Directory written by export_collection
+        collection_name (str, optional): Target logical collection (default: the exported collection's name)
+        recreate (bool): Drop the target collection (all its routed targets) first
+        batch_size (int): Points per upsert request
+        parallel (int): Upsert requests in flight (use 1 with an embedded local-mode client, which is not thread-safe)
+        client (QdrantClient, optional): Existing client to reuse
+
+    Returns:
+        dict: Result with success flag and imported point count
+    """
+    try:
+        with open(os.path.join(input_dir, EXPORT_META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != EXPORT_FORMAT or meta.get("version") != EXPORT_VERSION:
+            return {"success": False, "error": f"{input_dir} is not a supported export (format {meta.get('format')} v{meta.get('version')}, "
+                                               f"expected v{EXPORT_VERSION}); re-export it with this version"}
+        collection_name = collection_name or meta["collection"]
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        router = routing.router(collection_name)
+        registry = ModelRegistry()
+        started = time.perf_counter()
+
+        if recreate:
+            for name in physical_collections(client, router):
+                logger.info(f"Dropping collection '{name}' before import")
+                client.delete_collection(collection_name=name, timeout=60)
+            router = routing.Router(collection_name) # Forget the targets the shared router created
+        restore_registry = recreate or not registry.entry(collection_name)
+        vectors = {v["name"]: v["size"] for v in meta["vectors"]}
+        rescore_only = [v["name"] for v in meta["vectors"] if v.get("rescore_only")]
+
+        def create(client, name, **collection_kwargs):
+            # Raises on a vector size mismatch with an existing collection
+            ensure_collection(client, name, vectors, rescore_only=rescore_only, **collection_kwargs)
+
+        # Shards first, so no imported point is visible before the text it references
+        text_dir = os.path.join(input_dir, EXPORT_TEXT_DIR)
+        if os.path.isdir(text_dir):
+            os.makedirs(TEXT_STORE_DIR, exist_ok=True)
+            for name in os.listdir(text_dir):
+                tmp_path = os.path.join(TEXT_STORE_DIR, f"{name}.{os.getpid()}.tmp")
+                shutil.copy2(os.path.join(text_dir, name), tmp_path)
+                os.replace(tmp_path, os.path.join(TEXT_STORE_DIR, name))
+
+        def upsert(target, points):
+            client.upsert(collection_name=target.collection, points=points, wait=True, shard_key_selector=target.shard_key)
+            return len(points)
+
+        imported = 0
+        per_target = Counter()
+        parallel = max(1, parallel)
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            in_flight = set()
+            for ids, payloads, keys, rows in _iter_export_batches(input_dir, meta, batch_size):
+                groups = {}
+                for j, (point_id, payload, key) in enumerate(zip(ids, payloads, keys)):
+                    # NaN rows mark vectors the point did not have yet (backfill in progress)
+                    vector = {name: block[j].tolist() for name, block in rows.items() if not np.isnan(block[j, 0])}
+                    groups.setdefault(router.place(payload.get("pdf_id"), key), []).append(models.PointStruct(id=point_id, payload=payload, vector=vector))
+                for target, points in groups.items():
+                    router.ensure(client, target, create)
+                    if len(in_flight) >= parallel * 2: # Bounded read-ahead keeps memory flat
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        imported += sum(f.result() for f in done)
+                    in_flight.add(pool.submit(upsert, target, points))
+                    per_target[target.shard_key or target.collection] += len(points)
+            imported += sum(f.result() for f in wait(in_flight).done)
+        if restore_registry: # Only once the points are in, so a rejected import leaves the registry alone
+            projection_store = ProjectionStore()
+            for projection in meta["projections"]:
+                path = projection_store.path(collection_name, projection["vector"], projection["version"])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                shutil.copy2(os.path.join(input_dir, projection["file"]), f"{path}.{os.getpid()}.tmp")
+                os.replace(f"{path}.{os.getpid()}.tmp", path)
+            registry.restore(collection_name, meta["registry"])
+        seconds = time.perf_counter() - started
+        logger.info(f"Imported {imported} points into {len(per_target)} target(s) of '{collection_name}' in {seconds:.1f}s.")
+        return {"success": True, "imported_points": imported, "collection": collection_name, "targets": dict(per_target),
+                "seconds": round(seconds, 3)}
+    except Exception as e:
+        logger.error(f"Error importing {input_dir}: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def slim_payloads(collection_name=DEFAULT_COLLECTION, client=None, page_size=SCROLL_PAGE_SIZE):
+    """
+    Move chunk texts of existing points from Qdrant payloads into the sidecar text store
+
+    Points ingested before the sidecar keep their text in the payload; this writes each page of
+    them to the store, then sets the reference fields and deletes "text" in one batched update.
+    Every routed target (collection or shard key) of the logical collection is migrated.
+
+    Returns:
+        dict: Result with success flag and the number of points migrated
+    """
+    try:
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        text_store = TextStore(TEXT_STORE_DIR)
+        fat_filter = models.Filter(must=[models.FieldCondition(key="type", match=models.MatchValue(value="text"))],
+                                   must_not=[models.IsEmptyCondition(is_empty=models.PayloadField(key="text"))])
+        migrated = 0
+        targets = routing.router(collection_name).targets(client)
+        if not targets: return {"success": False, "error": f"Collection '{collection_name}' does not exist"}
+        for target in targets:
+            while True:
+                # Migrated points stop matching the filter, so every round starts from the beginning
+                points, _ = client.scroll(collection_name=target.collection, scroll_filter=fat_filter, limit=page_size,
+                                          with_payload=["pdf_id", "text"], with_vectors=False, shard_key_selector=target.shard_key)
+                if not points: break
+                by_pdf = {}
+                for point in points: by_pdf.setdefault(point.payload.get("pdf_id"), []).append((point.id, point.payload["text"]))
+                operations = []
+                for pdf_id, records in by_pdf.items():
+                    for point_id, refs in text_store.append(pdf_id, records).items():
+                        operations.append(models.SetPayloadOperation(set_payload=models.SetPayload(payload=refs, points=[point_id],
+                                                                                                   shard_key=target.shard_key)))
+                operations.append(models.DeletePayloadOperation(delete_payload=models.DeletePayload(keys=["text"], points=[p.id for p in points],
+                                                                                                    shard_key=target.shard_key)))
+                client.batch_update_points(collection_name=target.collection, update_operations=operations, wait=True)
+                migrated += len(points)
+                logger.info(f"Moved the text of {migrated} points to the sidecar store ({target.shard_key or target.collection})...")
+        return {"success": True, "migrated_points": migrated, "collection": collection_name, "targets": len(targets)}
+    except Exception as e:
+        logger.error(f"Error slimming payloads of {collection_name}: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def migrate_routing(collection_name=DEFAULT_COLLECTION, mode=None, tenant_map=None, drop_source=False, client=None,
+                    page_size=SCROLL_PAGE_SIZE):
+    """
+    Copy an existing single collection into the collections/shards of a tenant routing mode
+
+    The source is scrolled page by page and each page is split by owning target (from the
+    points' pdf_id, or their tenant in tenant_map), so memory stays at one page. Targets are
+    created with all of the source's vectors. Point IDs are kept, so re-running picks up
+    documents ingested meanwhile without duplicating anything. Queries keep reading the source
+    until TENANT_ROUTING is switched to the same mode; drop the source afterwards (drop_source
+    does it at the end of this run, once every target holds its migrated points).
+
+    Args:
+        collection_name (str): The existing (unrouted) collection; also the logical name of the targets
+        mode (str, optional): 'shard_key' or 'collection' (default: TENANT_ROUTING)
+        tenant_map (dict, optional): {pdf_id: tenant_id} for documents that belong to a tenant
+        drop_source (bool): Delete the source collection after a verified copy
+        client (QdrantClient, optional): Existing client to reuse
+        page_size (int): Points per scroll request
+
+    Returns:
+        dict: Result with success flag, migrated point count and points per target
+    """
+    try:
+        router = routing.Router(collection_name, mode=mode)
+        if not router.routed:
+            return {"success": False, "error": f"Set --routing_mode (or TENANT_ROUTING) to {' or '.join(routing.ROUTING_MODES[1:])} to migrate."}
+        client = client or QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=60)
+        vectors = {name: params.size for name, params in vector_config(client, collection_name).items()}
+        tenant_map = {str(k): v for k, v in (tenant_map or {}).items()}
+        started = time.perf_counter()
+
+        def create(client, name, **collection_kwargs):
+            ensure_collection(client, name, vectors, **collection_kwargs)
+
+        per_target = Counter()
+        migrated = skipped = 0
+        offset = None
+        while True:
+            points, offset = client.scroll(collection_name=collection_name, limit=page_size, offset=offset, with_payload=True, with_vectors=True)
+            groups = {}
+            for point in points:
+                pdf_id = (point.payload or {}).get("pdf_id")
+                if pdf_id is None: skipped += 1; continue
+                groups.setdefault(router.target(pdf_id, tenant_map.get(str(pdf_id))), []).append(point)
+            for target, group in groups.items():
+                router.ensure(client, target, create)
+                # Per-point vectors: a point may lack a named vector that is still being backfilled
+                client.upsert(collection_name=target.collection, wait=True, shard_key_selector=target.shard_key,
+                              points=[models.PointStruct(id=p.id, payload=p.payload,
+                                                         vector=p.vector if isinstance(p.vector, dict) else {LEGACY_VECTOR: p.vector})
+                                      for p in group])
+                per_target[target] += len(group)
+                migrated += len(group)
+            if points: logger.info(f"Migrated {migrated} points of '{collection_name}' into {len(per_target)} targets...")
+            if offset is None: break
+        if skipped: logger.warning(f"Skipped {skipped} points without a pdf_id; they stay in '{collection_name}' only.")
+
+        dropped = False
+        if drop_source:
+            short = {target: n for target, n in per_target.items()
+                     if client.count(collection_name=target.collection, exact=True, shard_key_selector=target.shard_key).count < n}
+            if short or skipped:
+                logger.error(f"Not dropping '{collection_name}': {len(short)} targets are missing points, {skipped} points were skipped.")
+            else:
+                client.delete_collection(collection_name=collection_name, timeout=60)
+                dropped = True
+                logger.info(f"Dropped source collection '{collection_name}'.")
+        seconds = time.perf_counter() - started
+        logger.info(f"Migrated {migrated} points of '{collection_name}' to {router.mode} routing in {seconds:.1f}s.")
+        return {"success": True, "migrated_points": migrated, "skipped_points": skipped, "mode": router.mode,
+                "targets": {t.shard_key or t.collection: n for t, n in per_target.items()}, "source_dropped": dropped,
+                "seconds": round(seconds, 3)}
+    except Exception as e:
+        logger.error(f"Error migrating {collection_name} to tenant routing: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+def _read_pdf_ids(args):
+    """Collect pdf_ids from --pdf_ids and --pdf_ids_file (one per line)."""
+    pdf_ids = list(args.pdf_ids or [])
+    if args.pdf_ids_file:
+        with open(args.pdf_ids_file, "r", encoding="utf-8") as f:
+            pdf_ids.extend(line.strip() for line in f if line.strip())
+    return pdf_ids
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Qdrant collection utilities")
-    parser.add_argument("action", choices=["reset_collection", "clear"], help="Action to perform")
+    parser.add_argument("action", choices=["reset_collection", "clear", "delete_pdfs", "gc_images", "export", "import", "slim_payloads", "migrate_routing"], help="Action to perform")
     parser.add_argument("--collection_name", default=DEFAULT_COLLECTION, help=f"Name of the collection (default: {DEFAULT_COLLECTION})")
-    parser.add_argument("--vector_size", type=int, default=DEFAULT_VECTOR_SIZE, help=f"Size of the vectors (default: {DEFAULT_VECTOR_SIZE})")
+    parser.add_argument("--vector_size", type=int, default=None, help="Vector size of the recreated collection (default: detected from the active model)")
+    parser.add_argument("--pdf_ids", nargs="+", help="pdf_ids to delete (delete_pdfs) or export (export)")
+    parser.add_argument("--pdf_ids_file", help="File with one pdf_id per line (delete_pdfs)")
+    parser.add_argument("--keep_images", action="store_true", help="Do not delete image files of deleted points (delete_pdfs)")
+    parser.add_argument("--optimize", action="store_true", help="Trigger a Qdrant optimizer pass after deleting (delete_pdfs)")
+    parser.add_argument("--image_dir", help="Directory of extracted page images (gc_images)")
+    parser.add_argument("--dry_run", action="store_true", help="Only report orphaned images (gc_images)")
+    parser.add_argument("--path", help="Export directory to write (export) or read (import)")
+    parser.add_argument("--recreate", action="store_true", help="Drop the target collection before loading (import)")
+    parser.add_argument("--batch_size", type=int, default=IMPORT_BATCH_SIZE, help="Points per upsert request (import)")
+    parser.add_argument("--parallel", type=int, default=IMPORT_PARALLEL, help="Upsert requests in flight (import)")
+    parser.add_argument("--tenant_id", help="Tenant the pdf_ids belong to (delete_pdfs) or to drop alone (reset_collection)")
+    parser.add_argument("--routing_mode", choices=routing.ROUTING_MODES[1:], help="Target layout (migrate_routing; default: TENANT_ROUTING)")
+    parser.add_argument("--tenant_map", help="JSON file of {pdf_id: tenant_id} for documents that belong to a tenant (migrate_routing)")
+    parser.add_argument("--drop_source", action="store_true", help="Delete the source collection after a verified copy (migrate_routing)")
 
     args = parser.parse_args()
 
+    if args.action == "delete_pdfs":
+        result = delete_pdfs(_read_pdf_ids(args), args.collection_name, delete_images=not args.keep_images, optimize=args.optimize,
+                             tenant_id=args.tenant_id)
+        print(json.dumps(result))
+        sys.exit(0 if result["success"] else 1)
+
+    if args.action == "export":
+        if not args.path: parser.error("--path is required for export")
+        result = export_collection(args.path, args.collection_name, _read_pdf_ids(args) or None)
+        print(json.dumps(result))
+        sys.exit(0 if result["success"] else 1)
+
+    if args.action == "import":
+        if not args.path: parser.error("--path is required for import")
+        result = import_collection(args.path, args.collection_name, recreate=args.recreate, batch_size=args.batch_size, parallel=args.parallel)
+        print(json.dumps(result))
+        sys.exit(0 if result["success"] else 1)
+
+    if args.action == "slim_payloads":
+        result = slim_payloads(args.collection_name)
+        print(json.dumps(result))
+        sys.exit(0 if result["success"] else 1)
+
+    if args.action == "migrate_routing":
+        tenant_map = None
+        if args.tenant_map:
+            with open(args.tenant_map, "r", encoding="utf-8") as f:
+                tenant_map = json.load(f)
+        result = migrate_routing(args.collection_name, args.routing_mode, tenant_map, drop_source=args.drop_source)
+        print(json.dumps(result))
+        sys.exit(0 if result["success"] else 1)
+
+    if args.action == "gc_images":
+        if not args.image_dir: parser.error("--image_dir is required for gc_images")
+        result = gc_images(args.image_dir, args.collection_name, dry_run=args.dry_run)
+        print(json.dumps(result))
+        sys.exit(0 if result["success"] else 1)
+
     if args.action in ["reset_collection", "clear"]:
         vector_size_to_use = args.vector_size
-        if args.vector_size != DEFAULT_VECTOR_SIZE:
-             logger.warning(f"Using non-default vector size: {args.vector_size}. Ensure this matches your embedding model!")
-        success = reset_collection(args.collection_name, vector_size_to_use)
+        if args.vector_size:
+             logger.warning(f"Using explicit vector size: {args.vector_size}. Ensure this matches your embedding model!")
+        success = reset_collection(args.collection_name, vector_size_to_use, tenant_id=args.tenant_id)
         sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,94 @@
+# FILE: python/utils/retrieval.py
+# Post-processing of Qdrant candidates: per-document caps and maximal marginal relevance (MMR)
+# selection, so near-duplicate chunks (the same paragraph on consecutive pages) do not crowd
+# out other sources in the prompt, and score-based cutoffs that stop adding hits once relevance
+# falls off a cliff.
+
+import numpy as np
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_mult=0.7, groups=None, per_group_limit=None):
+    """
+    Pick k candidates that are relevant to the query but dissimilar to each other
+
+    Args:
+        query_vector (array-like): Query embedding, shape (dim,)
+        candidate_vectors (array-like): Candidate embeddings, shape (n, dim)
+        k (int): Number of candidates to select
+        lambda_mult (float): 1.0 = pure relevance, 0.0 = pure diversity
+        groups (list, optional): Group key per candidate (e.g. pdf_id) for per_group_limit
+        per_group_limit (int, optional): Max selections from any one group
+
+    Returns:
+        list: Selected candidate indices, in selection order
+    """
+    candidates = _normalize_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    n = len(candidates)
+    if n == 0 or k <= 0: return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T # n is a few dozen candidates, so the full matrix is cheap
+    max_sim_to_selected = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    group_counts = {}
+    selected = []
+    while len(selected) < k and available.any():
+        redundancy = np.where(np.isfinite(max_sim_to_selected), max_sim_to_selected, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+        if groups is not None and per_group_limit:
+            if group_counts.get(groups[best], 0) >= per_group_limit: continue
+            group_counts[groups[best]] = group_counts.get(groups[best], 0) + 1
+        selected.append(best)
+        max_sim_to_selected = np.maximum(max_sim_to_selected, similarity[best])
+    return selected
+
+
+def cap_per_group(groups, k, per_group_limit):
+    """Indices of the first k items (already ranked) keeping at most per_group_limit per group."""
+    counts = {}
+    selected = []
+    for i, group in enumerate(groups):
+        if len(selected) >= k: break
+        if per_group_limit and counts.get(group, 0) >= per_group_limit: continue
+        counts[group] = counts.get(group, 0) + 1
+        selected.append(i)
+    return selected
+
+
+def adaptive_cutoff(scores, min_score=None, max_gap=None, relative_floor=None, min_k=1):
+    """
+    Number of leading hits worth keeping from a score-ranked list
+
+    The list is cut at the first hit scoring below min_score, below relative_floor * top score,
+    or more than max_gap below the hit before it (a cliff). The first min_k hits are always kept
+    unless they fall below min_score.
+
+    Args:
+        scores (list): Similarity scores, highest first
+        min_score (float, optional): Absolute floor for any hit
+        max_gap (float, optional): Largest allowed drop between consecutive hits
+        relative_floor (float, optional): Fraction of the top score a hit must reach
+        min_k (int): Hits kept regardless of max_gap and relative_floor
+
+    Returns:
+        int: How many leading hits to keep
+    """
+    if not scores: return 0
+    top = scores[0]
+    for i, score in enumerate(scores):
+        if min_score is not None and score < min_score: return i
+        if i < max(1, min_k): continue
+        if relative_floor and score < top * relative_floor: return i
+        if max_gap is not None and scores[i - 1] - score > max_gap: return i
+    return len(scores)
@@ -0,0 +1,188 @@
+# FILE: python/utils/routing.py
+# Tenant-aware placement of a logical collection's points. Every pdf_id belongs to a routing key
+# (its tenant, when one is given, else a hash bucket of the pdf_id) and TENANT_ROUTING decides
+# where a key's points live:
+#   single     - everything in the logical collection itself (the original layout)
+#   shard_key  - one custom-sharded collection '<name>__sharded'; each key is a Qdrant shard key
+#   collection - one collection per key, '<name>__<key>'
+# Writes, deletes and searches touch only the owning shard or collection, so their cost follows
+# the tenant's size instead of the whole corpus. The routed layouts never write to '<name>'
+# itself; migrate_routing in utils.qdrant_utils copies an existing collection across.
+#
+# The tenant of a request is passed explicitly (compute_embeddings) or set for a block of code
+# with tenant_scope (local_llm). The same tenant_id must be used to ingest, query and delete a
+# document; without one the bucket is derived from the pdf_id, which every caller knows.
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from qdrant_client.http import models
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+ROUTING_MODES = ("single", "shard_key", "collection")
+TENANT_ROUTING = os.getenv("TENANT_ROUTING", "single")
+TENANT_BUCKETS = int(os.getenv("TENANT_BUCKETS", 16)) # Hash buckets for pdf_ids ingested without a tenant_id
+SHARDS_PER_KEY = int(os.getenv("SHARDS_PER_KEY", 1))  # Physical shards behind each shard key (shard_key mode)
+COLLECTION_SEPARATOR = "__"
+SHARDED_SUFFIX = "sharded"
+# --- End Configuration ---
+
+_current_tenant = contextvars.ContextVar("routing_tenant", default=None)
+
+Target = namedtuple("Target", ["collection", "shard_key"]) # shard_key is None outside shard_key mode
+
+
+@contextmanager
+def tenant_scope(tenant_id=None):
+    """Route the Qdrant calls made in this context for tenant_id (None = bucket by pdf_id)."""
+    token = _current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def current_tenant():
+    return _current_tenant.get()
+
+
+def tenant_key(tenant_id):
+    """
+    Routing key of a tenant: 't-<tenant_id>', case preserved
+
+    Characters other than letters, digits, '_' and '-' are replaced; the id then gets a '~<crc32>'
+    suffix of the raw value, which a clean id can never carry, so 'a/b' and 'a_b' stay apart.
+    """
+    raw = str(tenant_id)
+    safe = re.sub(r'[^\w\-]', '_', raw)
+    if safe == raw: return f"t-{safe}"
+    return f"t-{safe}~{zlib.crc32(raw.encode('utf-8')):08x}"
+
+
+def missing_collection(error):
+    """True when a Qdrant error (server or local mode) says the collection does not exist."""
+    message = str(error)
+    return any(marker in message for marker in ("Not found", "not found", "doesn't exist", "status_code=404", "CollectionNotFoundException"))
+
+
+class Router:
+    """Maps pdf_ids (and an optional tenant) of one logical collection to physical targets."""
+
+    def __init__(self, collection_name, mode=None, buckets=None):
+        self.base = collection_name
+        self.mode = mode or TENANT_ROUTING
+        if self.mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown TENANT_ROUTING '{self.mode}' (expected one of {', '.join(ROUTING_MODES)})")
+        self.buckets = max(1, buckets or TENANT_BUCKETS)
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    @property
+    def routed(self):
+        return self.mode != "single"
+
+    def key_for(self, pdf_id, tenant_id=None):
+        """Routing key: 't-<tenant>' for an explicit tenant, else 'b<bucket>' from a stable hash of the pdf_id."""
+        tenant_id = tenant_id or current_tenant()
+        if tenant_id: return tenant_key(tenant_id)
+        return f"b{zlib.crc32(str(pdf_id).encode('utf-8')) % self.buckets:03d}"
+
+    def target_for_key(self, key):
+        if self.mode == "single": return Target(self.base, None)
+        if self.mode == "shard_key": return Target(f"{self.base}{COLLECTION_SEPARATOR}{SHARDED_SUFFIX}", key)
+        return Target(f"{self.base}{COLLECTION_SEPARATOR}{key}", None)
+
+    def target(self, pdf_id, tenant_id=None):
+        if self.mode == "single": return Target(self.base, None)
+        return self.target_for_key(self.key_for(pdf_id, tenant_id))
+
+    def group(self, pdf_ids, tenant_id=None):
+        """{Target: [pdf_id, ...]} in first-seen order, so a multi-document search visits each owning target once."""
+        groups = {}
+        for pdf_id in pdf_ids: groups.setdefault(self.target(pdf_id, tenant_id), []).append(pdf_id)
+        return groups
+
+    def search_targets(self, pdf_ids, tenant_id=None):
+        """[(collection, shard_key_selector, pdf_ids)]: one search per physical collection, covering all its owning shard keys."""
+        merged = {}
+        for target, target_pdf_ids in self.group(pdf_ids, tenant_id).items():
+            keys, grouped = merged.setdefault(target.collection, ([], []))
+            if target.shard_key is not None: keys.append(target.shard_key)
+            grouped.extend(target_pdf_ids)
+        return [(name, (keys[0] if len(keys) == 1 else keys) if keys else None, grouped) for name, (keys, grouped) in merged.items()]
+
+    def collections(self, client):
+        """Existing physical collections of this logical collection."""
+        names = [c.name for c in client.get_collections().collections]
+        if self.mode == "collection":
+            prefix = f"{self.base}{COLLECTION_SEPARATOR}"
+            return sorted(n for n in names if n.startswith(prefix) and n != f"{prefix}{SHARDED_SUFFIX}")
+        target = self.target_for_key(None).collection
+        return [target] if target in names else []
+
+    def targets(self, client):
+        """Existing targets of this logical collection; shard keys are read from the cluster info (Qdrant server only)."""
+        if not self.routed: return [Target(self.base, None)] if client.collection_exists(self.base) else []
+        if self.mode == "collection": return [Target(name, None) for name in self.collections(client)]
+        targets = []
+        for name in self.collections(client):
+            info = client.collection_cluster_info(name)
+            keys = {shard.shard_key for shard in list(info.local_shards or []) + list(info.remote_shards or []) if shard.shard_key is not None}
+            targets += [Target(name, key) for key in sorted(keys, key=str)]
+        return targets
+
+    def key_of(self, target):
+        """Routing key whose points a target holds (None in single mode)."""
+        if self.mode == "shard_key": return target.shard_key
+        if self.mode == "collection": return target.collection[len(self.base) + len(COLLECTION_SEPARATOR):]
+        return None
+
+    def place(self, pdf_id, key=None):
+        """Target of a copied point: its tenant's key when it was stored under one, else the pdf_id's (bucket counts may differ)."""
+        if self.routed and key and str(key).startswith("t-"): return self.target_for_key(key)
+        return self.target(pdf_id)
+
+    def collection_kwargs(self):
+        """Extra create_collection arguments for a routed collection."""
+        return {"sharding_method": models.ShardingMethod.CUSTOM} if self.mode == "shard_key" else {}
+
+    def ensure(self, client, target, create_collection):
+        """
+        Make sure the target's collection (and shard key) exist; done once per router
+
+        Args:
+            client (QdrantClient): Client to use
+            target (Target): Where the points will be written
+            create_collection (callable): create_collection(client, name, **collection_kwargs()) creates the
+                collection when missing (or checks an existing one)
+        """
+        with self._lock:
+            if target in self._ready: return
+            if target.collection not in self._ready:
+                create_collection(client, target.collection, **self.collection_kwargs())
+                self._ready.add(target.collection)
+            if target.shard_key is not None: ensure_shard_key(client, target.collection, target.shard_key)
+            self._ready.add(target)
+
+
+def ensure_shard_key(client, collection_name, shard_key, shards_number=SHARDS_PER_KEY):
+    """Create a shard key on a custom-sharded collection unless it already exists."""
+    try:
+        client.create_shard_key(collection_name=collection_name, shard_key=shard_key, shards_number=shards_number)
+        logger.info(f"Created shard key '{shard_key}' on collection '{collection_name}'")
+    except Exception as e:
+        if "already exists" not in str(e): raise
+
+
+@lru_cache(maxsize=None)
+def router(collection_name):
+    """Shared Router of a logical collection under the configured TENANT_ROUTING."""
+    return Router(collection_name)
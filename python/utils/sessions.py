@@ -0,0 +1,212 @@
+# FILE: python/utils/sessions.py
+# Conversation sessions stored in SQLite, keyed by conversation ID. The last few turns are kept
+# verbatim; older turns are folded into a rolling summary as they age out, so the history sent
+# with each query stays bounded no matter how long the conversation runs.
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from array import array
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+RECENT_TURNS = 4          # Turns kept verbatim
+SUMMARY_MAX_WORDS = 200   # Rolling summary budget; oldest summary lines are dropped first
+SUMMARY_QUESTION_WORDS = 25
+SUMMARY_ANSWER_WORDS = 40
+FOLD_ATTEMPTS = 3         # Summaries computed outside the lock before falling back to an extractive fold inside it
+# --- End Configuration ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    conversation_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    llm_context BLOB
+);
+CREATE TABLE IF NOT EXISTS turns (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    assistant TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+"""
+
+
+def _clip_words(text, max_words):
+    words = (text or "").split()
+    return " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+
+
+def extractive_summary(summary, turns, max_words=SUMMARY_MAX_WORDS):
+    """
+    Fold turns into summary without a model call
+
+    Each turn becomes one line (clipped question plus the first sentence of the answer);
+    lines are appended and the oldest dropped until the summary fits max_words.
+    """
+    lines = [line for line in (summary or "").splitlines() if line.strip()]
+    for turn in turns:
+        first_sentence = re.split(r"(?<=[.!?])\s", (turn.get("assistant") or "").strip(), maxsplit=1)[0]
+        lines.append(f"- User asked: {_clip_words(turn.get('user'), SUMMARY_QUESTION_WORDS)} | "
+                     f"Answer: {_clip_words(first_sentence, SUMMARY_ANSWER_WORDS)}")
+    while len(lines) > 1 and sum(len(line.split()) for line in lines) > max_words:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class SessionStore:
+    """SQLite-backed conversation store; safe to share between concurrent query processes."""
+
+    def __init__(self, db_path, recent_turns=RECENT_TURNS, summary_max_words=SUMMARY_MAX_WORDS):
+        """
+        Args:
+            db_path (str): SQLite database file (created on first use)
+            recent_turns (int): Turns returned verbatim by load()
+            summary_max_words (int): Word budget of the rolling summary
+        """
+        self.db_path = db_path
+        self.recent_turns = recent_turns
+        self.summary_max_words = summary_max_words
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "llm_context" not in columns: # Databases created before context carrying
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN llm_context BLOB")
+
+    def load(self, conversation_id):
+        """
+        Return the bounded history for a conversation
+
+        Returns:
+            dict: {"summary": str, "turns": [{"user": str, "assistant": str}, ...]} (oldest turn first)
+        """
+        row = self._conn.execute("SELECT summary FROM sessions WHERE conversation_id = ?", (conversation_id,)).fetchone()
+        turns = self._conn.execute(
+            "SELECT user, assistant FROM turns WHERE conversation_id = ? ORDER BY seq DESC LIMIT ?",
+            (conversation_id, self.recent_turns)
+        ).fetchall()
+        return {"summary": row[0] if row else "", "turns": [{"user": u, "assistant": a} for u, a in reversed(turns)]}
+
+    def exists(self, conversation_id):
+        return self._conn.execute("SELECT 1 FROM sessions WHERE conversation_id = ?", (conversation_id,)).fetchone() is not None
+
+    def append_turn(self, conversation_id, user, assistant, summarize=None):
+        """
+        Record a turn and fold turns that fall out of the verbatim window into the summary
+
+        The turn is committed first; the summarizer (an LLM call in 'llm' mode) then runs outside any
+        transaction so it never holds the database write lock, and the fold is written in a second
+        short transaction only if no other process changed the summary or the aged turns meanwhile
+        (otherwise it is recomputed from the current state).
+
+        Args:
+            conversation_id (str): Session key
+            user (str): User message
+            assistant (str): Assistant answer
+            summarize (callable, optional): f(summary, turns) -> new summary; defaults to extractive_summary
+        """
+        summarize = summarize or (lambda summary, turns: extractive_summary(summary, turns, self.summary_max_words))
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (conversation_id, summary, next_seq, updated_at) VALUES (?, '', 0, ?)",
+                (conversation_id, now)
+            )
+            seq = self._conn.execute("SELECT next_seq FROM sessions WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO turns (conversation_id, seq, user, assistant, created_at) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, seq, user, assistant, now)
+            )
+            self._conn.execute("UPDATE sessions SET next_seq = ?, updated_at = ? WHERE conversation_id = ?", (seq + 1, now, conversation_id))
+        for attempt in range(FOLD_ATTEMPTS):
+            summary, aged = self._aged(conversation_id, seq)
+            if not aged: return
+            turns = [{"user": u, "assistant": a} for _, u, a in aged]
+            if attempt == FOLD_ATTEMPTS - 1: summarize = None # Last try: the fast extractive fold, done under the lock
+            else:
+                try:
+                    folded = summarize(summary, turns)
+                except Exception as e:
+                    logger.warning(f"Summarizer failed ({e}); using extractive summary.")
+                    folded = extractive_summary(summary, turns, self.summary_max_words)
+            with self._transaction():
+                current, current_aged = self._aged(conversation_id, seq)
+                if summarize is None:
+                    if not current_aged: return
+                    aged = current_aged
+                    folded = extractive_summary(current, [{"user": u, "assistant": a} for _, u, a in aged], self.summary_max_words)
+                elif current != summary or current_aged != aged:
+                    logger.info(f"Session {conversation_id} changed while summarizing; folding again.")
+                    continue
+                # Only the turns leaving the window are summarized, so each fold is constant work
+                self._conn.execute("DELETE FROM turns WHERE conversation_id = ? AND seq <= ?", (conversation_id, aged[-1][0]))
+                self._conn.execute("UPDATE sessions SET summary = ? WHERE conversation_id = ?", (folded, conversation_id))
+                return
+
+    def _aged(self, conversation_id, seq):
+        """(summary, [(seq, user, assistant), ...]) of the turns that turn seq pushed out of the verbatim window."""
+        summary = self._conn.execute("SELECT summary FROM sessions WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+        aged = self._conn.execute(
+            "SELECT seq, user, assistant FROM turns WHERE conversation_id = ? AND seq <= ? ORDER BY seq",
+            (conversation_id, seq - self.recent_turns)
+        ).fetchall()
+        return summary, aged
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction (BEGIN IMMEDIATE) committed on success, rolled back on error."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def get_llm_context(self, conversation_id):
+        """Model context (token IDs) saved for the conversation, or None."""
+        row = self._conn.execute("SELECT llm_context FROM sessions WHERE conversation_id = ?", (conversation_id,)).fetchone()
+        if not row or not row[0]: return None
+        return array("i", row[0]).tolist()
+
+    def set_llm_context(self, conversation_id, context):
+        """Save (or with None, clear) the model context; stored as packed int32 to keep rows small."""
+        blob = array("i", context).tobytes() if context else None
+        self._conn.execute(
+            "INSERT INTO sessions (conversation_id, summary, next_seq, updated_at, llm_context) VALUES (?, '', 0, ?, ?) "
+            "ON CONFLICT(conversation_id) DO UPDATE SET llm_context = excluded.llm_context",
+            (conversation_id, time.time(), blob)
+        )
+
+    def seed(self, conversation_id, turns, summarize=None):
+        """Import a client-supplied history into a new session (ignored if the session exists)."""
+        if self.exists(conversation_id): return
+        for turn in turns:
+            if isinstance(turn, dict) and (turn.get("user") or turn.get("assistant")):
+                self.append_turn(conversation_id, str(turn.get("user", "")), str(turn.get("assistant", "")), summarize)
+
+    def delete(self, conversation_id):
+        self._conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+        self._conn.execute("DELETE FROM sessions WHERE conversation_id = ?", (conversation_id,))
+
+    def prune(self, max_age_days):
+        """Drop sessions idle for longer than max_age_days; returns how many were removed."""
+        cutoff = time.time() - max_age_days * 86400
+        stale = [r[0] for r in self._conn.execute("SELECT conversation_id FROM sessions WHERE updated_at < ?", (cutoff,))]
+        for conversation_id in stale: self.delete(conversation_id)
+        return len(stale)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,196 @@
+# FILE: python/utils/text_store.py
+# Local sidecar for chunk texts, so Qdrant payloads only carry small fields. Each pdf_id has one
+# append-only shard of zlib-compressed records; a record starts with the point's UUID and the
+# compressed length, so reads by (shard, offset) can verify they landed on the right point.
+# Readers memory-map shards, so hydrating a handful of hits touches only those records' pages.
+# Ingestion rewrites a shard (truncate) when it starts a document over or resumes after a failed
+# segment, so re-ingests do not accumulate duplicate records.
+#
+# Payload fields written for a text point: text_shard, text_offset, text_length (see payload_fields).
+
+import fcntl
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+COMPRESSION_LEVEL = 6
+SHARD_SUFFIX = ".txz"
+# --- End Configuration ---
+
+HEADER = struct.Struct("<16sI") # point UUID bytes, compressed length
+
+
+def shard_name(pdf_id):
+    return re.sub(r'[^\w\-_\.]', '_', str(pdf_id))
+
+
+def _uuid_bytes(point_id):
+    return uuid.UUID(str(point_id)).bytes
+
+
+class TextStore:
+    """Append-only, compressed, memory-mapped text shards keyed by point ID."""
+
+    def __init__(self, store_dir):
+        self.dir = store_dir
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def _path(self, shard):
+        return os.path.join(self.dir, f"{shard}{SHARD_SUFFIX}")
+
+    # --- Writing ---
+    def append(self, pdf_id, records):
+        """
+        Append texts for one document
+
+        Args:
+            pdf_id (str): Document the texts belong to (one shard per pdf_id)
+            records (list): [(point_id, text), ...]; point IDs must be UUIDs
+
+        Returns:
+            dict: {point_id: payload_fields(...)} for each record
+        """
+        if not records: return {}
+        shard = shard_name(pdf_id)
+        os.makedirs(self.dir, exist_ok=True)
+        blobs = [(point_id, zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)) for point_id, text in records]
+        refs = {}
+        with open(self._path(shard), "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX) # Concurrent ingests of the same pdf_id must not interleave records
+            try:
+                offset = f.seek(0, os.SEEK_END)
+                chunks = []
+                for point_id, blob in blobs:
+                    chunks.append(HEADER.pack(_uuid_bytes(point_id), len(blob)))
+                    chunks.append(blob)
+                    refs[point_id] = self.payload_fields(shard, offset, len(blob))
+                    offset += HEADER.size + len(blob)
+                f.write(b"".join(chunks))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        with self._lock: # Shard grew; remap on next read
+            old = self._maps.pop(shard, None)
+        if old: old[0].close()
+        return refs
+
+    @staticmethod
+    def payload_fields(shard, offset, length):
+        return {"text_shard": shard, "text_offset": offset, "text_length": length}
+
+    def size(self, pdf_id):
+        """Current length of a document's shard in bytes (0 when it has none)."""
+        try: return os.path.getsize(self._path(shard_name(pdf_id)))
+        except FileNotFoundError: return 0
+
+    def truncate(self, pdf_id, size=0):
+        """
+        Keep only the first size bytes of a document's shard (a record boundary returned by size())
+
+        The shard is rewritten to a new file and renamed over the old one, so processes that still
+        map the old file keep reading it instead of faulting on a shrunk mapping.
+        """
+        shard = shard_name(pdf_id)
+        path = self._path(shard)
+        if self.size(pdf_id) <= size: return
+        with open(path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX) # Appends in flight finish first
+            try:
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as out:
+                    remaining = size
+                    while remaining:
+                        chunk = f.read(min(remaining, 1 << 20))
+                        if not chunk: break
+                        out.write(chunk)
+                        remaining -= len(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp_path, path)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        logger.info(f"Truncated text shard {shard} to {size} bytes")
+        with self._lock:
+            old = self._maps.pop(shard, None)
+        if old: old[0].close()
+
+    def delete(self, pdf_id):
+        shard = shard_name(pdf_id)
+        with self._lock:
+            old = self._maps.pop(shard, None)
+        if old: old[0].close()
+        try:
+            os.remove(self._path(shard))
+            return True
+        except FileNotFoundError:
+            return False
+
+    # --- Reading ---
+    def _map(self, shard, min_size=0):
+        """Memory map of a shard; remapped when another process has appended past the mapped end or rewritten it."""
+        with self._lock:
+            mapped, inode = self._maps.get(shard, (None, None))
+            if mapped is not None and (len(mapped) < min_size or os.stat(self._path(shard)).st_ino != inode):
+                mapped.close()
+                mapped = None
+            if mapped is None:
+                with open(self._path(shard), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps[shard] = (mapped, os.fstat(f.fileno()).st_ino)
+            return mapped
+
+    def get(self, point_id, shard, offset, length=None):
+        """Text of one point, or None when the shard or record is missing or belongs to another point."""
+        try:
+            mapped = self._map(shard, offset + HEADER.size + (length or 0))
+            if offset + HEADER.size > len(mapped): return None
+            key, stored_length = HEADER.unpack_from(mapped, offset)
+            if key != _uuid_bytes(point_id) or (length is not None and length != stored_length): return None
+            start = offset + HEADER.size
+            return zlib.decompress(mapped[start:start + stored_length]).decode("utf-8")
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Could not read text of point {point_id} from shard {shard}: {e}")
+            return None
+
+    def hydrate(self, hits):
+        """
+        Fill payload["text"] of Qdrant hits/records that reference the sidecar
+
+        Hits whose payload already has text (points ingested before the sidecar) are left alone.
+
+        Returns:
+            list: The hits that have text afterwards
+        """
+        hydrated = []
+        for hit in hits:
+            payload = hit.payload or {}
+            if not payload.get("text") and payload.get("text_shard") is not None:
+                text = self.get(hit.id, payload["text_shard"], payload.get("text_offset", 0), payload.get("text_length"))
+                if text is None: logger.warning(f"Text of point {hit.id} missing from the sidecar store.")
+                else: payload["text"] = text
+            if payload.get("text"): hydrated.append(hit)
+        return hydrated
+
+    def shard_paths(self, pdf_ids):
+        """Existing shard files for the given pdf_ids."""
+        paths = (self._path(shard_name(p)) for p in pdf_ids)
+        return [p for p in paths if os.path.exists(p)]
+
+    def all_shard_paths(self):
+        if not os.path.isdir(self.dir): return []
+        return [os.path.join(self.dir, name) for name in os.listdir(self.dir) if name.endswith(SHARD_SUFFIX)]
+
+    def close(self):
+        with self._lock:
+            for mapped, _ in self._maps.values(): mapped.close()
+            self._maps.clear()
@@ -0,0 +1,129 @@
+# FILE: python/utils/timing.py
+# Lightweight per-stage timing, Prometheus text export and an opt-in cProfile wrapper
+# shared by compute_embeddings.py and local_llm.py.
+
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PROFILE_TOP_N = 30
+METRIC_PREFIX = "rag"
+# --- End Configuration ---
+
+_active_timer = contextvars.ContextVar("rag_stage_timer", default=None)
+
+
+class StageTimer:
+    """Accumulates wall-clock time and call counts per named stage."""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    @contextmanager
+    def span(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def as_dict(self):
+        """Stage durations in milliseconds plus the total since the timer was created."""
+        timings = {stage: round(seconds * 1000.0, 3) for stage, seconds in self.totals.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000.0, 3)
+        return timings
+
+    def to_prometheus(self, entry, labels=None):
+        """Render the stage totals in the Prometheus text exposition format."""
+        base_labels = {"entry": entry, **(labels or {})}
+
+        def fmt(stage):
+            pairs = {**base_labels, "stage": stage}
+            return ",".join(f'{k}="{str(v)}"' for k, v in sorted(pairs.items()))
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent in each pipeline stage of the last invocation.",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds gauge",
+        ]
+        lines += [f"{METRIC_PREFIX}_stage_duration_seconds{{{fmt(stage)}}} {seconds:.6f}" for stage, seconds in self.totals.items()]
+        lines += [
+            f"# HELP {METRIC_PREFIX}_stage_calls Number of times each stage ran in the last invocation.",
+            f"# TYPE {METRIC_PREFIX}_stage_calls gauge",
+        ]
+        lines += [f"{METRIC_PREFIX}_stage_calls{{{fmt(stage)}}} {count}" for stage, count in self.counts.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, entry, labels=None):
+        """Atomically write the metrics file (suitable for the node_exporter textfile collector)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(entry, labels))
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def collect():
+    """Make a fresh StageTimer the active one for the current thread/context."""
+    timer = StageTimer()
+    token = _active_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _active_timer.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Time a stage into the active timer; a no-op when no timer is collecting."""
+    timer = _active_timer.get()
+    if timer is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage, time.perf_counter() - t0)
+
+
+def current_timer():
+    return _active_timer.get()
+
+
+def run_profiled(profile_path, func, *args, **kwargs):
+    """
+    Run func under cProfile, dump the raw stats to profile_path and print the top entries to stderr
+
+    stdout is left untouched because both entry points print their JSON result there.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profile_path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        sys.stderr.write(report.getvalue())
+        logger.info(f"cProfile stats written to {profile_path} (view with: python -m pstats {profile_path})")
+
+
+def configure_fast_logging():
+    """Low-overhead logging for the hot path: only warnings and errors are formatted and emitted."""
+    logging.getLogger().setLevel(logging.WARNING)
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(logging.WARNING)
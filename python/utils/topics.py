@@ -0,0 +1,197 @@
+# FILE: python/utils/topics.py
+# Topic clustering of a document's chunk embeddings, computed once at ingest. Vectorised k-means
+# (cosine, k-means++ seeding) runs for each candidate k and the k with the best simplified
+# silhouette wins; the chunks nearest each centroid are stored as that topic's representatives
+# in a small JSON artifact per pdf_id. The topic commands build their prompts from these.
+
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+ARTIFACT_VERSION = 1
+MIN_K = 2
+MAX_K = 8                 # More topics than this stop being useful in a chat answer
+MIN_POINTS_PER_TOPIC = 3  # Candidate k never exceeds n_chunks / this
+REPRESENTATIVES = 3       # Centroid-nearest chunks stored per topic
+KMEANS_ITERATIONS = 50
+KMEANS_RESTARTS = 3
+SELECTION_SAMPLE = 1000   # k is chosen on at most this many chunks; the final clustering uses all
+LABEL_TERMS = 5
+# --- End Configuration ---
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Spherical k-means on unit vectors
+
+    Args:
+        vectors (np.ndarray): (n, d) unit-normalised rows
+        k (int): Number of clusters
+        iterations (int): Maximum Lloyd iterations
+        seed (int): RNG seed for k-means++ seeding
+
+    Returns:
+        tuple: (labels (n,), centroids (k, d) unit-normalised, inertia = sum of cosine distances)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    # k-means++ seeding
+    centroids = [vectors[rng.integers(n)]]
+    closest = 1.0 - vectors @ centroids[0]
+    for _ in range(1, k):
+        weights = np.maximum(closest, 0.0) ** 2
+        total = weights.sum()
+        index = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids.append(vectors[index])
+        closest = np.minimum(closest, 1.0 - vectors @ vectors[index])
+    centroids = np.stack(centroids)
+
+    labels = None
+    for _ in range(iterations):
+        similarity = vectors @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels): break
+        labels = new_labels
+        sums = np.stack([vectors[labels == c].sum(axis=0) for c in range(k)])
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        if empty.any(): # Re-seed empty clusters with the points farthest from their centroid
+            farthest = np.argsort(similarity[np.arange(n), labels])[:empty.sum()]
+            sums[empty] = vectors[farthest]
+        centroids = _normalize(sums)
+    similarity = vectors @ centroids.T
+    labels = similarity.argmax(axis=1)
+    inertia = float((1.0 - similarity[np.arange(n), labels]).sum())
+    return labels, centroids, inertia
+
+
+def simplified_silhouette(vectors, labels, centroids):
+    """Centroid-based silhouette (O(n*k)): mean of (b - a) / max(a, b) over points."""
+    distances = 1.0 - vectors @ centroids.T
+    n = len(vectors)
+    a = distances[np.arange(n), labels]
+    distances[np.arange(n), labels] = np.inf
+    b = distances.min(axis=1)
+    return float(np.mean((b - a) / np.maximum(np.maximum(a, b), 1e-12)))
+
+
+def choose_k(vectors, min_k=MIN_K, max_k=MAX_K, restarts=KMEANS_RESTARTS, seed=0):
+    """
+    Cluster with every k in [min_k, max_k] and keep the best simplified silhouette
+
+    Returns:
+        tuple: (k, labels, centroids, silhouette); k is 1 when there are too few chunks to split
+    """
+    n = len(vectors)
+    max_k = min(max_k, n // MIN_POINTS_PER_TOPIC)
+    if max_k < min_k:
+        centroid = _normalize(vectors.mean(axis=0, keepdims=True))
+        return 1, np.zeros(n, dtype=np.int64), centroid, 0.0
+    best = None
+    for k in range(min_k, max_k + 1):
+        # Best of a few seeds per k; inertia picks the run, silhouette compares across k
+        labels, centroids, _ = min((kmeans(vectors, k, seed=seed + r) for r in range(restarts)), key=lambda run: run[2])
+        score = simplified_silhouette(vectors, labels, centroids)
+        if best is None or score > best[3]: best = (k, labels, centroids, score)
+    return best
+
+
+def cluster_document(point_ids, pages, vectors, page_keyphrases=None, representatives=REPRESENTATIVES):
+    """
+    Cluster one document's text chunks into topics
+
+    Args:
+        point_ids (list): Qdrant point IDs of the chunks
+        pages (list): Page number of each chunk
+        vectors (array-like): Chunk embeddings, one row per point
+        page_keyphrases (dict, optional): {page (str): [keyphrase, ...]} used to label topics
+
+    Returns:
+        dict: {"k", "silhouette", "clusters": [{"id", "size", "pages", "representatives": [{"point_id", "page", "similarity"}], "terms"}]}
+    """
+    vectors = _normalize(vectors)
+    nonzero = np.linalg.norm(vectors, axis=1) > 0 # Failed embeddings carry no topic signal
+    point_ids = [p for p, keep in zip(point_ids, nonzero) if keep]
+    pages = [p for p, keep in zip(pages, nonzero) if keep]
+    vectors = vectors[nonzero]
+    if not len(vectors): return {"k": 0, "silhouette": 0.0, "clusters": []}
+
+    if len(vectors) > SELECTION_SAMPLE:
+        sample = np.random.default_rng(0).choice(len(vectors), SELECTION_SAMPLE, replace=False)
+        k = choose_k(vectors[sample])[0]
+        labels, centroids, _ = min((kmeans(vectors, k, seed=r) for r in range(KMEANS_RESTARTS)), key=lambda run: run[2])
+        silhouette = simplified_silhouette(vectors, labels, centroids)
+    else:
+        k, labels, centroids, silhouette = choose_k(vectors)
+    clusters = []
+    for c in range(k):
+        members = np.flatnonzero(labels == c)
+        if not len(members): continue
+        similarity = vectors[members] @ centroids[c]
+        order = members[np.argsort(-similarity)][:representatives]
+        cluster_pages = sorted({pages[i] for i in members})
+        terms = Counter()
+        for page in cluster_pages:
+            terms.update((page_keyphrases or {}).get(str(page), [])[:LABEL_TERMS])
+        clusters.append({
+            "size": int(len(members)),
+            "pages": cluster_pages,
+            "representatives": [{"point_id": point_ids[i], "page": pages[i], "similarity": round(float(vectors[i] @ centroids[c]), 4)} for i in order],
+            "terms": [term for term, _ in terms.most_common(LABEL_TERMS)],
+        })
+    clusters.sort(key=lambda cl: -cl["size"])
+    for i, cluster in enumerate(clusters): cluster["id"] = i + 1
+    return {"k": len(clusters), "silhouette": round(silhouette, 4), "clusters": clusters}
+
+
+class TopicStore:
+    """Per-pdf_id topic artifacts (small JSON files)."""
+
+    def __init__(self, store_dir):
+        self.dir = store_dir
+
+    def _path(self, pdf_id):
+        safe = re.sub(r'[^\w\-_\.]', '_', str(pdf_id))
+        return os.path.join(self.dir, f"{safe}.json")
+
+    def save(self, pdf_id, topics, source=None, collection=None):
+        os.makedirs(self.dir, exist_ok=True)
+        artifact = {"version": ARTIFACT_VERSION, "pdf_id": str(pdf_id), "source": source, "collection": collection,
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **topics}
+        path = self._path(pdf_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(artifact, f)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, pdf_id):
+        try:
+            with open(self._path(pdf_id), "r", encoding="utf-8") as f:
+                artifact = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable topic artifact for {pdf_id}: {e}")
+            return None
+        return artifact if artifact.get("version") == ARTIFACT_VERSION else None
+
+    def delete(self, pdf_id):
+        try:
+            os.remove(self._path(pdf_id))
+            return True
+        except FileNotFoundError:
+            return False